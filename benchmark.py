@@ -0,0 +1,331 @@
+"""This script is a performance regression harness. It runs a fixed corpus of
+clips (local videos and/or deterministic synthetic clips) under a base and a
+candidate configuration, and compares FPS, stage latencies, peak memory, and
+the detections and anomalies found. See `temporal_consistency.regression`.
+
+Each clip is run in a fresh process, so that the peak memory of a run is not
+affected by the previous runs. The synthetic clips are run with fixed
+detections of their rectangles instead of the detector, and the per-object
+videos are not exported, so only the pipeline itself is timed. The command
+exits with an error code if any of the configured regression thresholds is
+exceeded.
+
+To compare two configurations:
+
+    python benchmark.py --candidate_overrides '{"motion_threshold": 2.0}'
+
+To compare two code revisions, save a report on the base revision, and use it
+as the baseline on the candidate revision:
+
+    python benchmark.py --report_filepath base.json --skip_candidate
+    python benchmark.py --baseline_report base.json
+"""
+
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import configargparse
+from loguru import logger
+
+from main import PREDICTIONS_FILENAME, detect_anomalies, get_parser
+from temporal_consistency.anomaly_logging import configure_logging
+from temporal_consistency.regression import (
+    DEFAULT_THRESHOLDS,
+    SyntheticClipDetector,
+    compare_runs,
+    get_corpus,
+    get_run_metrics,
+    is_synthetic_clip,
+)
+
+
+def parse_args():
+    parser = configargparse.ArgumentParser(
+        description="Compares the performance of two configurations"
+    )
+    parser.add_argument(
+        "--corpus",
+        nargs="*",
+        default=[],
+        help="Video files and folders of videos to run",
+    )
+    parser.add_argument(
+        "--num_synthetic_clips",
+        type=int,
+        default=2,
+        help="Number of generated synthetic clips added to the corpus",
+    )
+    parser.add_argument(
+        "--synthetic_num_frames",
+        type=int,
+        default=150,
+        help="Number of frames of each synthetic clip",
+    )
+    parser.add_argument(
+        "--out_folder",
+        default="benchmark_output",
+        help="Folder of the synthetic clips, the runs and the report",
+    )
+    parser.add_argument(
+        "--base_config",
+        default="conf.yaml",
+        help="Config file of the base runs",
+    )
+    parser.add_argument(
+        "--candidate_config",
+        default=None,
+        help="Config file of the candidate runs, the base config if not given",
+    )
+    parser.add_argument(
+        "--base_overrides",
+        default="{}",
+        help="Config overrides of the base runs as JSON",
+    )
+    parser.add_argument(
+        "--candidate_overrides",
+        default="{}",
+        help="Config overrides of the candidate runs as JSON",
+    )
+    parser.add_argument(
+        "--baseline_report",
+        default=None,
+        help="Report of a previous benchmark (i.e., on another code revision), "
+        "its base runs are used instead of running the base config",
+    )
+    parser.add_argument(
+        "--skip_candidate",
+        action="store_true",
+        help="Only run the base config, i.e. to save a baseline report",
+    )
+    parser.add_argument(
+        "--report_filepath",
+        default=None,
+        help="Path to the JSON report, benchmark_report.json in out_folder "
+        "if not given",
+    )
+    for name, value in DEFAULT_THRESHOLDS.items():
+        parser.add_argument(
+            f"--{name}",
+            type=float,
+            default=value,
+            help="Regression threshold, a negative value disables the check",
+        )
+
+    args = parser.parse_args()
+    return args
+
+
+def get_run_args(
+    config_filepath: str, overrides: dict, video_filepath: str, out_folder: str
+):
+    """Returns the pipeline arguments of a single run. The runs are headless
+    unless overridden, so the input folder is not written to.
+    """
+
+    run_args = get_parser().parse_args(["--config", config_filepath])
+    run_args.headless = True
+    vars(run_args).update(overrides)
+    run_args.video_filepath = video_filepath
+    run_args.out_folder = out_folder
+
+    return run_args
+
+
+def run_clip(run_args) -> dict:
+    """Runs the pipeline and the anomaly detection on a single clip, and
+    returns the metrics of the run. It is called in a fresh process. The
+    synthetic clips are run with fixed detections (`SyntheticClipDetector`),
+    so ultralytics is only imported for the other clips.
+    """
+
+    from deep_sort_realtime.deepsort_tracker import DeepSort
+
+    from temporal_consistency.object_detection_tracking import (
+        run_detection_and_tracking_pipeline,
+    )
+
+    os.makedirs(run_args.out_folder, exist_ok=True)
+    configure_logging(os.path.join(run_args.out_folder, "output.log"))
+    if is_synthetic_clip(run_args.video_filepath):
+        model = SyntheticClipDetector()
+    else:
+        from ultralytics import YOLO
+
+        model = YOLO("yolov8n.pt")
+    deep_sort_tracker = DeepSort(max_age=run_args.max_age)
+
+    start = time.perf_counter()
+    tframe_collection = run_detection_and_tracking_pipeline(
+        model, deep_sort_tracker, run_args, export_objects=False
+    )
+    pipeline_s = time.perf_counter() - start
+
+    predictions_filepath = os.path.join(
+        run_args.out_folder, PREDICTIONS_FILENAME
+    )
+    tframe_collection.export_predictions(predictions_filepath)
+
+    start = time.perf_counter()
+    anomaly_detector = detect_anomalies(tframe_collection, run_args)
+    anomaly_detection_s = time.perf_counter() - start
+
+    return get_run_metrics(
+        tframe_collection,
+        anomaly_detector,
+        pipeline_s,
+        anomaly_detection_s,
+        predictions_filepath,
+    )
+
+
+def run_isolated(run_args) -> dict:
+    """Runs a single clip in a fresh process."""
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(run_clip, run_args).result()
+
+
+def run_corpus(
+    corpus: list[str],
+    name: str,
+    config_filepath: str,
+    overrides: dict,
+    out_folder: str,
+) -> dict:
+    """Runs all the clips of the corpus with a configuration."""
+
+    runs = {}
+    for video_filepath in corpus:
+        clip_name = os.path.splitext(os.path.basename(video_filepath))[0]
+        run_args = get_run_args(
+            config_filepath,
+            overrides,
+            video_filepath,
+            os.path.join(out_folder, name, clip_name),
+        )
+        logger.info(f"Running {name} on {video_filepath}")
+        runs[clip_name] = run_isolated(run_args)
+
+    return runs
+
+
+def log_comparison(
+    clip_name: str, base: dict, candidate: dict, comparison: dict
+):
+    """Logs the comparison of the runs of a single clip as a table."""
+
+    rows = [("fps", base["fps"], candidate["fps"], comparison["fps_change"])]
+    for stage, change in comparison["stage_latency_change"].items():
+        rows.append(
+            (
+                f"{stage}_ms",
+                base["stage_latency_ms"].get(stage, 0.0),
+                candidate["stage_latency_ms"].get(stage, 0.0),
+                change,
+            )
+        )
+    rows.append(
+        (
+            "peak_rss_mb",
+            base["peak_rss_mb"],
+            candidate["peak_rss_mb"],
+            comparison["memory_change"],
+        )
+    )
+
+    lines = [
+        f"{clip_name}:",
+        f"{'metric':<20}{'base':>12}{'candidate':>12}{'change':>10}",
+    ]
+    for metric, base_value, candidate_value, change in rows:
+        change_str = "-" if change is None else f"{change:+.1%}"
+        # the peak RSS is unknown on the platforms without it
+        base_str = "-" if base_value is None else str(base_value)
+        candidate_str = "-" if candidate_value is None else str(candidate_value)
+        lines.append(
+            f"{metric:<20}{base_str:>12}{candidate_str:>12}{change_str:>10}"
+        )
+    lines.append(
+        f"detection agreement {comparison['detections']['agreement']:.1%}, "
+        f"anomaly agreement {comparison['anomalies']['agreement']:.1%}"
+    )
+    logger.info("\n".join(lines))
+
+
+def main(args):
+    os.makedirs(args.out_folder, exist_ok=True)
+    report_filepath = args.report_filepath or os.path.join(
+        args.out_folder, "benchmark_report.json"
+    )
+
+    corpus = get_corpus(
+        args.corpus,
+        args.out_folder,
+        num_synthetic_clips=args.num_synthetic_clips,
+        num_frames=args.synthetic_num_frames,
+    )
+
+    if args.baseline_report:
+        with open(args.baseline_report) as f:
+            base_runs = json.load(f)["base"]
+    else:
+        base_runs = run_corpus(
+            corpus,
+            "base",
+            args.base_config,
+            json.loads(args.base_overrides),
+            args.out_folder,
+        )
+
+    report = {"corpus": corpus, "base": base_runs}
+    regressions = []
+    if not args.skip_candidate:
+        candidate_runs = run_corpus(
+            corpus,
+            "candidate",
+            args.candidate_config or args.base_config,
+            json.loads(args.candidate_overrides),
+            args.out_folder,
+        )
+        thresholds = {
+            name: None if getattr(args, name) < 0 else getattr(args, name)
+            for name in DEFAULT_THRESHOLDS
+        }
+
+        report["candidate"] = candidate_runs
+        report["comparison"] = {}
+        for clip_name, candidate in candidate_runs.items():
+            if clip_name not in base_runs:
+                logger.warning(f"{clip_name} is not in the base runs")
+                continue
+
+            comparison, clip_regressions = compare_runs(
+                base_runs[clip_name], candidate, thresholds
+            )
+            report["comparison"][clip_name] = comparison
+            log_comparison(
+                clip_name, base_runs[clip_name], candidate, comparison
+            )
+            regressions.extend(
+                f"{clip_name}: {regression}" for regression in clip_regressions
+            )
+        report["regressions"] = regressions
+
+    with open(report_filepath, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Report written to {report_filepath}")
+
+    if regressions:
+        logger.error("Regressions found:\n" + "\n".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    main(args)
@@ -5,27 +5,47 @@ confidence threshold and max age for tracks.
 
 Detected temporal anomalies in tracking are logged for further analysis.
 They will later be used for model training and fine-tuning.
+
+The heavy dependencies (torch, ultralytics, deep_sort_realtime) are imported
+only in the code paths that need them. With `--analyze_only`, the anomaly
+detection is re-run on the predictions of a previous run without them.
 """
 
+import json
 import os
 
 import configargparse
-from deep_sort_realtime.deepsort_tracker import DeepSort
 from loguru import logger
-from ultralytics import YOLO
 
-from temporal_consistency.frame_anomaly_detection import TemporalAnomalyDetector
-from temporal_consistency.object_detection_tracking import (
-    run_detection_and_tracking_pipeline,
+from temporal_consistency.annotation_export import (
+    ANNOTATIONS_FILENAME,
+    FrameAnnotations,
+    export_coco_shards,
+    export_frame_annotations,
+    export_yolo_shards,
+    get_annotation_records,
+)
+from temporal_consistency.anomaly_logging import configure_logging
+from temporal_consistency.anomaly_rules import build_rules
+from temporal_consistency.frame_anomaly_detection import (
+    EXPORT_STRATEGIES,
+    TemporalAnomalyDetector,
+)
+from temporal_consistency.frame_ranking import (
+    FRAME_SCORES_FILENAME,
+    UNCERTAINTY_MARGIN,
+    export_frame_scores,
+    get_frame_scores,
 )
 from temporal_consistency.utils import get_runtime_str
 
 
 CONFIDENCE_THRESHOLD = 0.4
 MAX_AGE = 25
+PREDICTIONS_FILENAME = "predictions.npz"
 
 
-def parse_args():
+def get_parser():
     parser = configargparse.ArgumentParser(
         description="Demo for parsing different types of data"
     )
@@ -72,32 +92,431 @@ def parse_args():
         choices=[0, 1, 2, 3],
         help="Each frame will go through up to 3 augmentations. 0-> no augmentation",
     )
+    parser.add_argument(
+        "--aug_seed",
+        type=int,
+        default=0,
+        help="Seed of the run, the augmentations of each frame are seeded by "
+        "the video, the frame ID and it",
+    )
+    parser.add_argument(
+        "--aug_cache",
+        default=None,
+        help="Folder of the augmented frame cache, repeated runs with the same "
+        "seed read the augmented frames from it. No caching if not given",
+    )
     parser.add_argument(
         "--out_video_fps",
         type=int,
         default=25,
         help="FPS of the output videos",
     )
+    parser.add_argument(
+        "--start",
+        default=None,
+        help="First frame to process, as a frame number or a timestamp "
+        "(i.e., 1500, 90s or 01:30). The video is seeked to it",
+    )
+    parser.add_argument(
+        "--end",
+        default=None,
+        help="Frame to stop at (exclusive), as a frame number or a timestamp",
+    )
+    parser.add_argument(
+        "--max_frames",
+        default=None,
+        help="Maximum number of frames to process, as a number of frames or "
+        "a duration (i.e., 3000 or 10:00)",
+    )
+    parser.add_argument(
+        "--roi",
+        type=int,
+        nargs=4,
+        default=None,
+        metavar=("LEFT", "TOP", "RIGHT", "BOTTOM"),
+        help="Static region of interest, objects are only detected in it",
+    )
+    parser.add_argument(
+        "--roi_mask",
+        default=None,
+        help="Path to a mask image, pixels outside the mask are not detected",
+    )
+    parser.add_argument(
+        "--detection_scale",
+        type=float,
+        default=1.0,
+        help="Frames are resized with this scale before the detection",
+    )
+    parser.add_argument(
+        "--tile_size",
+        type=int,
+        default=0,
+        help="Size of the tiles for tiled detection (i.e., small objects "
+        "in 4K frames). 0-> no tiling",
+    )
+    parser.add_argument(
+        "--tile_overlap",
+        type=float,
+        default=0.2,
+        help="Overlap ratio between the consecutive tiles",
+    )
+    parser.add_argument(
+        "--motion_threshold",
+        type=float,
+        default=0,
+        help="Detection is skipped on frames whose mean absolute difference "
+        "(0-255) to the last detected frame is below this. 0-> no skipping",
+    )
+    parser.add_argument(
+        "--max_skipped_frames",
+        type=int,
+        default=10,
+        help="A full detection is forced after this many skipped frames",
+    )
+    parser.add_argument(
+        "--target_fps",
+        type=float,
+        default=0,
+        help="The detection cadence, resolution and augmentations are adapted "
+        "to keep up with this FPS, within their bounds. 0-> static settings",
+    )
+    parser.add_argument(
+        "--min_detection_scale",
+        type=float,
+        default=0.5,
+        help="Lowest detection scale the adaptive controller can go down to",
+    )
+    parser.add_argument(
+        "--max_detection_interval",
+        type=int,
+        default=5,
+        help="Maximum number of frames between two detections with "
+        "the adaptive controller",
+    )
+    parser.add_argument(
+        "--frames_per_gap",
+        type=int,
+        default=1,
+        help="Number of frames sampled from each gap where an object is missing",
+    )
+    parser.add_argument(
+        "--anomaly_rules",
+        nargs="+",
+        default=None,
+        help="Names of the anomaly rules to apply, all the rules enabled by "
+        "default if not given. The bbox_size_jump, confidence_oscillation, "
+        "class_flicker and edge_exit rules are opt-in",
+    )
+    parser.add_argument(
+        "--rule_params",
+        default=None,
+        help="Parameters of the anomaly rules as JSON, "
+        'i.e. \'{"low_iou": {"min_iou": 0.4}}\'',
+    )
+    parser.add_argument(
+        "--max_anomaly_events",
+        type=int,
+        default=100,
+        help="Maximum number of logged anomaly events per anomaly type, the "
+        "rest are only counted. 0-> no limit",
+    )
+    parser.add_argument(
+        "--export_strategy",
+        default="first_per_object",
+        choices=EXPORT_STRATEGIES,
+        help="first_per_object: the frame of the first anomaly of each object, "
+        "cover: the frames explaining all the anomalies, deduplicated within "
+        "--export_window",
+    )
+    parser.add_argument(
+        "--export_budget",
+        type=int,
+        default=0,
+        help="Maximum number of anomaly frames exported per video. 0-> no limit",
+    )
+    parser.add_argument(
+        "--export_window",
+        type=int,
+        default=2,
+        help="An exported frame covers the anomalies within this many frames",
+    )
+    parser.add_argument(
+        "--annotation_formats",
+        nargs="*",
+        default=[],
+        choices=["coco", "yolo"],
+        help=f"Formats of the annotation shards exported along with "
+        f"{ANNOTATIONS_FILENAME}, which holds the predictions of all frames",
+    )
+    parser.add_argument(
+        "--shard_size",
+        type=int,
+        default=1000,
+        help="Number of frames in each annotation shard",
+    )
+    parser.add_argument(
+        "--uncertainty_margin",
+        type=float,
+        default=UNCERTAINTY_MARGIN,
+        help="Detections whose confidence is within this margin of the "
+        f"threshold are uncertain, they are scored in {FRAME_SCORES_FILENAME} "
+        "for labeling",
+    )
+    parser.add_argument(
+        "--clip_workers",
+        type=int,
+        default=0,
+        help="The per-object videos are extracted from the input video after "
+        "the run, by this many workers in parallel. 0-> exported one object "
+        "at a time",
+    )
+    parser.add_argument(
+        "--telemetry_filepath",
+        default=None,
+        help="Opt-in telemetry (memory, collection sizes, FPS) is written to "
+        "this CSV file, or to a Prometheus textfile if it ends with .prom",
+    )
+    parser.add_argument(
+        "--telemetry_interval",
+        type=float,
+        default=5.0,
+        help="Seconds between two telemetry samples",
+    )
+    parser.add_argument(
+        "--analyze_only",
+        default=None,
+        metavar="PREDICTIONS_FILEPATH",
+        help=f"Path to the {PREDICTIONS_FILENAME} of a previous run. Only the "
+        "anomaly detection is run on it, the detector is not loaded",
+    )
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="Skip rendering and writing the annotated output video",
+    )
 
+    return parser
+
+
+def parse_args():
+    parser = get_parser()
     args = parser.parse_args()
     return args
 
 
-def main(args):
+def create_run_folder(args):
+    """Creates a folder for the run under `args.out_folder` and updates
+    `args.out_folder` with it.
+    """
+
     runtime_str = get_runtime_str()
     args.out_folder = os.path.join(args.out_folder, runtime_str)
     os.makedirs(args.out_folder, exist_ok=True)
 
-    logfile = os.path.join(args.out_folder, "output.log")
-    logger.add(logfile)
 
-    model = YOLO("yolov8n.pt")
+def run_analysis(model, args, progress_callback=None, telemetry_gauges=None):
+    """Runs the detection, tracking and the temporal anomaly detection on
+    `args.video_filepath` with an already loaded model.
+
+    Args:
+        model (YOLO): Model used for object detection.
+        args (argparse.Namespace): Command line arguments.
+        progress_callback (Callable, optional): Called with the number of
+            processed frames and the number of frames in the video.
+        telemetry_gauges (dict, optional): Extra values sampled by the
+            telemetry, as name -> callable.
+
+    Returns:
+        TemporalAnomalyDetector: The detector holding the found anomalies.
+    """
+
+    from deep_sort_realtime.deepsort_tracker import DeepSort
+
+    from temporal_consistency.object_detection_tracking import (
+        run_detection_and_tracking_pipeline,
+    )
+
     deep_sort_tracker = DeepSort(max_age=args.max_age)
 
     tframe_collection = run_detection_and_tracking_pipeline(
-        model, deep_sort_tracker, args
+        model,
+        deep_sort_tracker,
+        args,
+        progress_callback=progress_callback,
+        telemetry_gauges=telemetry_gauges,
+    )
+    tframe_collection.export_predictions(
+        os.path.join(args.out_folder, PREDICTIONS_FILENAME)
     )
-    TemporalAnomalyDetector(tframe_collection)
+    export_annotations(tframe_collection, args)
+    if args.clip_workers > 0:
+        export_object_clips(tframe_collection, args)
+    anomaly_detector = detect_anomalies(tframe_collection, args)
+    score_frames(tframe_collection, anomaly_detector, args)
+    return anomaly_detector
+
+
+def run_analysis_only(args, progress_callback=None):
+    """Re-runs the temporal anomaly detection on the predictions exported by
+    a previous run (`args.analyze_only`). Neither the detector nor torch is
+    loaded, the frames to export are read from `args.video_filepath`.
+
+    Args:
+        args (argparse.Namespace): Command line arguments.
+        progress_callback (Callable, optional): Called with the number of
+            finished steps (loading, exports, anomaly detection, scoring)
+            and the number of steps, at the start and after each step.
+
+    Returns:
+        TemporalAnomalyDetector: The detector holding the found anomalies.
+    """
+
+    import cv2
+
+    from temporal_consistency.adaptive_control import (
+        ADJUSTMENTS_FILENAME,
+        AdaptiveController,
+    )
+    from temporal_consistency.object_detection_tracking import (
+        get_frame_augmenter,
+    )
+    from temporal_consistency.tracked_frame import TrackedFrameCollection
+
+    num_steps = 4
+
+    def report_progress(num_done_steps: int):
+        if progress_callback is not None:
+            progress_callback(num_done_steps, num_steps)
+
+    report_progress(0)
+
+    video_cap = cv2.VideoCapture(args.video_filepath)
+    tframe_collection = TrackedFrameCollection.from_predictions_file(
+        args.analyze_only, video_cap, args.out_folder
+    )
+    tframe_collection.augmenter = get_frame_augmenter(args)
+    # the frames are augmented with the operating points of the previous run
+    adjustments_filepath = os.path.join(
+        os.path.dirname(args.analyze_only), ADJUSTMENTS_FILENAME
+    )
+    if os.path.exists(adjustments_filepath):
+        tframe_collection.controller = AdaptiveController.from_adjustments_file(
+            adjustments_filepath
+        )
+    report_progress(1)
+    export_annotations(tframe_collection, args)
+    if args.clip_workers > 0:
+        export_object_clips(tframe_collection, args)
+    report_progress(2)
+    anomaly_detector = detect_anomalies(tframe_collection, args)
+    report_progress(3)
+    score_frames(tframe_collection, anomaly_detector, args)
+    video_cap.release()
+    report_progress(num_steps)
+
+    return anomaly_detector
+
+
+def export_annotations(tframe_collection, args):
+    """Exports the predictions of all frames as a frame-indexed file, and
+    optionally as COCO and/or YOLO shards.
+    """
+
+    filepath = os.path.join(tframe_collection.out_folder, ANNOTATIONS_FILENAME)
+    export_frame_annotations(tframe_collection, filepath)
+    if not args.annotation_formats:
+        return
+
+    frame_size = tframe_collection.get_frame_size()
+    if frame_size is None:
+        logger.warning("Unknown frame size, the annotation shards are skipped")
+        return
+
+    annotations = FrameAnnotations(filepath)
+    shard_folder = os.path.join(tframe_collection.out_folder, "annotations")
+    for annotation_format in args.annotation_formats:
+        export_shards = (
+            export_coco_shards
+            if annotation_format == "coco"
+            else export_yolo_shards
+        )
+        export_shards(
+            annotations, shard_folder, frame_size, shard_size=args.shard_size
+        )
+
+
+def export_object_clips(tframe_collection, args, video_filepath=None):
+    """Extracts the per-object videos from `video_filepath` (by default
+    `args.video_filepath`), with the augmentations of the run applied again.
+    """
+
+    from temporal_consistency.clip_extraction import (
+        extract_track_clips,
+        get_track_tubes,
+    )
+
+    extract_track_clips(
+        video_filepath or args.video_filepath,
+        get_track_tubes(tframe_collection),
+        tframe_collection.out_folder,
+        fps=args.out_video_fps,
+        num_workers=args.clip_workers,
+        augmenter=tframe_collection.augmenter,
+        controller=tframe_collection.controller,
+    )
+
+
+def score_frames(tframe_collection, anomaly_detector, args):
+    """Scores the frames by the detection uncertainty and the anomalies for
+    labeling, and exports the scores (see `rank_frames.py`).
+    """
+
+    records = anomaly_detector.anomaly_records
+    scores = get_frame_scores(
+        get_annotation_records(tframe_collection),
+        [record[1] for record in records],
+        [record[3] for record in records],
+        confidence_threshold=args.confidence,
+        margin=args.uncertainty_margin,
+    )
+    export_frame_scores(
+        os.path.join(tframe_collection.out_folder, FRAME_SCORES_FILENAME),
+        scores,
+    )
+
+
+def detect_anomalies(tframe_collection, args):
+    """Runs the temporal anomaly detection on the tracked frames."""
+
+    rule_params = json.loads(args.rule_params) if args.rule_params else {}
+    rule_params.setdefault("missing_object", {}).setdefault(
+        "frames_per_gap", args.frames_per_gap
+    )
+
+    anomaly_detector = TemporalAnomalyDetector(
+        tframe_collection,
+        export_budget=args.export_budget,
+        export_window=args.export_window,
+        export_strategy=args.export_strategy,
+        rules=build_rules(args.anomaly_rules, rule_params),
+        max_events_per_type=args.max_anomaly_events,
+    )
+    return anomaly_detector
+
+
+def main(args):
+    create_run_folder(args)
+
+    configure_logging(os.path.join(args.out_folder, "output.log"))
+
+    if args.analyze_only:
+        run_analysis_only(args)
+        return
+
+    from ultralytics import YOLO
+
+    model = YOLO("yolov8n.pt")
+    run_analysis(model, args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,144 @@
+"""This script is an entrypoint for running the detection, tracking and the
+temporal anomaly detection on many video sources (i.e., cameras) in a single
+process. Each source keeps its own tracker, predictions and anomalies, while
+the frames are batched across the sources into a single shared model, and the
+detections into a single shared appearance embedder.
+See `temporal_consistency.multi_stream`.
+
+It accepts the same options as `main.py`, which apply to all the sources:
+
+    python multi_stream.py --video_filepaths cam1.mp4 cam2.mp4 cam3.mp4
+"""
+
+import os
+
+from main import (
+    PREDICTIONS_FILENAME,
+    create_run_folder,
+    detect_anomalies,
+    export_annotations,
+    export_object_clips,
+    get_parser,
+    score_frames,
+)
+from temporal_consistency.anomaly_logging import configure_logging
+from temporal_consistency.multi_stream import MultiStreamRunner, VideoStream
+from temporal_consistency.object_detection_tracking import (
+    get_frame_augmenter,
+    get_frame_preprocessor,
+    get_motion_gate,
+)
+from temporal_consistency.utils import get_frame_range
+
+
+def parse_args():
+    parser = get_parser()
+    parser.add_argument(
+        "--video_filepaths",
+        nargs="+",
+        required=True,
+        help="Paths (or URLs) of the video sources",
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=8,
+        help="Maximum number of frames, one per source, detected at once",
+    )
+    parser.add_argument(
+        "--num_decode_threads",
+        type=int,
+        default=4,
+        help="Threads decoding and tracking the sources in parallel",
+    )
+
+    args = parser.parse_args()
+    return args
+
+
+def create_stream(stream_id: int, video_filepath: str, class_names, args):
+    """Creates a stream with its own tracker, preprocessor, motion gate and
+    augmenter. The tracker has no embedder, the appearance embeddings are
+    computed by the embedder shared by all the streams.
+    """
+
+    import cv2
+    from deep_sort_realtime.deepsort_tracker import DeepSort
+
+    video_name = os.path.splitext(os.path.basename(video_filepath))[0]
+    video_cap = cv2.VideoCapture(video_filepath)
+    frame_range = get_frame_range(
+        int(video_cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        video_cap.get(cv2.CAP_PROP_FPS),
+        start=args.start,
+        end=args.end,
+        max_frames=args.max_frames,
+    )
+    video_cap.release()
+
+    return VideoStream(
+        stream_id,
+        video_filepath,
+        DeepSort(max_age=args.max_age, embedder=None),
+        class_names,
+        os.path.join(args.out_folder, f"stream{stream_id}_{video_name}"),
+        preprocessor=get_frame_preprocessor(args),
+        motion_gate=get_motion_gate(args),
+        frame_range=frame_range,
+        augmenter=get_frame_augmenter(args, video_filepath),
+    )
+
+
+def finish_stream(args, stream: VideoStream):
+    """Exports the predictions of an ended stream, extracts its object clips
+    (with `--clip_workers`), detects its anomalies and scores its frames for
+    labeling.
+    """
+
+    collection = stream.tframe_collection
+    collection.export_predictions(
+        os.path.join(collection.out_folder, PREDICTIONS_FILENAME)
+    )
+    export_annotations(collection, args)
+    if args.clip_workers > 0:
+        export_object_clips(collection, args, stream.video_filepath)
+    stream.anomaly_detector = detect_anomalies(collection, args)
+    score_frames(collection, stream.anomaly_detector, args)
+
+
+def main(args):
+    create_run_folder(args)
+    configure_logging(os.path.join(args.out_folder, "output.log"))
+
+    from deep_sort_realtime.embedder.embedder_pytorch import (
+        MobileNetv2_Embedder,
+    )
+    from ultralytics import YOLO
+
+    model = YOLO("yolov8n.pt")
+    # a single embedder is loaded, instead of one per tracker
+    embedder = MobileNetv2_Embedder()
+    streams = [
+        create_stream(stream_id, video_filepath, model.names, args)
+        for stream_id, video_filepath in enumerate(args.video_filepaths)
+    ]
+
+    runner = MultiStreamRunner(
+        model,
+        streams,
+        batch_size=args.batch_size,
+        num_aug=args.num_aug,
+        confidence_threshold=args.confidence,
+        out_video_fps=args.out_video_fps,
+        num_decode_threads=args.num_decode_threads,
+        on_stream_done=lambda stream: finish_stream(args, stream),
+        embedder=embedder,
+        export_objects=args.clip_workers == 0,
+    )
+    runner.run()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    main(args)
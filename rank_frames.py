@@ -0,0 +1,88 @@
+"""This script ranks the frames of many runs (i.e., thousands of videos) for
+labeling. The frame scores exported by each run (frame_scores.csv, see
+`temporal_consistency.frame_ranking`) are merged into a single priority queue,
+and the top frames within the labeling budget are written to a CSV file.
+
+    python rank_frames.py --run_folders output/ --budget 500
+"""
+
+import csv
+import json
+import os
+
+import configargparse
+from loguru import logger
+
+from temporal_consistency.frame_ranking import (
+    FRAME_SCORES_FILENAME,
+    load_frame_scores,
+    rank_frames,
+)
+
+
+def parse_args():
+    parser = configargparse.ArgumentParser(
+        description="Ranks the frames of many runs for labeling"
+    )
+    parser.add_argument(
+        "--run_folders",
+        nargs="+",
+        required=True,
+        help=f"Folders searched recursively for {FRAME_SCORES_FILENAME}",
+    )
+    parser.add_argument(
+        "--budget",
+        type=int,
+        default=0,
+        help="Number of frames to select. 0-> all the scored frames",
+    )
+    parser.add_argument(
+        "--weights",
+        default=None,
+        help="Weights of the scores as JSON, i.e. '{\"anomaly\": 2.0}'. "
+        "The priorities of the runs are used if not given",
+    )
+    parser.add_argument(
+        "--out_filepath",
+        default="labeling_queue.csv",
+        help="Path to the CSV file of the selected frames",
+    )
+
+    args = parser.parse_args()
+    return args
+
+
+def find_frame_scores(run_folders: list[str]) -> dict:
+    """Loads the frame scores of all the runs, keyed by the run folder."""
+
+    frame_scores = {}
+    for run_folder in run_folders:
+        for root, _, filenames in os.walk(run_folder):
+            if FRAME_SCORES_FILENAME in filenames:
+                filepath = os.path.join(root, FRAME_SCORES_FILENAME)
+                frame_scores[root] = load_frame_scores(filepath)
+
+    return frame_scores
+
+
+def main(args):
+    frame_scores = find_frame_scores(args.run_folders)
+    weights = json.loads(args.weights) if args.weights else None
+    ranked = rank_frames(frame_scores, budget=args.budget, weights=weights)
+
+    with open(args.out_filepath, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["run_folder", "frame_id", "priority"])
+        writer.writerows(ranked)
+
+    num_frames = sum(len(scores) for scores in frame_scores.values())
+    logger.info(
+        f"Selected {len(ranked)} of {num_frames} scored frames of "
+        f"{len(frame_scores)} runs, written to {args.out_filepath}"
+    )
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    main(args)
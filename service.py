@@ -0,0 +1,118 @@
+"""This script is an entrypoint for running the temporal anomaly detection as
+a long-lived service. The model and the configuration are loaded once and kept
+warm, and the videos are accepted as jobs over a local HTTP API (or a Unix
+socket) and/or a watched folder. See `temporal_consistency.service`.
+
+Each job accepts the same options as `main.py` as overrides (validated with
+their types and choices), for example:
+
+    curl -X POST localhost:8765/jobs -d '{"video_filepath": "video.mp4"}'
+    curl localhost:8765/jobs/1
+"""
+
+import asyncio
+import functools
+import os
+
+from main import create_run_folder, get_parser, run_analysis, run_analysis_only
+from temporal_consistency.anomaly_logging import configure_logging
+from temporal_consistency.service import LockedModel, VideoJob, VideoJobService
+from temporal_consistency.telemetry import get_job_filepath
+
+
+def parse_args():
+    parser = get_parser()
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Host of the HTTP API",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8765,
+        help="Port of the HTTP API",
+    )
+    parser.add_argument(
+        "--socket_path",
+        default=None,
+        help="Serve the API on this Unix socket instead of host:port",
+    )
+    parser.add_argument(
+        "--watch_folder",
+        default=None,
+        help="Each new video file in this folder is processed as a job",
+    )
+    parser.add_argument(
+        "--poll_interval",
+        type=float,
+        default=2.0,
+        help="Seconds between the scans of the watched folder",
+    )
+    parser.add_argument(
+        "--max_concurrent_jobs",
+        type=int,
+        default=1,
+        help="Maximum number of videos processed at the same time",
+    )
+
+    args = parser.parse_args()
+    return args
+
+
+def run_video_job(model, job: VideoJob):
+    """Processes a single job with the warm model. With `analyze_only`, only
+    the anomaly detection is re-run on the given predictions.
+    """
+
+    job.args.out_folder = os.path.join(job.args.out_folder, f"job{job.job_id}")
+    create_run_folder(job.args)
+    if job.args.telemetry_filepath:
+        job.args.telemetry_filepath = get_job_filepath(
+            job.args.telemetry_filepath, job.job_id
+        )
+
+    if job.args.analyze_only:
+        # the progress is reported by analysis step, there are no frames
+        run_analysis_only(job.args, progress_callback=job.update_progress)
+        return
+
+    run_analysis(
+        model,
+        job.args,
+        progress_callback=job.update_progress,
+        telemetry_gauges=job.gauges,
+    )
+
+
+def main(args):
+    os.makedirs(args.out_folder, exist_ok=True)
+    configure_logging(os.path.join(args.out_folder, "service.log"))
+
+    from ultralytics import YOLO
+
+    model = YOLO("yolov8n.pt")
+    if args.max_concurrent_jobs > 1:
+        model = LockedModel(model)
+
+    service = VideoJobService(
+        functools.partial(run_video_job, model),
+        base_args=args,
+        max_concurrent_jobs=args.max_concurrent_jobs,
+        parser=get_parser(),
+    )
+    asyncio.run(
+        service.serve(
+            host=args.host,
+            port=args.port,
+            socket_path=args.socket_path,
+            watch_folder=args.watch_folder,
+            poll_interval=args.poll_interval,
+        )
+    )
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    main(args)
@@ -0,0 +1,242 @@
+"""This module contains `AdaptiveController` class which keeps a live run
+within a real-time deadline. It watches the measured latency of the frames
+(`TrackedFrame.latency_ms`) against the frame budget of a target FPS, and
+adapts the operating point of the pipeline within configured bounds:
+
+- the number of augmentations (`num_aug`),
+- the input resolution of the detector (`FramePreprocessor.scale`),
+- the detection interval, i.e. the detection runs on every N-th frame and the
+  other frames only use the tracker predictions.
+
+When the smoothed latency exceeds the budget, the cheapest knob to give up
+is degraded first (augmentations, then resolution, then cadence); when there
+is enough headroom, the knobs are restored in the reverse order. Every
+adjustment is logged and kept, so that the anomalies of a run can be
+interpreted with the operating point at their frames in mind.
+"""
+
+import json
+from typing import Optional
+
+from loguru import logger
+
+from temporal_consistency.augmentations import FrameAugmenter
+from temporal_consistency.frame_preprocessing import FramePreprocessor
+
+
+ADJUSTMENTS_FILENAME = "operating_points.json"
+SCALE_STEP = 0.8
+
+
+class AdaptiveController:
+    """Adapts the detection cadence, resolution and augmentations to keep
+    the per-frame latency within the budget of a target FPS.
+    """
+
+    def __init__(
+        self,
+        target_fps: float,
+        num_aug: int = 0,
+        scale: float = 1.0,
+        min_scale: float = 0.5,
+        max_detection_interval: int = 5,
+        adjust_every: int = 10,
+        smoothing: float = 0.2,
+        tolerance: float = 0.1,
+        headroom: float = 0.3,
+    ):
+        """Initializes the AdaptiveController.
+
+        Args:
+            target_fps (float): Frames per second the run has to keep up with.
+            num_aug (int): Maximum (and initial) number of augmentations.
+            scale (float): Maximum (and initial) detection scale.
+            min_scale (float): Minimum detection scale.
+            max_detection_interval (int): Maximum number of frames between
+                two detections.
+            adjust_every (int): Minimum number of frames between two
+                adjustments, so that the latency settles in between.
+            smoothing (float): Weight of the latest frame in the exponential
+                moving average of the latency.
+            tolerance (float): The operating point is degraded when the
+                latency exceeds the budget by more than this ratio.
+            headroom (float): The operating point is restored when the
+                latency is below the budget by more than this ratio.
+        """
+
+        if target_fps <= 0:
+            raise ValueError(f"target_fps must be positive, got {target_fps}")
+        if not 0 < min_scale <= scale:
+            raise ValueError(
+                f"min_scale must be in (0, {scale}], got {min_scale}"
+            )
+
+        self.budget_ms = 1000 / target_fps
+        self.max_num_aug = num_aug
+        self.max_scale = scale
+        self.min_scale = min_scale
+        self.max_detection_interval = max(max_detection_interval, 1)
+        self.adjust_every = adjust_every
+        self.smoothing = smoothing
+        self.tolerance = tolerance
+        self.headroom = headroom
+
+        self.num_aug = num_aug
+        self.scale = scale
+        self.detection_interval = 1
+
+        self.latency_ms = None
+        self.num_frames_since_adjustment = 0
+        self.num_skipped = 0
+        self.initial_operating_point = self.get_operating_point()
+        self.adjustments: list = []
+
+    def get_operating_point(self) -> dict:
+        return {
+            "num_aug": self.num_aug,
+            "scale": self.scale,
+            "detection_interval": self.detection_interval,
+        }
+
+    def configure(
+        self,
+        preprocessor: FramePreprocessor,
+        augmenter: Optional[FrameAugmenter] = None,
+    ):
+        """Applies the current resolution and augmentations to the stages."""
+
+        preprocessor.scale = self.scale
+        if augmenter is not None:
+            augmenter.num_aug = self.num_aug
+
+    def should_detect(self) -> bool:
+        """Checks if the detection runs on the next frame, given the current
+        detection interval.
+        """
+
+        detect = self.num_skipped >= self.detection_interval - 1
+        self.num_skipped = 0 if detect else self.num_skipped + 1
+
+        return detect
+
+    def update(self, frame_id: int, latency_ms: float):
+        """Adds the measured latency of a frame, and adjusts the operating
+        point if the smoothed latency is out of the target range.
+
+        Args:
+            frame_id (int): ID of the frame.
+            latency_ms (float): Time spent on the frame in milliseconds.
+        """
+
+        if self.latency_ms is None:
+            self.latency_ms = latency_ms
+        else:
+            self.latency_ms += self.smoothing * (latency_ms - self.latency_ms)
+
+        self.num_frames_since_adjustment += 1
+        if self.num_frames_since_adjustment < self.adjust_every:
+            return
+
+        if self.latency_ms > self.budget_ms * (1 + self.tolerance):
+            self.degrade(frame_id)
+        elif self.latency_ms < self.budget_ms * (1 - self.headroom):
+            self.restore(frame_id)
+
+    def degrade(self, frame_id: int):
+        """Gives up the cheapest knob that is not at its bound yet."""
+
+        if self.num_aug > 0:
+            self.adjust(frame_id, "num_aug", self.num_aug - 1)
+        elif self.scale > self.min_scale:
+            scale = max(round(self.scale * SCALE_STEP, 3), self.min_scale)
+            self.adjust(frame_id, "scale", scale)
+        elif self.detection_interval < self.max_detection_interval:
+            self.adjust(
+                frame_id, "detection_interval", self.detection_interval + 1
+            )
+
+    def restore(self, frame_id: int):
+        """Restores the knobs in the reverse order they are given up."""
+
+        if self.detection_interval > 1:
+            self.adjust(
+                frame_id, "detection_interval", self.detection_interval - 1
+            )
+        elif self.scale < self.max_scale:
+            scale = min(round(self.scale / SCALE_STEP, 3), self.max_scale)
+            self.adjust(frame_id, "scale", scale)
+        elif self.num_aug < self.max_num_aug:
+            self.adjust(frame_id, "num_aug", self.num_aug + 1)
+
+    def adjust(self, frame_id: int, knob: str, value):
+        """Sets a knob of the operating point, and logs the adjustment."""
+
+        adjustment = {
+            "frame_id": frame_id,
+            "knob": knob,
+            "old": getattr(self, knob),
+            "new": value,
+            "latency_ms": round(self.latency_ms, 2),
+            "budget_ms": round(self.budget_ms, 2),
+        }
+        setattr(self, knob, value)
+        self.adjustments.append(adjustment)
+        self.num_frames_since_adjustment = 0
+
+        logger.info(
+            f"Frame {frame_id}: {knob} {adjustment['old']} -> {value} "
+            f"(latency {self.latency_ms:.1f} ms, "
+            f"budget {self.budget_ms:.1f} ms)"
+        )
+
+    def get_operating_point_at(self, frame_id: int) -> dict:
+        """Returns the operating point the given frame was processed with."""
+
+        operating_point = dict(self.initial_operating_point)
+        for adjustment in self.adjustments:
+            if adjustment["frame_id"] >= frame_id:
+                break
+            operating_point[adjustment["knob"]] = adjustment["new"]
+
+        return operating_point
+
+    @classmethod
+    def from_adjustments_file(cls, filepath: str):
+        """Loads a controller exported by `export_adjustments`, so that the
+        operating point of each frame of a previous run can be looked up.
+        """
+
+        with open(filepath) as f:
+            exported = json.load(f)
+
+        bounds = exported["bounds"]
+        controller = cls(
+            1000 / exported["budget_ms"],
+            num_aug=bounds["num_aug"][1],
+            scale=bounds["scale"][1],
+            min_scale=bounds["scale"][0],
+            max_detection_interval=bounds["detection_interval"][1],
+        )
+        controller.initial_operating_point = exported["initial"]
+        controller.adjustments = exported["adjustments"]
+
+        return controller
+
+    def export_adjustments(self, filepath: str):
+        """Exports the initial operating point and all the adjustments."""
+
+        with open(filepath, "w") as f:
+            json.dump(
+                {
+                    "budget_ms": self.budget_ms,
+                    "initial": self.initial_operating_point,
+                    "bounds": {
+                        "num_aug": [0, self.max_num_aug],
+                        "scale": [self.min_scale, self.max_scale],
+                        "detection_interval": [1, self.max_detection_interval],
+                    },
+                    "adjustments": self.adjustments,
+                },
+                f,
+                indent=2,
+            )
@@ -0,0 +1,347 @@
+"""This module contains the bulk export of the predictions of all frames for
+labeling tools (i.e., model assisted labeling), as a single frame-indexed
+binary file, instead of a small text file per frame.
+
+The file consists of
+
+1. a fixed-size header (magic, first frame ID, number of frames, number of
+   records, size of the class names),
+2. the class names as JSON,
+3. a frame offset index: `num_frames + 1` int64 offsets into the records,
+   the records of frame `f` are `[offsets[i], offsets[i + 1])` where
+   `i = f - first_frame`,
+4. the records sorted by frame ID, as a NumPy structured array
+   (`RECORD_DTYPE`) of both the tracked (high confidence) and the
+   low-confidence detections.
+
+`FrameAnnotations` memory-maps the file, so reading the boxes of any frame is
+O(1) and only touches the pages of that frame. The annotations can also be
+exported as COCO JSON or YOLO label shards (see `export_coco_shards` and
+`export_yolo_shards`).
+"""
+
+import io
+import json
+import os
+import struct
+import tarfile
+
+import numpy
+
+
+ANNOTATIONS_FILENAME = "annotations.bin"
+MAGIC = b"TCANN001"
+HEADER_FORMAT = "<8sqqqq"
+HEADER_SIZE = 64
+ALIGNMENT = 8
+SHARD_SIZE = 1000
+
+RECORD_DTYPE = numpy.dtype(
+    [
+        ("frame_id", "<i8"),
+        ("object_id", "<i8"),
+        ("ltrb", "<f4", (4,)),
+        ("confidence", "<f4"),
+        ("class_id", "<i4"),
+        ("is_low_confidence", "?"),
+    ]
+)
+
+
+def get_padding(size: int) -> int:
+    return -size % ALIGNMENT
+
+
+def get_annotation_records(tframe_collection) -> numpy.ndarray:
+    """Collects the tracked and the low-confidence detections of all frames
+    as records sorted by frame ID. The object ID of the low-confidence
+    detections (and of non-numeric track IDs) is -1.
+    """
+
+    predictions = [
+        (object_id, pred)
+        for object_id, track_info in tframe_collection.all_objects.items()
+        for pred in track_info.values()
+    ]
+    low_conf_frame_ids, low_conf_boxes = (
+        tframe_collection.get_low_confidence_arrays()
+    )
+
+    records = numpy.zeros(
+        len(predictions) + len(low_conf_frame_ids), dtype=RECORD_DTYPE
+    )
+    num_tracked = len(predictions)
+    tracked = records[:num_tracked]
+    tracked["frame_id"] = [pred.frame_id for _, pred in predictions]
+    tracked["object_id"] = [
+        int(object_id) if str(object_id).isdigit() else -1
+        for object_id, _ in predictions
+    ]
+    tracked["ltrb"] = numpy.array(
+        [pred.ltrb for _, pred in predictions], dtype=numpy.float32
+    ).reshape(-1, 4)
+    tracked["confidence"] = [
+        numpy.nan if pred.confidence is None else pred.confidence
+        for _, pred in predictions
+    ]
+    tracked["class_id"] = [
+        -1 if pred.class_id is None else pred.class_id
+        for _, pred in predictions
+    ]
+
+    low_conf = records[num_tracked:]
+    low_conf["frame_id"] = low_conf_frame_ids
+    low_conf["object_id"] = -1
+    low_conf["ltrb"] = low_conf_boxes[:, :4]
+    low_conf["confidence"] = low_conf_boxes[:, 4]
+    low_conf["class_id"] = low_conf_boxes[:, 5]
+    low_conf["is_low_confidence"] = True
+
+    return records[numpy.argsort(records["frame_id"], kind="stable")]
+
+
+def write_annotations(filepath: str, records: numpy.ndarray, class_names: dict):
+    """Writes the records (sorted by frame ID) as a frame-indexed file.
+
+    Args:
+        filepath (str): Path to the output file.
+        records (numpy.ndarray): Records of `RECORD_DTYPE`, sorted by frame ID.
+        class_names (dict): Class IDs as keys and class names as values.
+    """
+
+    frame_ids = records["frame_id"]
+    first_frame = int(frame_ids[0]) if len(records) else 0
+    num_frames = int(frame_ids[-1]) - first_frame + 1 if len(records) else 0
+    offsets = numpy.searchsorted(
+        frame_ids, numpy.arange(first_frame, first_frame + num_frames + 1)
+    ).astype("<i8")
+
+    names = json.dumps({str(k): v for k, v in class_names.items()}).encode()
+    header = struct.pack(
+        HEADER_FORMAT, MAGIC, first_frame, num_frames, len(records), len(names)
+    )
+
+    with open(filepath, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.write(names + b"\0" * get_padding(len(names)))
+        f.write(offsets.tobytes())
+        f.write(records.astype(RECORD_DTYPE).tobytes())
+
+
+def export_frame_annotations(tframe_collection, filepath: str):
+    """Exports the predictions of all frames of the collection as
+    a frame-indexed file, see `FrameAnnotations` for reading it.
+    """
+
+    write_annotations(
+        filepath,
+        get_annotation_records(tframe_collection),
+        tframe_collection.class_names,
+    )
+
+
+class FrameAnnotations:
+    """Memory-mapped reader of a frame-indexed annotations file."""
+
+    def __init__(self, filepath: str):
+        with open(filepath, "rb") as f:
+            header = f.read(HEADER_SIZE)
+            magic, first_frame, num_frames, num_records, names_size = (
+                struct.unpack_from(HEADER_FORMAT, header)
+            )
+            if magic != MAGIC:
+                raise ValueError(f"{filepath} is not an annotations file")
+            names = json.loads(f.read(names_size) or b"{}")
+
+        self.filepath = filepath
+        self.first_frame = first_frame
+        self.num_frames = num_frames
+        self.num_records = num_records
+        self.class_names = {int(k): v for k, v in names.items()}
+
+        offsets_start = HEADER_SIZE + names_size + get_padding(names_size)
+        records_start = offsets_start + (num_frames + 1) * 8
+        self.offsets = numpy.memmap(
+            filepath,
+            dtype="<i8",
+            mode="r",
+            offset=offsets_start,
+            shape=(num_frames + 1,),
+        )
+        self.records = (
+            numpy.memmap(
+                filepath,
+                dtype=RECORD_DTYPE,
+                mode="r",
+                offset=records_start,
+                shape=(num_records,),
+            )
+            if num_records > 0
+            else numpy.zeros(0, dtype=RECORD_DTYPE)
+        )
+
+    def __len__(self) -> int:
+        return self.num_records
+
+    @property
+    def frame_ids(self) -> range:
+        return range(self.first_frame, self.first_frame + self.num_frames)
+
+    def get_frame(self, frame_id: int) -> numpy.ndarray:
+        """Returns the records of a frame as a read-only view, empty if there
+        are no predictions in the frame.
+        """
+
+        idx = frame_id - self.first_frame
+        if not 0 <= idx < self.num_frames:
+            return self.records[:0]
+
+        return self.records[self.offsets[idx] : self.offsets[idx + 1]]
+
+
+def get_shards(annotations: FrameAnnotations, shard_size: int):
+    """Yields the frame IDs with predictions in shards of `shard_size`."""
+
+    frame_ids = numpy.asarray(annotations.frame_ids)
+    has_records = numpy.diff(numpy.asarray(annotations.offsets)) > 0
+    frame_ids = frame_ids[has_records].tolist()
+
+    for start in range(0, len(frame_ids), shard_size):
+        yield frame_ids[start : start + shard_size]
+
+
+def select_records(records, include_low_confidence: bool):
+    if include_low_confidence:
+        return records
+    return records[~records["is_low_confidence"]]
+
+
+def export_coco_shards(
+    annotations: FrameAnnotations,
+    out_folder: str,
+    frame_size: tuple[int, int],
+    shard_size: int = SHARD_SIZE,
+    include_low_confidence: bool = False,
+) -> list[str]:
+    """Exports the annotations as COCO JSON files of up to `shard_size`
+    frames each. The images are named frame{frame_id}.jpg, as in the
+    anomaly exports.
+
+    Returns:
+        list[str]: Paths to the shards.
+    """
+
+    os.makedirs(out_folder, exist_ok=True)
+    width, height = frame_size
+    categories = [
+        {"id": class_id, "name": name}
+        for class_id, name in annotations.class_names.items()
+    ]
+
+    filepaths = []
+    annotation_id = 0
+    for shard_idx, frame_ids in enumerate(get_shards(annotations, shard_size)):
+        images, coco_annotations = [], []
+        for frame_id in frame_ids:
+            images.append(
+                {
+                    "id": frame_id,
+                    "file_name": f"frame{frame_id}.jpg",
+                    "width": width,
+                    "height": height,
+                }
+            )
+            records = select_records(
+                annotations.get_frame(frame_id), include_low_confidence
+            )
+            for record in records.tolist():
+                _, object_id, ltrb, confidence, class_id, _ = record
+                x1, y1, x2, y2 = ltrb.tolist()
+                score = None if numpy.isnan(confidence) else confidence
+                coco_annotations.append(
+                    {
+                        "id": annotation_id,
+                        "image_id": frame_id,
+                        "category_id": class_id,
+                        "bbox": [x1, y1, x2 - x1, y2 - y1],
+                        "area": (x2 - x1) * (y2 - y1),
+                        "iscrowd": 0,
+                        "score": score,
+                        "track_id": object_id,
+                    }
+                )
+                annotation_id += 1
+
+        filepath = os.path.join(out_folder, f"coco_{shard_idx:05d}.json")
+        with open(filepath, "w") as f:
+            json.dump(
+                {
+                    "images": images,
+                    "annotations": coco_annotations,
+                    "categories": categories,
+                },
+                f,
+            )
+        filepaths.append(filepath)
+
+    return filepaths
+
+
+def export_yolo_shards(
+    annotations: FrameAnnotations,
+    out_folder: str,
+    frame_size: tuple[int, int],
+    shard_size: int = SHARD_SIZE,
+    include_low_confidence: bool = False,
+) -> list[str]:
+    """Exports the annotations as tar archives of up to `shard_size` YOLO
+    label files (frame{frame_id}.txt with normalized "class cx cy w h"
+    lines) each, along with classes.txt. The bboxes are clipped to the frame,
+    so the coordinates are in [0, 1], and the ones outside it are dropped.
+
+    Returns:
+        list[str]: Paths to the shards.
+    """
+
+    os.makedirs(out_folder, exist_ok=True)
+    frame_size = numpy.array(frame_size * 2, dtype=numpy.float64)
+    num_classes = max(annotations.class_names, default=-1) + 1
+    classes = "\n".join(
+        annotations.class_names.get(i, str(i)) for i in range(num_classes)
+    )
+
+    filepaths = []
+    for shard_idx, frame_ids in enumerate(get_shards(annotations, shard_size)):
+        filepath = os.path.join(out_folder, f"yolo_{shard_idx:05d}.tar")
+        with tarfile.open(filepath, "w") as tar:
+            add_to_tar(tar, "classes.txt", classes)
+            for frame_id in frame_ids:
+                records = select_records(
+                    annotations.get_frame(frame_id), include_low_confidence
+                )
+                ltrb = numpy.clip(
+                    records["ltrb"].astype(numpy.float64), 0, frame_size
+                )
+                is_inside = (ltrb[:, 2:] > ltrb[:, :2]).all(axis=1)
+                ltrb = ltrb[is_inside]
+                class_ids = records["class_id"][is_inside]
+                centers = (ltrb[:, :2] + ltrb[:, 2:]) / 2
+                sizes = ltrb[:, 2:] - ltrb[:, :2]
+                cxcywh = numpy.hstack([centers, sizes]) / frame_size
+                lines = [
+                    f"{class_id} {cx:.6f} {cy:.6f} {w:.6f} {h:.6f}"
+                    for class_id, (cx, cy, w, h) in zip(
+                        class_ids.tolist(), cxcywh.tolist()
+                    )
+                ]
+                add_to_tar(tar, f"frame{frame_id}.txt", "\n".join(lines))
+        filepaths.append(filepath)
+
+    return filepaths
+
+
+def add_to_tar(tar: tarfile.TarFile, name: str, text: str):
+    data = text.encode()
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
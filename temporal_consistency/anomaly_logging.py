@@ -0,0 +1,140 @@
+"""This module contains `AnomalyEventLogger` class for the structured logging
+of the anomalies found by `TemporalAnomalyDetector`.
+
+Each anomaly is a structured event (object ID, frame ID, type, severity and
+the details of the rule), which is written as a JSON line to a dedicated,
+enqueued loguru sink, so the scan loop doesn't block on the disk. The events
+are marked with the ID of their logger, and the other sinks of the entrypoints
+filter them out (see `configure_logging`), so they are not written to stderr
+and output.log synchronously. Noisy
+videos produce thousands of anomalies, so the events are rate limited per
+anomaly type: only the first `max_events_per_type` events of each type are
+logged, and the rest are only counted. The counters are logged as a single
+summary at the end.
+"""
+
+import itertools
+import sys
+from collections import Counter
+from typing import Optional
+
+from loguru import logger
+
+
+ANOMALY_LOG_FILENAME = "anomalies.jsonl"
+MAX_EVENTS_PER_TYPE = 100
+
+_logger_ids = itertools.count()
+
+
+def is_not_anomaly_event(record: dict) -> bool:
+    """Filters the anomaly events out of the loguru sinks."""
+
+    return "anomaly_logger_id" not in record["extra"]
+
+
+def configure_logging(logfile: Optional[str] = None):
+    """Replaces the loguru sinks with stderr and an optional enqueued log file,
+    which do not receive the anomaly events.
+
+    Args:
+        logfile (str, optional): Path of the log file.
+    """
+
+    logger.remove()
+    logger.add(sys.stderr, filter=is_not_anomaly_event)
+    if logfile is not None:
+        logger.add(logfile, filter=is_not_anomaly_event, enqueue=True)
+
+
+class AnomalyEventLogger:
+    """Logs the anomaly events with per-type rate limiting."""
+
+    def __init__(
+        self,
+        filepath: Optional[str] = None,
+        max_events_per_type: int = MAX_EVENTS_PER_TYPE,
+    ):
+        """Initializes the AnomalyEventLogger.
+
+        Args:
+            filepath (str, optional): JSON lines file the events are written
+                to, the events only go to the existing sinks if None.
+            max_events_per_type (int): Maximum number of logged events per
+                anomaly type, 0 means no limit.
+        """
+
+        self.max_events_per_type = max_events_per_type
+        self.num_events: Counter = Counter()
+        self.num_dropped: Counter = Counter()
+
+        # concurrent runs (i.e., in the service) only write their own events
+        self.logger_id = next(_logger_ids)
+        self.logger = logger.bind(anomaly_logger_id=self.logger_id)
+
+        self.sink_id = None
+        if filepath is not None:
+            self.sink_id = logger.add(
+                filepath,
+                level="DEBUG",
+                filter=self.is_own_event,
+                serialize=True,
+                enqueue=True,
+            )
+
+    def is_own_event(self, record: dict) -> bool:
+        """Filters the loguru records of the events of this logger."""
+
+        return record["extra"].get("anomaly_logger_id") == self.logger_id
+
+    def log(
+        self,
+        object_id: str,
+        frame_id: int,
+        anomaly_type: str,
+        severity: float,
+        details: Optional[dict] = None,
+    ):
+        """Logs a single anomaly event, unless the rate limit of its type is
+        reached. The event is counted either way.
+        """
+
+        self.num_events[anomaly_type] += 1
+        if 0 < self.max_events_per_type < self.num_events[anomaly_type]:
+            self.num_dropped[anomaly_type] += 1
+            return
+
+        # the keyword arguments are added to the record as structured fields
+        self.logger.debug(
+            "{anomaly_type} anomaly of object {object_id} at frame {frame_id}",
+            object_id=str(object_id),
+            frame_id=frame_id,
+            anomaly_type=anomaly_type,
+            severity=round(severity, 4),
+            details=details or {},
+        )
+
+    def get_counters(self) -> dict:
+        """Returns the number of events and the number of rate limited
+        (not logged) events per anomaly type.
+        """
+
+        return {
+            "events": dict(self.num_events),
+            "rate_limited": dict(self.num_dropped),
+        }
+
+    def close(self):
+        """Logs the summary of the counters, flushes and removes the sink."""
+
+        num_dropped = sum(self.num_dropped.values())
+        if num_dropped > 0:
+            logger.info(
+                f"Rate limited {num_dropped} anomaly events: "
+                f"{dict(self.num_dropped)}"
+            )
+
+        if self.sink_id is not None:
+            # removing an enqueued sink waits until its queue is written
+            logger.remove(self.sink_id)
+            self.sink_id = None
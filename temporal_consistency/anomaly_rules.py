@@ -0,0 +1,421 @@
+"""This module contains the anomaly rules run by `TemporalAnomalyDetector`.
+
+Each rule is a subclass of `AnomalyRule`, registered with `register_rule`
+under its name, and declares its config parameters with their defaults.
+A rule is evaluated on the columnar data of a single track (`TrackSummary`)
+with vectorized NumPy operations, so its cost is O(track length). All the
+enabled rules are applied to every track. The rules with `enabled_by_default`
+set to False are opt-in, i.e. only run when they are named explicitly.
+
+New rules can be added by subclassing `AnomalyRule`:
+
+    @register_rule
+    class MyRule(AnomalyRule):
+        name = "my_rule"
+        default_params = {"threshold": 0.5}
+
+        def evaluate(self, track, context):
+            ...
+            return [(frame_id, severity, details)]
+"""
+
+import numpy
+
+from temporal_consistency.track_summary import TrackSummary
+
+
+MIN_IOU_THRESH = 0.5
+EDGE_MARGIN = 20
+MAX_EDGE_SHIFT = 0.5
+
+RULE_REGISTRY: dict = {}
+
+
+def register_rule(rule_cls):
+    """Registers an anomaly rule class under its name."""
+
+    RULE_REGISTRY[rule_cls.name] = rule_cls
+    return rule_cls
+
+
+class AnomalyRule:
+    """Base class of the anomaly rules.
+
+    Attributes:
+        name (str): Name of the rule, also the type of its anomalies.
+        severity (float): Base severity of the anomalies of the rule, used for
+            selecting the frames to export.
+        default_params (dict): Config parameters of the rule with defaults.
+        enabled_by_default (bool): Whether the rule is run when the rules are
+            not named explicitly.
+    """
+
+    name = ""
+    severity = 1.0
+    default_params: dict = {}
+    enabled_by_default = True
+
+    def __init__(self, **params):
+        unknown = set(params).difference(self.default_params)
+        if unknown:
+            raise ValueError(f"Unknown params for {self.name}: {unknown}")
+
+        self.params = {**self.default_params, **params}
+        self.num_suppressed = 0
+
+    def evaluate(self, track: TrackSummary, context: dict) -> list[tuple]:
+        """Evaluates the rule on a single track.
+
+        Args:
+            track (TrackSummary): Columnar view and statistics of the track.
+            context (dict): Information about the video, `frame_size` as
+                (width, height) and `last_frame_id`, None if unknown.
+
+        Returns:
+            list[tuple]: (frame_id, severity, details) of each anomaly, where
+                the severity is in [0, 1] and details is a dict.
+        """
+
+        raise NotImplementedError
+
+
+@register_rule
+class ClassInconsistencyRule(AnomalyRule):
+    """The object is detected as more than one class. The anomaly is
+    the first frame where the class changes.
+    """
+
+    name = "class_inconsistency"
+
+    def evaluate(self, track, context):
+        if track.num_classes <= 1:
+            return []
+
+        details = {"classes": sorted(track.class_histogram)}
+        return [(track.get_first_class_change(), 1.0, details)]
+
+
+@register_rule
+class MissingObjectRule(AnomalyRule):
+    """The object is missing in intermediate frames. Representative frames
+    are sampled from each gap.
+    """
+
+    name = "missing_object"
+    severity = 0.5
+    default_params = {"frames_per_gap": 1}
+
+    def evaluate(self, track, context):
+        anomalies = []
+        for start, length in track.gaps:
+            details = {"gap_start": start, "gap_length": length}
+            for frame_id in sample_gap_frames(
+                start, length, self.params["frames_per_gap"]
+            ):
+                anomalies.append((frame_id, 1.0, details))
+
+        return anomalies
+
+
+@register_rule
+class SingleFrameRule(AnomalyRule):
+    """The object is detected in a single frame only, which may indicate
+    a false detection.
+    """
+
+    name = "single_frame"
+    severity = 0.5
+
+    def evaluate(self, track, context):
+        if track.num_detected != 1:
+            return []
+
+        frame_id = int(track.frame_ids[track.is_detected][0])
+        return [(frame_id, 1.0, {})]
+
+
+@register_rule
+class LowIouRule(AnomalyRule):
+    """The IoU between consecutive observations is below a threshold,
+    indicating potential tracking issues.
+
+    Objects entering or leaving the scene are truncated by the frame edges,
+    so their bboxes change size and the IoU drops although the tracking is
+    correct. When the frame size is known, a low IoU pair with a bbox within
+    `edge_margin` pixels of an edge is suppressed if the sides away from the
+    edges moved consistently (see `is_edge_truncation`).
+    """
+
+    name = "low_iou"
+    default_params = {
+        "min_iou": MIN_IOU_THRESH,
+        "edge_margin": EDGE_MARGIN,
+        "max_edge_shift": MAX_EDGE_SHIFT,
+    }
+
+    def evaluate(self, track, context):
+        ious = track.ious
+        is_low_iou = ious < self.params["min_iou"]
+
+        frame_size = context.get("frame_size")
+        if frame_size is not None and is_low_iou.any():
+            ltrb = track.ltrb[track.is_detected]
+            is_truncation = is_edge_truncation(
+                ltrb[:-1],
+                ltrb[1:],
+                frame_size,
+                self.params["edge_margin"],
+                self.params["max_edge_shift"],
+            )
+            self.num_suppressed += int((is_low_iou & is_truncation).sum())
+            is_low_iou &= ~is_truncation
+
+        low_iou_idx = numpy.flatnonzero(is_low_iou)
+
+        return [
+            (
+                int(track.pair_frame_ids[0, idx]),
+                1 - float(ious[idx]),
+                {
+                    "iou": round(float(ious[idx]), 4),
+                    "frame_j": int(track.pair_frame_ids[1, idx]),
+                },
+            )
+            for idx in low_iou_idx.tolist()
+        ]
+
+
+@register_rule
+class BboxSizeJumpRule(AnomalyRule):
+    """The bbox area changes by more than `max_area_ratio` times between
+    consecutive observations.
+    """
+
+    name = "bbox_size_jump"
+    default_params = {"max_area_ratio": 2.0}
+    enabled_by_default = False
+
+    def evaluate(self, track, context):
+        ltrb = track.ltrb[track.is_detected]
+        areas = numpy.maximum(
+            (ltrb[:, 2] - ltrb[:, 0]) * (ltrb[:, 3] - ltrb[:, 1]), 1
+        )
+        ratios = numpy.maximum(areas[1:] / areas[:-1], areas[:-1] / areas[1:])
+        jump_idx = numpy.flatnonzero(ratios > self.params["max_area_ratio"])
+
+        return [
+            (
+                int(track.pair_frame_ids[1, idx]),
+                1 - 1 / float(ratios[idx]),
+                {"area_ratio": round(float(ratios[idx]), 2)},
+            )
+            for idx in jump_idx.tolist()
+        ]
+
+
+@register_rule
+class ConfidenceOscillationRule(AnomalyRule):
+    """The confidence swings up and down by at least `min_swing` between
+    consecutive observations, at least `min_oscillations` times.
+    """
+
+    name = "confidence_oscillation"
+    severity = 0.5
+    default_params = {"min_swing": 0.3, "min_oscillations": 2}
+    enabled_by_default = False
+
+    def evaluate(self, track, context):
+        is_valid = track.is_detected & ~numpy.isnan(track.confidences)
+        diffs = numpy.diff(track.confidences[is_valid])
+
+        is_swing = numpy.abs(diffs) >= self.params["min_swing"]
+        is_oscillation = (
+            is_swing[1:]
+            & is_swing[:-1]
+            & (numpy.sign(diffs[1:]) != numpy.sign(diffs[:-1]))
+        )
+        num_oscillations = int(is_oscillation.sum())
+        if num_oscillations < self.params["min_oscillations"]:
+            return []
+
+        frame_ids = track.frame_ids[is_valid]
+        first_idx = int(numpy.flatnonzero(is_oscillation)[0])
+        severity = min(1.0, num_oscillations / max(len(diffs) - 1, 1))
+        details = {"num_oscillations": num_oscillations}
+
+        return [(int(frame_ids[first_idx + 1]), severity, details)]
+
+
+@register_rule
+class ClassFlickerRule(AnomalyRule):
+    """The class of the object changes back and forth (i.e., car -> truck ->
+    car), and the class changes are more often than `max_flicker_rate` of its
+    consecutive observations. The anomaly is the first frame where the object
+    returns to a previous class, as the first change is already reported by
+    `class_inconsistency`.
+    """
+
+    name = "class_flicker"
+    default_params = {"max_flicker_rate": 0.2}
+    enabled_by_default = False
+
+    def evaluate(self, track, context):
+        classes = track.class_names[track.is_detected]
+        frame_ids = track.frame_ids[track.is_detected]
+        change_idx = numpy.flatnonzero(classes[1:] != classes[:-1]) + 1
+
+        # the runs of the same class, a flicker is a run with the class of
+        # the run before the previous one
+        run_starts = numpy.concatenate([[0], change_idx])
+        run_classes = classes[run_starts]
+        is_return = run_classes[2:] == run_classes[:-2]
+        if not is_return.any():
+            return []
+
+        flicker_rate = len(change_idx) / (len(classes) - 1)
+        if flicker_rate <= self.params["max_flicker_rate"]:
+            return []
+
+        first_return = run_starts[int(numpy.flatnonzero(is_return)[0]) + 2]
+        details = {
+            "flicker_rate": round(flicker_rate, 4),
+            "num_changes": len(change_idx),
+        }
+        return [(int(frame_ids[first_return]), min(1.0, flicker_rate), details)]
+
+
+@register_rule
+class EdgeExitRule(AnomalyRule):
+    """Objects are expected to leave the scene through the frame edges. A track
+    whose last detection is farther than `edge_margin` pixels from all the
+    edges before the end of the video indicates a lost detection. The frames
+    where the tracker only predicts the bbox (coasting) are ignored, as the
+    prediction keeps moving after the detection is lost.
+    """
+
+    name = "edge_exit"
+    severity = 0.5
+    default_params = {"edge_margin": EDGE_MARGIN}
+    enabled_by_default = False
+
+    def evaluate(self, track, context):
+        frame_size = context.get("frame_size")
+        last_frame_id = context.get("last_frame_id")
+        if frame_size is None or last_frame_id is None:
+            return []
+
+        # the confidence of the tracker-only predictions is NaN
+        detected_idx = numpy.flatnonzero(
+            track.is_detected & ~numpy.isnan(track.confidences)
+        )
+        if detected_idx.size == 0:
+            return []
+
+        last_idx = int(detected_idx[-1])
+        last_detected_frame = int(track.frame_ids[last_idx])
+        if last_detected_frame >= last_frame_id:
+            return []
+
+        width, height = frame_size
+        x1, y1, x2, y2 = track.ltrb[last_idx]
+        distance = min(x1, y1, width - x2, height - y2)
+        if distance <= self.params["edge_margin"]:
+            return []
+
+        return [(last_detected_frame, 1.0, {"edge_distance": int(distance)})]
+
+
+def is_edge_truncation(
+    bboxes1: numpy.ndarray,
+    bboxes2: numpy.ndarray,
+    frame_size: tuple[int, int],
+    edge_margin: float = EDGE_MARGIN,
+    max_edge_shift: float = MAX_EDGE_SHIFT,
+) -> numpy.ndarray:
+    """Checks if the change between pairs of bboxes is explained by the frame
+    edges truncating the object, i.e. while entering or leaving the scene.
+
+    A pair is truncated if a side of either bbox is within `edge_margin`
+    pixels of the corresponding frame edge, or beyond it. The truncated sides are ignored,
+    and the remaining sides must move by at most `max_edge_shift` of the
+    object scale (motion consistency of the visible part).
+
+    Args:
+        bboxes1 (numpy.ndarray): (N, 4) array of [x1, y1, x2, y2] rows.
+        bboxes2 (numpy.ndarray): (N, 4) array of [x1, y1, x2, y2] rows.
+        frame_size (tuple[int, int]): (width, height) of the frames.
+        edge_margin (float): Distance to an edge in pixels, within which
+            a side is considered truncated.
+        max_edge_shift (float): Maximum shift of the other sides, relative to
+            the largest side of the two bboxes.
+
+    Returns:
+        numpy.ndarray: (N,) boolean array, True for the truncated pairs.
+    """
+
+    bboxes1 = numpy.asarray(bboxes1, dtype=numpy.float64).reshape(-1, 4)
+    bboxes2 = numpy.asarray(bboxes2, dtype=numpy.float64).reshape(-1, 4)
+    far_edges = numpy.array(frame_size, dtype=numpy.float64) - edge_margin
+
+    # one-sided, the bboxes of the detectors may extend beyond the frame
+    is_at_edge = numpy.zeros(bboxes1.shape, dtype=bool)
+    for bboxes in (bboxes1, bboxes2):
+        is_at_edge[:, :2] |= bboxes[:, :2] <= edge_margin
+        is_at_edge[:, 2:] |= bboxes[:, 2:] >= far_edges
+
+    # the visible size shrinks along the truncated axis, so the shifts are
+    # relative to the largest side of the pair, i.e. the scale of the object
+    sides = numpy.hstack(
+        [bboxes1[:, 2:] - bboxes1[:, :2], bboxes2[:, 2:] - bboxes2[:, :2]]
+    )
+    scales = numpy.maximum(sides.max(axis=1), 1)
+    shifts = numpy.abs(bboxes2 - bboxes1) / scales[:, None]
+    shifts[is_at_edge] = 0
+
+    return is_at_edge.any(axis=1) & (shifts.max(axis=1) <= max_edge_shift)
+
+
+def sample_gap_frames(start: int, length: int, num_samples: int) -> list[int]:
+    """Samples evenly spaced representative frames from a gap. A single sample
+    is the middle frame of the gap.
+    """
+
+    num_samples = min(num_samples, length)
+    return [
+        start + (2 * i + 1) * length // (2 * num_samples)
+        for i in range(num_samples)
+    ]
+
+
+def build_rules(names=None, params=None) -> list[AnomalyRule]:
+    """Builds the anomaly rules with their config parameters.
+
+    Args:
+        names (list[str], optional): Names of the rules to enable, all the
+            registered rules enabled by default if None.
+        params (dict, optional): Config parameters per rule name, overriding
+            the defaults (i.e., {"low_iou": {"min_iou": 0.4}}).
+
+    Returns:
+        list[AnomalyRule]: The rules.
+
+    Raises:
+        ValueError: If a rule name or a parameter is unknown.
+    """
+
+    if names is None:
+        names = [
+            name
+            for name, rule_cls in RULE_REGISTRY.items()
+            if rule_cls.enabled_by_default
+        ]
+    params = params or {}
+
+    unknown = set(names).union(params).difference(RULE_REGISTRY)
+    if unknown:
+        raise ValueError(
+            f"Unknown anomaly rules: {sorted(unknown)}, "
+            f"available rules: {list(RULE_REGISTRY)}"
+        )
+
+    return [RULE_REGISTRY[name](**params.get(name, {})) for name in names]
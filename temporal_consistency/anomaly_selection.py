@@ -0,0 +1,109 @@
+"""This module selects the anomaly frames to export. In dense scenes many
+objects flag neighboring frames, which would result in many near-duplicate
+frames to label. Instead, a frame is scored by how many anomalies (weighted
+by severity) it explains, i.e., anomalies within `window` frames of it. The
+frames are picked greedily by their score, until all the anomalies are
+explained or the budget is used.
+
+The anomaly frames are sorted once, so the anomalies explained by a frame are
+a contiguous range of them. Picking a frame only changes the scores of the
+frames within `2 * window` of it, so the greedy selection is a lazy priority
+queue with local updates, in O(n log n) time and O(n) memory even when the
+anomalies of a dense scene chain over the whole video.
+"""
+
+import heapq
+
+import numpy
+
+
+def get_explained_ranges(candidates: numpy.ndarray, window: int):
+    """Returns the [start, end) range of the candidates explained by each
+    candidate, i.e. the ones within `window` frames of it.
+
+    Args:
+        candidates (numpy.ndarray): Sorted unique frame IDs.
+        window (int): Maximum distance of a frame to the anomalies it explains.
+
+    Returns:
+        tuple[numpy.ndarray, numpy.ndarray]: Starts and ends of the ranges.
+    """
+
+    starts = numpy.searchsorted(candidates, candidates - window, side="left")
+    ends = numpy.searchsorted(candidates, candidates + window, side="right")
+    return starts, ends
+
+
+def select_anomaly_frames(
+    frame_ids, severities, budget: int = 0, window: int = 2
+) -> list[int]:
+    """Selects the frames to export for the given anomalies.
+
+    Args:
+        frame_ids (Iterable[int]): Frame ID of each anomaly.
+        severities (Iterable[float]): Severity of each anomaly.
+        budget (int): Maximum number of frames to select, 0 means no limit.
+        window (int): Maximum distance of a frame to the anomalies it explains.
+
+    Returns:
+        list[int]: Selected frame IDs, in frame order.
+    """
+
+    frame_ids = numpy.asarray(list(frame_ids), dtype=numpy.int64)
+    severities = numpy.asarray(list(severities), dtype=numpy.float64)
+    if frame_ids.size == 0:
+        return []
+
+    # the candidates are the anomaly frames, with the total severity of
+    # the anomalies in each of them
+    candidates, inverse = numpy.unique(frame_ids, return_inverse=True)
+    weights = numpy.bincount(inverse, weights=severities)
+    starts, ends = get_explained_ranges(candidates, window)
+    cumsum = numpy.concatenate([[0.0], numpy.cumsum(weights)])
+    scores = (cumsum[ends] - cumsum[starts]).tolist()
+
+    # ties are broken by the frame ID, the earliest frame first
+    heap = [(-score, idx) for idx, score in enumerate(scores) if score > 0]
+    heapq.heapify(heap)
+
+    selected = []
+    while heap and (budget <= 0 or len(selected) < budget):
+        neg_score, idx = heapq.heappop(heap)
+        if -neg_score != scores[idx]:
+            # stale entry, the score has decreased since it was pushed
+            continue
+
+        selected.append(int(candidates[idx]))
+        start, end = starts[idx], ends[idx]
+        weights[start:end] = 0
+
+        # only the candidates whose ranges overlap [start, end) are affected
+        first = numpy.searchsorted(ends, start, side="right")
+        last = numpy.searchsorted(starts, end, side="left")
+        for j in range(first, last):
+            score = float(weights[starts[j] : ends[j]].sum())
+            if score != scores[j]:
+                scores[j] = score
+                if score > 0:
+                    heapq.heappush(heap, (-score, j))
+
+    return sorted(selected)
+
+
+def select_first_per_object(anomaly_records) -> list[tuple]:
+    """Keeps the first anomaly record of each object, in the order the
+    records were found.
+
+    Args:
+        anomaly_records (Iterable[tuple]): (object_id, frame_id, rule,
+            severity) records.
+
+    Returns:
+        list[tuple]: The first record of each object.
+    """
+
+    first_records = {}
+    for record in anomaly_records:
+        first_records.setdefault(record[0], record)
+
+    return list(first_records.values())
@@ -3,44 +3,69 @@ using the albumentations library and to apply a random subset of those
 augmentations to a given image. Depending on the `num_aug` input, the
 `get_random_augmentation` function selects a specified number of augmentations
 from this list of possible options and applies them to an input image.
+
+For reproducible robustness runs, the augmentations of a frame can be seeded
+with a seed derived from (video, frame ID, run seed), see `FrameAugmenter`.
+The augmented frames can also be cached on disk (losslessly compressed),
+keyed by that seed, so that repeated runs on the same augmented corpus
+(i.e., to compare models) skip the augmentation. The video is identified by
+a fingerprint of its content (`get_video_id`), so that different videos with
+the same file name don't share seeds and cached frames.
 """
 
+import hashlib
+import os
 import random
+import threading
+from typing import Optional
 
 import numpy
-from albumentations import (
-    Blur,
-    ChannelShuffle,
-    ColorJitter,
-    Compose,
-    Equalize,
-    GaussNoise,
-    InvertImg,
-    Posterize,
-    RandomBrightnessContrast,
-    RandomFog,
-    RandomGamma,
-    RandomRain,
-    RandomShadow,
-    RandomSnow,
-    RandomSunFlare,
-    RandomToneCurve,
-    RGBShift,
-    Solarize,
-)
-
-
-def get_aug_list():
-    """Returns a list of augmentations to be applied to the frames."""
+
+
+# albumentations draws from the global `random` and `numpy.random` states,
+# so the seeded augmentations hold this lock while they are reseeded
+SEED_LOCK = threading.Lock()
+VIDEO_ID_CHUNK_SIZE = 2**20
+
+
+def get_aug_list(rng=random):
+    """Returns a list of augmentations to be applied to the frames.
+    albumentations is only imported here, so that it is not loaded when
+    the frames are not augmented.
+
+    Args:
+        rng (random.Random, optional): Source of the random parameters, the
+            global `random` module if not given.
+    """
+
+    from albumentations import (
+        Blur,
+        ChannelShuffle,
+        ColorJitter,
+        Equalize,
+        GaussNoise,
+        InvertImg,
+        Posterize,
+        RandomBrightnessContrast,
+        RandomFog,
+        RandomGamma,
+        RandomRain,
+        RandomShadow,
+        RandomSnow,
+        RandomSunFlare,
+        RandomToneCurve,
+        RGBShift,
+        Solarize,
+    )
 
     return [
         RandomBrightnessContrast(p=1.0),
         RandomGamma(p=1.0),
         ColorJitter(
-            brightness=random.uniform(0.1, 0.4),
-            contrast=random.uniform(0.1, 0.5),
-            saturation=random.uniform(0.1, 0.5),
-            hue=random.uniform(0.1, 0.5),
+            brightness=rng.uniform(0.1, 0.4),
+            contrast=rng.uniform(0.1, 0.5),
+            saturation=rng.uniform(0.1, 0.5),
+            hue=rng.uniform(0.1, 0.5),
             p=1.0,
         ),
         ChannelShuffle(p=1.0),
@@ -60,15 +85,178 @@ def get_aug_list():
     ]
 
 
-def get_random_augmentation(image: numpy.ndarray, num_aug=0):
+def get_video_id(video_filepath: str) -> str:
+    """Identifies a video by a fingerprint of its content: its size and its
+    first and last `VIDEO_ID_CHUNK_SIZE` bytes. Copies of a video get the same
+    ID, and different videos with the same file name get different IDs. The
+    sources other than files (i.e., stream URLs) are identified by their path.
+    """
+
+    if not os.path.isfile(video_filepath):
+        return video_filepath
+
+    size = os.path.getsize(video_filepath)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(video_filepath, "rb") as f:
+        digest.update(f.read(VIDEO_ID_CHUNK_SIZE))
+        if size > VIDEO_ID_CHUNK_SIZE:
+            f.seek(max(size - VIDEO_ID_CHUNK_SIZE, VIDEO_ID_CHUNK_SIZE))
+            digest.update(f.read())
+
+    return digest.hexdigest()
+
+
+def get_frame_seed(video_id: str, frame_id: int, run_seed: int = 0) -> int:
+    """Derives the seed of the augmentations of a frame. It is stable across
+    processes, unlike `hash`.
+    """
+
+    key = f"{video_id}:{frame_id}:{run_seed}".encode()
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "big")
+
+
+def get_random_augmentation(
+    image: numpy.ndarray, num_aug=0, seed: Optional[int] = None
+):
     """Pick random augmentations from the list and apply them to the image.
-    The number of augmentations to apply is specified by num_aug.
+    The number of augmentations to apply is specified by num_aug. With
+    a seed, both the picked augmentations and their parameters are
+    deterministic.
     """
 
     image_aug = image
     if num_aug > 0:
-        augmentation_pipeline = Compose(
-            random.sample(get_aug_list(), k=num_aug)
-        )
-        image_aug = augmentation_pipeline(image=image)["image"]
+        from albumentations import Compose
+
+        if seed is None:
+            augmentation_pipeline = Compose(
+                random.sample(get_aug_list(), k=num_aug)
+            )
+            image_aug = augmentation_pipeline(image=image)["image"]
+        else:
+            rng = random.Random(seed)
+            augmentation_pipeline = Compose(
+                rng.sample(get_aug_list(rng), k=num_aug)
+            )
+            image_aug = apply_seeded(augmentation_pipeline, image, seed)
     return image_aug
+
+
+def apply_seeded(augmentation_pipeline, image: numpy.ndarray, seed: int):
+    """Applies the pipeline with the global random states seeded, and restores
+    the states afterwards.
+    """
+
+    with SEED_LOCK:
+        random_state = random.getstate()
+        numpy_state = numpy.random.get_state()
+        random.seed(seed)
+        numpy.random.seed(seed % 2**32)
+        try:
+            return augmentation_pipeline(image=image)["image"]
+        finally:
+            random.setstate(random_state)
+            numpy.random.set_state(numpy_state)
+
+
+class AugmentationCache:
+    """On-disk cache of augmented frames as PNG files (lossless, so a cached
+    frame is identical to a re-augmented one).
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def get_filepath(self, key: str) -> str:
+        return os.path.join(self.folder, f"{key}.png")
+
+    def get(self, key: str) -> Optional[numpy.ndarray]:
+        """Returns the cached frame, None if it is not cached."""
+
+        import cv2
+
+        filepath = self.get_filepath(key)
+        if not os.path.exists(filepath):
+            return None
+        return cv2.imread(filepath, cv2.IMREAD_UNCHANGED)
+
+    def put(self, key: str, image: numpy.ndarray):
+        """Caches the frame. It is written to a temporary file first, so that
+        concurrent runs sharing the cache never read a partial file.
+        """
+
+        import cv2
+
+        ret, data = cv2.imencode(".png", image)
+        if not ret:
+            return
+
+        filepath = self.get_filepath(key)
+        tmp_filepath = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_filepath, "wb") as f:
+            f.write(data.tobytes())
+        os.replace(tmp_filepath, filepath)
+
+
+class FrameAugmenter:
+    """Applies deterministic augmentations to the frames of a video, seeded by
+    (video, frame ID, run seed), optionally through an `AugmentationCache`.
+    """
+
+    def __init__(
+        self,
+        num_aug: int,
+        video_id: str,
+        run_seed: int = 0,
+        cache_folder: Optional[str] = None,
+    ):
+        """Initializes the FrameAugmenter.
+
+        Args:
+            num_aug (int): Number of augmentations to apply to each frame.
+            video_id (str): Identifier of the video, see `get_video_id`.
+            run_seed (int): Seed of the run, the same seed reproduces the
+                same augmented frames.
+            cache_folder (str, optional): Folder of the augmented frame
+                cache, no caching if not given.
+        """
+
+        self.num_aug = num_aug
+        self.video_id = video_id
+        self.run_seed = run_seed
+        self.cache = AugmentationCache(cache_folder) if cache_folder else None
+        self.num_cache_hits = 0
+
+    def augment(
+        self,
+        frame: numpy.ndarray,
+        frame_id: int,
+        num_aug: Optional[int] = None,
+    ) -> numpy.ndarray:
+        """Returns the augmented frame, from the cache if it is cached.
+
+        Args:
+            frame (numpy.ndarray): Frame to augment.
+            frame_id (int): ID of the frame, the augmentations are seeded by it.
+            num_aug (int, optional): Number of augmentations to apply instead
+                of `self.num_aug`, i.e. the one the frame was processed with.
+        """
+
+        num_aug = self.num_aug if num_aug is None else num_aug
+        if num_aug <= 0:
+            return frame
+
+        seed = get_frame_seed(self.video_id, frame_id, self.run_seed)
+        key = f"{seed:016x}_{num_aug}"
+        if self.cache is not None:
+            frame_aug = self.cache.get(key)
+            if frame_aug is not None and frame_aug.shape == frame.shape:
+                self.num_cache_hits += 1
+                return frame_aug
+
+        frame_aug = get_random_augmentation(frame, num_aug, seed=seed)
+        if self.cache is not None:
+            self.cache.put(key, frame_aug)
+
+        return frame_aug
@@ -0,0 +1,287 @@
+"""This module contains the extraction of per-object "tube" clips (the bbox
+of a single tracked object on a black frame, see `export_object`) from the
+source video, after the run, instead of from the frames retained by the
+pipeline.
+
+- `TrackTube` is the track table of a single object: the frame IDs where it
+  is observed and its bbox in each of them.
+- `group_tubes` groups the tubes whose frame spans overlap, so that the frames
+  shared by many objects are decoded once for all of them.
+- `extract_tube_group` reads the frames of a group in frame order, with a seek
+  only when the next needed frame is far ahead, and writes each decoded frame
+  to the clips of all the objects in it. No frame is kept after it is written.
+- `extract_track_clips` extracts the groups in parallel, each worker with its
+  own video capture.
+
+With augmentations, the seeded augmenter of the run is applied again to the
+decoded frames (with the number of augmentations of their operating point,
+if it was adapted during the run), so the clips show the augmented frames the
+detector saw.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import cv2
+import numpy
+from loguru import logger
+
+from temporal_consistency.adaptive_control import AdaptiveController
+from temporal_consistency.augmentations import FrameAugmenter
+from temporal_consistency.vis_utils import render_object_frame
+
+
+# frames up to this far ahead are decoded sequentially instead of seeking,
+# a seek restarts the decoding from the previous keyframe
+MAX_READ_AHEAD = 30
+
+
+class TrackTube:
+    """Frame IDs and bboxes of a single tracked object, sorted by frame."""
+
+    def __init__(
+        self,
+        object_id: str,
+        frame_ids: numpy.ndarray,
+        ltrb: numpy.ndarray,
+        class_names: list,
+    ):
+        order = numpy.argsort(frame_ids, kind="stable")
+        self.object_id = object_id
+        self.frame_ids = numpy.asarray(frame_ids, dtype=numpy.int64)[order]
+        self.ltrb = numpy.asarray(ltrb).reshape(-1, 4)[order]
+        self.class_names = [class_names[i] for i in order]
+
+    @property
+    def first_frame(self) -> int:
+        return int(self.frame_ids[0])
+
+    @property
+    def last_frame(self) -> int:
+        return int(self.frame_ids[-1])
+
+
+def get_track_tubes(tframe_collection, object_ids=None) -> list[TrackTube]:
+    """Builds the tubes of the tracked objects of a collection. It works on
+    collections loaded from a predictions file as well, as no frame is used.
+
+    Args:
+        tframe_collection (TrackedFrameCollection): Collection of the run.
+        object_ids (Iterable[str], optional): Objects to build the tubes of,
+            all the tracked objects if not given.
+
+    Returns:
+        list[TrackTube]: Tubes of the objects.
+    """
+
+    if object_ids is None:
+        object_ids = tframe_collection.all_objects.keys()
+
+    tubes = []
+    for object_id in object_ids:
+        track_info = tframe_collection.all_objects[object_id]
+        if not track_info:
+            continue
+
+        predictions = list(track_info.values())
+        tubes.append(
+            TrackTube(
+                object_id,
+                numpy.array([pred.frame_id for pred in predictions]),
+                numpy.array([pred.ltrb for pred in predictions]),
+                [pred.class_name for pred in predictions],
+            )
+        )
+
+    return tubes
+
+
+def group_tubes(tubes: list[TrackTube]) -> list[list[TrackTube]]:
+    """Groups the tubes whose frame spans overlap (transitively), so that each
+    source frame belongs to a single group.
+
+    Args:
+        tubes (list[TrackTube]): Tubes to group.
+
+    Returns:
+        list[list[TrackTube]]: Groups sorted by their first frame.
+    """
+
+    groups, group_end = [], None
+    for tube in sorted(tubes, key=lambda tube: tube.first_frame):
+        if group_end is None or tube.first_frame > group_end:
+            groups.append([])
+            group_end = tube.last_frame
+        groups[-1].append(tube)
+        group_end = max(group_end, tube.last_frame)
+
+    return groups
+
+
+def get_tube_filepath(out_folder: str, object_id: str) -> str:
+    return os.path.join(out_folder, f"obj_{object_id}.mp4")
+
+
+def seek_to_frame(video_cap: cv2.VideoCapture, position: int, frame_id: int):
+    """Moves the capture from `position` (the next frame to decode) to
+    `frame_id`, by decoding the frames in between if it is close enough,
+    otherwise by seeking.
+    """
+
+    if 0 <= frame_id - position <= MAX_READ_AHEAD:
+        for _ in range(frame_id - position):
+            video_cap.grab()
+    else:
+        video_cap.set(cv2.CAP_PROP_POS_FRAMES, frame_id)
+
+
+def extract_tube_group(
+    video_filepath: str,
+    tubes: list[TrackTube],
+    out_folder: str,
+    fps: float,
+    augmenter: Optional[FrameAugmenter] = None,
+    controller: Optional[AdaptiveController] = None,
+) -> int:
+    """Writes the clips of a group of tubes. Each source frame needed by the
+    group is decoded once, and written to the clips of all the objects
+    observed in it.
+
+    Args:
+        video_filepath (str): Path to the source video.
+        tubes (list[TrackTube]): Tubes of the group.
+        out_folder (str): Folder of the clips.
+        fps (float): Frames per second of the clips.
+        augmenter (FrameAugmenter, optional): Seeded augmenter of the run,
+            applied to the decoded frames.
+        controller (AdaptiveController, optional): Adaptive controller of
+            the run, each frame is augmented with the number of augmentations
+            it was processed with.
+
+    Returns:
+        int: Number of decoded frames.
+    """
+
+    # (frame_id, tube index, observation index) of all observations
+    frame_ids = numpy.concatenate([tube.frame_ids for tube in tubes])
+    tube_idx = numpy.repeat(
+        numpy.arange(len(tubes)), [len(tube.frame_ids) for tube in tubes]
+    )
+    obs_idx = numpy.concatenate(
+        [numpy.arange(len(tube.frame_ids)) for tube in tubes]
+    )
+    order = numpy.lexsort((tube_idx, frame_ids))
+    frame_ids, tube_idx, obs_idx = (
+        frame_ids[order],
+        tube_idx[order],
+        obs_idx[order],
+    )
+    unique_frame_ids, starts = numpy.unique(frame_ids, return_index=True)
+    ends = numpy.append(starts[1:], len(frame_ids))
+
+    video_cap = cv2.VideoCapture(video_filepath)
+    frame_size = (
+        int(video_cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        int(video_cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+    )
+    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+    writers = {}
+    buffer = None
+    position = 0
+    num_decoded = 0
+
+    for frame_id, start, end in zip(
+        unique_frame_ids.tolist(), starts.tolist(), ends.tolist()
+    ):
+        seek_to_frame(video_cap, position, frame_id)
+        ret, frame = video_cap.read()
+        if not ret:
+            logger.warning(f"Could not read frame {frame_id}, stopping")
+            break
+        position = frame_id + 1
+        num_decoded += 1
+        if augmenter is not None:
+            num_aug = None
+            if controller is not None:
+                operating_point = controller.get_operating_point_at(frame_id)
+                num_aug = operating_point["num_aug"]
+            frame = augmenter.augment(frame, frame_id, num_aug)
+
+        for i, j in zip(
+            tube_idx[start:end].tolist(), obs_idx[start:end].tolist()
+        ):
+            tube = tubes[i]
+            if i not in writers:
+                writers[i] = cv2.VideoWriter(
+                    get_tube_filepath(out_folder, tube.object_id),
+                    fourcc,
+                    fps,
+                    frame_size,
+                )
+
+            object_id, class_name = tube.object_id, tube.class_names[j]
+            text = f"{frame_id=}, {object_id=}, {class_name=}"
+            buffer = render_object_frame(frame, tube.ltrb[j], text, out=buffer)
+            writers[i].write(buffer)
+
+            if frame_id == tube.last_frame:
+                writers.pop(i).release()
+
+    for writer in writers.values():
+        writer.release()
+    video_cap.release()
+
+    return num_decoded
+
+
+def extract_track_clips(
+    video_filepath: str,
+    tubes: list[TrackTube],
+    out_folder: str,
+    fps: float,
+    num_workers: int = 1,
+    augmenter: Optional[FrameAugmenter] = None,
+    controller: Optional[AdaptiveController] = None,
+) -> list[str]:
+    """Extracts the per-object clips from the source video. The groups of
+    overlapping tubes are extracted in parallel, in their frame order.
+
+    Args:
+        video_filepath (str): Path to the source video.
+        tubes (list[TrackTube]): Tubes of the objects to extract.
+        out_folder (str): Folder of the clips.
+        fps (float): Frames per second of the clips.
+        num_workers (int): Number of groups extracted in parallel.
+        augmenter (FrameAugmenter, optional): Seeded augmenter of the run,
+            applied to the decoded frames.
+        controller (AdaptiveController, optional): Adaptive controller of
+            the run, see `extract_tube_group`.
+
+    Returns:
+        list[str]: Paths to the clips.
+    """
+
+    os.makedirs(out_folder, exist_ok=True)
+    groups = group_tubes(tubes)
+
+    with ThreadPoolExecutor(max_workers=max(num_workers, 1)) as pool:
+        num_decoded = sum(
+            pool.map(
+                lambda group: extract_tube_group(
+                    video_filepath,
+                    group,
+                    out_folder,
+                    fps,
+                    augmenter,
+                    controller,
+                ),
+                groups,
+            )
+        )
+
+    logger.info(
+        f"Extracted {len(tubes)} object clips in {len(groups)} groups, "
+        f"{num_decoded} frames decoded"
+    )
+    return [get_tube_filepath(out_folder, tube.object_id) for tube in tubes]
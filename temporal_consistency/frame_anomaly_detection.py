@@ -2,21 +2,43 @@
 in object tracking across a sequence of frames. It checks for issues like classification
 inconsistencies, missing objects in frames, single-frame appearances, and low
 Intersection-over-Union (IoU) values. Detected anomalies are stored in a dictionary.
+The checks are the anomaly rules (see `anomaly_rules`), which all run on the
+per-track summaries (see `TrackSummary`), also exported as a table alongside
+the anomalies.
 """
+
+import json
 import os
 import sys
-from collections import defaultdict
+from collections import Counter, defaultdict
+from typing import TYPE_CHECKING, Optional
 
-import cv2
 from loguru import logger
 
-from temporal_consistency.tracked_frame import TrackedFrameCollection
-from temporal_consistency.utils import compute_iou
-from temporal_consistency.vis_utils import draw_class_name
+from temporal_consistency.anomaly_logging import (
+    ANOMALY_LOG_FILENAME,
+    MAX_EVENTS_PER_TYPE,
+    AnomalyEventLogger,
+)
+from temporal_consistency.anomaly_rules import AnomalyRule, build_rules
+from temporal_consistency.anomaly_selection import (
+    select_anomaly_frames,
+    select_first_per_object,
+)
+from temporal_consistency.track_summary import (
+    TrackSummary,
+    export_track_summaries,
+)
+
+
+if TYPE_CHECKING:
+    from temporal_consistency.tracked_frame import TrackedFrameCollection
 
 
-MIN_IOU_THRESH = 0.5
 EPS = sys.float_info.epsilon
+TRACK_SUMMARY_FILENAME = "track_summary.csv"
+ANOMALY_SUMMARY_FILENAME = "anomaly_summary.json"
+EXPORT_STRATEGIES = ("first_per_object", "cover")
 
 
 def export_list_of_objects(object_filepath, object_list):
@@ -29,157 +51,179 @@ def export_list_of_objects(object_filepath, object_list):
 class TemporalAnomalyDetector:
     """Detects anomalies in the temporal consistency of the tracked objects."""
 
-    def __init__(self, tframe_collection: TrackedFrameCollection):
+    def __init__(
+        self,
+        tframe_collection: "TrackedFrameCollection",
+        frames_per_gap: int = 1,
+        export_budget: int = 0,
+        export_window: int = 2,
+        rules: Optional[list[AnomalyRule]] = None,
+        max_events_per_type: int = MAX_EVENTS_PER_TYPE,
+        export_strategy: str = "first_per_object",
+    ):
         """Initializes the TemporalAnomalyDetector.
 
         Args:
             tframe_collection (TrackedFrameCollection): A collection of frames
                 containing tracked objects.
+            frames_per_gap (int): Number of representative frames sampled
+                from each gap where an object is missing. Only used when
+                `rules` is None.
+            export_budget (int): Maximum number of anomaly frames to export,
+                0 means no limit.
+            export_window (int): An exported frame covers the anomalies
+                within this many frames of it.
+            rules (list[AnomalyRule], optional): Anomaly rules applied to each
+                track, all the registered rules with the defaults if None.
+            max_events_per_type (int): Maximum number of logged anomaly
+                events per anomaly type, the rest are only counted.
+            export_strategy (str): "first_per_object" exports the frame of
+                the first anomaly of each anomalous object. "cover" exports
+                the frames explaining all the anomalies, deduplicated within
+                `export_window`. See `select_frames_to_export`.
         """
 
+        if export_strategy not in EXPORT_STRATEGIES:
+            raise ValueError(
+                f"Unknown export strategy {export_strategy!r}, "
+                f"expected one of {EXPORT_STRATEGIES}"
+            )
+
         self.tframe_collection = tframe_collection
+        self.export_budget = export_budget
+        self.export_window = export_window
+        self.export_strategy = export_strategy
+        if rules is None:
+            rules = build_rules(
+                params={"missing_object": {"frames_per_gap": frames_per_gap}}
+            )
+        self.rules = rules
+        self.context = {
+            "frame_size": tframe_collection.get_frame_size(),
+            "last_frame_id": tframe_collection.get_last_frame_id(),
+        }
+
         self.anomalies: defaultdict = defaultdict(list)
-        self.scan_for_anomalies()
-        self.export_anomalies()
+        self.anomaly_records: list = []
+        self.gaps: defaultdict = defaultdict(list)
+        self.track_summaries: dict = {}
+        self.exported_frame_ids: list = []
+
+        out_folder = tframe_collection.out_folder
+        os.makedirs(out_folder, exist_ok=True)
+        self.event_logger = AnomalyEventLogger(
+            os.path.join(out_folder, ANOMALY_LOG_FILENAME),
+            max_events_per_type=max_events_per_type,
+        )
+
+        try:
+            self.scan_for_anomalies()
+            self.export_track_summaries()
+            self.export_anomalies()
+            self.export_summary()
+        finally:
+            # the enqueued sink is flushed and removed even if the scan fails
+            self.event_logger.close()
 
     def scan_for_anomalies(self):
-        """Scans for anomalies across all objects in the frame collection."""
+        """Scans for anomalies across all objects in the frame collection.
+        The summary of each track is computed once and used by all rules.
+        """
 
+        skipped_frame_ids = self.tframe_collection.skipped_frame_ids
         for object_id, track_info in self.tframe_collection.all_objects.items():
-            self.inspect_object_for_anomalies(object_id, track_info)
+            track = TrackSummary(object_id, track_info, skipped_frame_ids)
+            self.track_summaries[object_id] = track
+            self.gaps[object_id].extend(track.gaps)
+            self.inspect_object_for_anomalies(object_id, track)
 
         return None
 
     def inspect_object_for_anomalies(
-        self, object_id: str, track_info: dict
+        self, object_id: str, track: TrackSummary
     ) -> bool:
-        """Checks for potential anomalies for a single tracked object.
+        """Applies all the anomaly rules to a single tracked object.
 
         Args:
             object_id (str): Unique identifier of the tracked object.
-            track_info (dict): A dictionary containing frame IDs as keys and prediction
-                objects as values, where each prediction has a 'class_name' attribute.
+            track (TrackSummary): Columnar view and statistics of the track.
 
         Returns:
             bool: True if anomalies are detected, False otherwise.
         """
 
-        anomaly_exist = (
-            self.is_class_inconsistent(object_id, track_info)
-            or self.is_object_missing_in_frames(object_id, track_info)
-            or self.appears_only_in_single_frame(object_id, track_info)
-            or self.has_low_iou(object_id, track_info)
-        )
-        return anomaly_exist
-
-    def is_class_inconsistent(self, object_id: str, track_info: dict) -> bool:
-        """Verifies that an object maintains consistent classification across frames.
-
-        Returns:
-            bool: False if the class is consistent, True if there are inconsistencies.
-        """
-
-        all_classes = set(v.class_name for v in track_info.values())
+        anomaly_exist = False
+        for rule in self.rules:
+            for frame_id, severity, details in rule.evaluate(
+                track, self.context
+            ):
+                self.add_anomaly(object_id, frame_id, rule, severity, details)
+                anomaly_exist = True
 
-        if len(all_classes) > 1:
-            log = f"{object_id=} occurs as the following classes: {all_classes}"
-            logger.info(log)
-            self.get_frame_id_for_class_inconsistency(object_id, track_info)
-
-        return len(all_classes) > 1
-
-    def get_frame_id_for_class_inconsistency(self, object_id, track_info):
-        """Find the first frame ID where a class inconsistency occurs in
-            a tracking sequence.
+        return anomaly_exist
 
-        Returns:
-            None: The function modifies the 'anomalies' attribute of the object,
-                appending frame IDs where class inconsistency is detected.
+    def add_anomaly(
+        self,
+        object_id: str,
+        frame_id: int,
+        rule: AnomalyRule,
+        severity: float = 1.0,
+        details: Optional[dict] = None,
+    ):
+        """Records an anomaly of the object in the given frame, and logs it as
+        a structured event. The severity is scaled with the base severity of
+        the rule.
         """
 
-        prev_class = None
-
-        for frame_id, pred in track_info.items():
-            current_class = pred.class_name
-            if prev_class is not None and prev_class != current_class:
-                self.anomalies[object_id].append(frame_id)
-                break
-
-            prev_class = current_class
+        severity *= rule.severity
+        self.anomalies[object_id].append(frame_id)
+        self.anomaly_records.append((object_id, frame_id, rule.name, severity))
+        self.event_logger.log(object_id, frame_id, rule.name, severity, details)
 
         return None
 
-    def is_object_missing_in_frames(
-        self, object_id: str, track_info: dict
-    ) -> bool:
-        """Checks if an object goes missing in intermediate frames.
-
-        Returns:
-            bool: True if the object is missing in some frames, False otherwise.
-        """
-
-        keys = track_info.keys()
-        mn_idx, mx_idx, size = min(keys), max(keys), len(track_info)
-        expected_size = mx_idx - mn_idx + 1
-        if size != expected_size:
-            log = f"{object_id=} is missing in {expected_size - size} frames"
-            logger.info(log)
-
-            # sampling only one frame where the object is missing
-            frame_ids = set(range(mn_idx, mx_idx + 1)).difference(keys)
-            self.anomalies[object_id].append(list(frame_ids)[0])
-
-        return expected_size != size
+    def export_track_summaries(self):
+        """Exports the summary table of all tracks as track_summary.csv."""
 
-    def appears_only_in_single_frame(
-        self, object_id: str, track_info: dict
-    ) -> bool:
-        """Checks if an object only appears in a single frame, potentially
-            indicating a false detection.
-
-        Returns:
-            bool: True if the object appears in only one frame, False otherwise.
-        """
-
-        if len(track_info) == 1:
-            log = f"{object_id=} occurs only in one frame, may indicate false detection"
-            logger.info(log)
-            frame_id = list(track_info.keys())[0]
-            self.anomalies[object_id].append(frame_id)
+        out_folder = self.tframe_collection.out_folder
+        os.makedirs(out_folder, exist_ok=True)
+        export_track_summaries(
+            os.path.join(out_folder, TRACK_SUMMARY_FILENAME),
+            self.track_summaries.values(),
+        )
 
-        return len(track_info) == 1
+        return None
 
-    def has_low_iou(self, object_id: str, track_info: dict) -> bool:
-        """Assesses if the Intersection over Union (IoU) is below a threshold,
-            indicating potential tracking issues.
+    def select_frames_to_export(self) -> list[int]:
+        """Selects the anomaly frames to export.
 
-        Returns:
-            bool: True if there is low IoU, False otherwise.
+        With the "first_per_object" strategy, the candidates are the frames of
+        the first anomaly of each object; without a budget, all of them are
+        exported. With the "cover" strategy, the candidates are the frames of
+        all the anomalies. Otherwise neighboring candidate frames are
+        deduplicated and at most `export_budget` frames are selected, the
+        ones explaining the most severe anomalies first.
         """
 
-        keys = sorted(list(track_info.keys()))
-        flag = False
-        for frame_i, frame_j in zip(keys, keys[1:]):
-            t1 = track_info[frame_i]
-            t2 = track_info[frame_j]
+        records = self.anomaly_records
+        if self.export_strategy == "first_per_object":
+            records = select_first_per_object(records)
+            if self.export_budget <= 0:
+                return sorted(set(record[1] for record in records))
 
-            # TODO (samet): Need to check if the bboxes are close to frame edges
-            iou = compute_iou(t1.ltrb, t2.ltrb)
+        frame_ids = [record[1] for record in records]
+        severities = [record[3] for record in records]
 
-            if iou < MIN_IOU_THRESH:
-                log = (
-                    f"{iou=} is lower than threshold of {MIN_IOU_THRESH} "
-                    f"between {frame_i=} and {frame_j=}"
-                )
-                logger.info(log)
-                self.anomalies[object_id].append(frame_i)
-                flag = True
-
-        return flag
+        return select_anomaly_frames(
+            frame_ids,
+            severities,
+            budget=self.export_budget,
+            window=self.export_window,
+        )
 
     def export_anomalies(self):
-        """Exports the frames where there is an anomaly for at least one object.
-        The exported files are:
+        """Exports the selected frames (see `select_frames_to_export`) where
+        there is an anomaly for at least one object. The exported files are:
         1. Raw frame as frame{frame_id}.jpg
         2. Frame with bboxes as frame{frame_id}_bbox.jpg. The green bboxes are the
             tracked objects, and the red bboxes are the low-confidence detections.
@@ -188,7 +232,12 @@ class TemporalAnomalyDetector:
         1 + 3 can be used to help with labeling the data (i.e. model assisted labeling)
         """
 
-        frame_ids = set(x[0] for x in self.anomalies.values())
+        import cv2
+
+        from temporal_consistency.vis_utils import draw_class_name
+
+        frame_ids = self.select_frames_to_export()
+        self.exported_frame_ids = frame_ids
 
         out_folder = os.path.join(self.tframe_collection.out_folder)
         os.makedirs(out_folder, exist_ok=True)
@@ -212,13 +261,60 @@ class TemporalAnomalyDetector:
             export_list_of_objects(object_filepath, low_conf_objects)
 
             # 3. Bboxes as txt
+            frame_wbbox = frame.copy()
             for obj in high_conf_objects:
-                draw_class_name(frame, obj.ltrb, "", obj.class_name)
+                draw_class_name(frame_wbbox, obj.ltrb, "", obj.class_name)
 
             for obj in low_conf_objects:
                 draw_class_name(
-                    frame, obj.ltrb, "", obj.class_name, bbox_color=(0, 0, 255)
+                    frame_wbbox,
+                    obj.ltrb,
+                    "",
+                    obj.class_name,
+                    bbox_color=(0, 0, 255),
                 )
-            cv2.imwrite(frame_wbbox_filepath, frame)
+            cv2.imwrite(frame_wbbox_filepath, frame_wbbox)
+
+        return None
+
+    def get_summary(self) -> dict:
+        """Returns the summary of the run: the number of anomalies, of the
+        suppressed anomalies (i.e., low IoU at the frame edges) and of the
+        rate limited anomaly events per rule.
+        """
+
+        num_anomalies = Counter(record[2] for record in self.anomaly_records)
+        return {
+            "num_tracks": len(self.track_summaries),
+            "num_anomalies": len(self.anomaly_records),
+            "num_exported_frames": len(self.exported_frame_ids),
+            "anomalies": {
+                rule.name: num_anomalies[rule.name] for rule in self.rules
+            },
+            "suppressed": {
+                rule.name: rule.num_suppressed
+                for rule in self.rules
+                if rule.num_suppressed > 0
+            },
+            "rate_limited": self.event_logger.get_counters()["rate_limited"],
+        }
+
+    def export_summary(self):
+        """Logs the summary of the run and exports it as a JSON file."""
+
+        summary = self.get_summary()
+        num_suppressed = sum(summary["suppressed"].values())
+        logger.info(
+            f"Found {summary['num_anomalies']} anomalies in "
+            f"{summary['num_tracks']} tracks, exported "
+            f"{summary['num_exported_frames']} frames, suppressed "
+            f"{num_suppressed} anomalies: {summary}"
+        )
+
+        filepath = os.path.join(
+            self.tframe_collection.out_folder, ANOMALY_SUMMARY_FILENAME
+        )
+        with open(filepath, "w") as f:
+            json.dump(summary, f, indent=2)
 
         return None
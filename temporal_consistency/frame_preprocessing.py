@@ -0,0 +1,263 @@
+"""This module prepares the decoded frames before they are passed to the
+object detector. It supports
+
+- a static region of interest (ROI) that crops the frame,
+- a static ROI mask which blanks out the pixels outside the mask,
+- resizing the frame before the detection (with a matching input size of the
+  detector, so that it does not letterbox the frame back to its default size),
+- tiled inference, which splits a large frame into overlapping tiles
+  (i.e., for detecting small objects in 4K frames).
+
+Each part of the frame passed to the detector is a `DetectionView`, which
+knows how to map the detections back to the coordinates of the original frame.
+"""
+
+from typing import Optional
+
+import cv2
+import numpy
+
+
+TILE_NMS_IOU_THRESH = 0.5
+# the input size of the detector is a multiple of its stride
+DETECTOR_STRIDE = 32
+
+
+def get_tile_starts(length: int, tile_size: int, overlap: float) -> list[int]:
+    """Returns the start positions of the tiles along one axis. The tiles
+    cover the whole axis, the last tile is aligned with the end of the axis.
+    """
+
+    if length <= tile_size:
+        return [0]
+
+    step = max(int(tile_size * (1 - overlap)), 1)
+    starts = list(range(0, length - tile_size + 1, step))
+    if starts[-1] != length - tile_size:
+        starts.append(length - tile_size)
+
+    return starts
+
+
+def non_max_suppression(
+    boxes: numpy.ndarray, iou_thresh: float = TILE_NMS_IOU_THRESH
+) -> numpy.ndarray:
+    """Class-aware non-maximum suppression over the detections.
+
+    Args:
+        boxes (numpy.ndarray): Detections of shape (N, 6) in the format of
+            [x1, y1, x2, y2, confidence, class_id].
+        iou_thresh (float): Detections overlapping a more confident one of
+            the same class with a higher IoU are removed.
+
+    Returns:
+        numpy.ndarray: The kept detections, sorted by confidence.
+    """
+
+    boxes = boxes[numpy.argsort(-boxes[:, 4], kind="stable")]
+
+    # shifting the boxes per class so that different classes never overlap
+    shift = (boxes[:, 5] * (boxes[:, :4].max(initial=0) + 1))[:, None]
+    x1, y1, x2, y2 = (boxes[:, :4] + shift).T
+    areas = (x2 - x1) * (y2 - y1)
+
+    keep = []
+    order = numpy.arange(len(boxes))
+    while order.size > 0:
+        idx, order = order[0], order[1:]
+        keep.append(idx)
+
+        w = numpy.clip(
+            numpy.minimum(x2[idx], x2[order])
+            - numpy.maximum(x1[idx], x1[order]),
+            0,
+            None,
+        )
+        h = numpy.clip(
+            numpy.minimum(y2[idx], y2[order])
+            - numpy.maximum(y1[idx], y1[order]),
+            0,
+            None,
+        )
+        inter = w * h
+        iou = inter / (areas[idx] + areas[order] - inter + 1e-9)
+        order = order[iou <= iou_thresh]
+
+    return boxes[keep]
+
+
+class DetectionView:
+    """A part of a frame that is passed to the detector, together with its
+    offset in the original frame and the scale it was resized with.
+    """
+
+    def __init__(self, image: numpy.ndarray, offset: tuple, scale: float):
+        self.image = image
+        self.offset = offset
+        self.scale = scale
+
+    def to_original_coords(self, boxes: numpy.ndarray) -> numpy.ndarray:
+        """Maps the detections of the view back to the original frame.
+
+        Args:
+            boxes (numpy.ndarray): Detections of shape (N, 6) in the format of
+                [x1, y1, x2, y2, confidence, class_id] in view coordinates.
+
+        Returns:
+            numpy.ndarray: Detections in the original frame coordinates.
+        """
+
+        boxes = numpy.array(boxes, dtype=numpy.float64).reshape(-1, 6)
+        if self.scale == 1.0 and self.offset == (0, 0):
+            return boxes
+
+        boxes[:, :4] /= self.scale
+        boxes[:, [0, 2]] += self.offset[0]
+        boxes[:, [1, 3]] += self.offset[1]
+        return boxes
+
+
+class FramePreprocessor:
+    """Splits a frame into the views that are passed to the detector."""
+
+    def __init__(
+        self,
+        roi: Optional[list[int]] = None,
+        roi_mask_filepath: Optional[str] = None,
+        scale: float = 1.0,
+        tile_size: int = 0,
+        tile_overlap: float = 0.2,
+    ):
+        """Initializes the FramePreprocessor.
+
+        Args:
+            roi (list[int], optional): Static region of interest in the format
+                of [left, top, right, bottom]. Only this part is detected on.
+            roi_mask_filepath (str, optional): Path to a mask image with the
+                same size as the frames. Pixels outside the mask are blanked.
+                If there is no ROI, the bounding box of the mask is used.
+            scale (float): Scale to resize the frames with before detection.
+            tile_size (int): Size of the tiles (after resizing), 0 disables
+                the tiled inference.
+            tile_overlap (float): Overlap ratio between consecutive tiles.
+        """
+
+        if scale <= 0:
+            raise ValueError(f"scale must be positive, got {scale}")
+        if not 0 <= tile_overlap < 1:
+            raise ValueError(
+                f"tile_overlap must be in [0, 1), got {tile_overlap}"
+            )
+
+        self.roi_mask = None
+        if roi_mask_filepath:
+            mask = cv2.imread(roi_mask_filepath, cv2.IMREAD_GRAYSCALE)
+            if mask is None:
+                raise ValueError(
+                    f"Could not read ROI mask: {roi_mask_filepath}"
+                )
+            self.roi_mask = mask > 0
+
+            if roi is None:
+                ys, xs = numpy.nonzero(self.roi_mask)
+                roi = [xs.min(), ys.min(), xs.max() + 1, ys.max() + 1]
+
+        self.roi = list(map(int, roi)) if roi is not None else None
+        self.scale = scale
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+
+    @property
+    def is_identity(self) -> bool:
+        """True if the frame is passed to the detector as it is."""
+
+        return (
+            self.roi is None
+            and self.roi_mask is None
+            and self.scale == 1.0
+            and self.tile_size <= 0
+        )
+
+    def get_views(self, frame: numpy.ndarray) -> list[DetectionView]:
+        """Returns the views of the frame that are passed to the detector."""
+
+        if self.is_identity:
+            return [DetectionView(frame, (0, 0), 1.0)]
+
+        height, width = frame.shape[:2]
+        left, top, right, bottom = self.roi or [0, 0, width, height]
+        left, right = max(left, 0), min(right, width)
+        top, bottom = max(top, 0), min(bottom, height)
+
+        image = frame[top:bottom, left:right]
+        if self.roi_mask is not None:
+            if self.roi_mask.shape != (height, width):
+                raise ValueError(
+                    f"ROI mask shape {self.roi_mask.shape} does not match "
+                    f"the frame shape {(height, width)}"
+                )
+            mask = self.roi_mask[top:bottom, left:right]
+            image = image * mask[..., None].astype(image.dtype)
+
+        if self.scale != 1.0:
+            image = cv2.resize(
+                image,
+                None,
+                fx=self.scale,
+                fy=self.scale,
+                interpolation=cv2.INTER_AREA,
+            )
+
+        if self.tile_size <= 0:
+            return [DetectionView(image, (left, top), self.scale)]
+
+        views = []
+        img_height, img_width = image.shape[:2]
+        for y in get_tile_starts(img_height, self.tile_size, self.tile_overlap):
+            for x in get_tile_starts(
+                img_width, self.tile_size, self.tile_overlap
+            ):
+                tile = image[y : y + self.tile_size, x : x + self.tile_size]
+                offset = (left + x / self.scale, top + y / self.scale)
+                views.append(DetectionView(tile, offset, self.scale))
+
+        return views
+
+    def get_input_size(self, views: list[DetectionView]) -> Optional[int]:
+        """Returns the input size of the detector for the views, so that the
+        resized frames and the tiles are detected at their own resolution.
+        None if the views are not resized (the default size of the detector).
+        """
+
+        if self.scale == 1.0 and self.tile_size <= 0:
+            return None
+
+        size = max(max(view.image.shape[:2]) for view in views)
+        return -(-size // DETECTOR_STRIDE) * DETECTOR_STRIDE
+
+    def merge_detections(
+        self, views: list[DetectionView], detections: list[numpy.ndarray]
+    ) -> numpy.ndarray:
+        """Maps the detections of each view back to the original frame and
+        merges them. Duplicates in the overlapping parts of the tiles are
+        removed with non-maximum suppression.
+
+        Args:
+            views (list[DetectionView]): Views passed to the detector.
+            detections (list[numpy.ndarray]): Detections per view in the format
+                of [x1, y1, x2, y2, confidence, class_id].
+
+        Returns:
+            numpy.ndarray: Detections of shape (N, 6) in frame coordinates.
+        """
+
+        boxes = [
+            view.to_original_coords(dets)
+            for view, dets in zip(views, detections)
+        ]
+        boxes = numpy.concatenate(boxes) if boxes else numpy.zeros((0, 6))
+
+        if len(views) > 1 and len(boxes) > 0:
+            boxes = non_max_suppression(boxes)
+
+        return boxes
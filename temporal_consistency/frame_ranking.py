@@ -0,0 +1,214 @@
+"""This module ranks the frames of many runs for labeling (active learning),
+so that a fixed labeling budget goes to the most valuable frames.
+
+A frame is scored by the uncertainty of the detector on it and by the
+temporal anomalies found in it:
+
+- `num_uncertain`: number of near-threshold detections, i.e. detections whose
+  confidence is within `margin` of the confidence threshold (on both sides,
+  as the tracked and the low-confidence detections are both stored),
+- `entropy`: sum of the binary entropies (in bits) of their confidences,
+- `margin`: closeness of the most ambiguous detection to the threshold,
+  1 at the threshold and 0 at `margin` away from it,
+- `anomaly`: sum of the severities of the temporal anomalies in the frame.
+
+The priority of a frame is a weighted sum of the scores. The scores are
+computed with vectorized ops over the stored detections of a run (see
+`get_annotation_records`), and exported per run (frame_scores.csv), so that
+the frames of all runs can be ranked later in a single priority queue
+(`rank_frames`), also with other weights.
+"""
+
+import csv
+from typing import Optional
+
+import numpy
+
+from temporal_consistency.utils import EPS
+
+
+FRAME_SCORES_FILENAME = "frame_scores.csv"
+UNCERTAINTY_MARGIN = 0.2
+DEFAULT_WEIGHTS = {
+    "num_uncertain": 0.1,
+    "entropy": 1.0,
+    "margin": 1.0,
+    "anomaly": 1.0,
+}
+
+FRAME_SCORES_DTYPE = numpy.dtype(
+    [
+        ("frame_id", "<i8"),
+        ("num_uncertain", "<i8"),
+        ("entropy", "<f8"),
+        ("margin", "<f8"),
+        ("anomaly", "<f8"),
+        ("priority", "<f8"),
+    ]
+)
+
+
+def binary_entropy(probs: numpy.ndarray) -> numpy.ndarray:
+    """Entropy (in bits) of each confidence as a Bernoulli probability."""
+
+    probs = numpy.clip(probs, EPS, 1 - EPS)
+    return -(probs * numpy.log2(probs) + (1 - probs) * numpy.log2(1 - probs))
+
+
+def get_priority(
+    scores: numpy.ndarray, weights: Optional[dict] = None
+) -> numpy.ndarray:
+    """Computes the priority of the frames as the weighted sum of their scores.
+
+    Args:
+        scores (numpy.ndarray): Scores of `FRAME_SCORES_DTYPE`.
+        weights (dict, optional): Weight of each score, the missing ones are
+            taken from `DEFAULT_WEIGHTS`.
+
+    Returns:
+        numpy.ndarray: Priority of each frame.
+    """
+
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    unknown = weights.keys() - DEFAULT_WEIGHTS.keys()
+    if unknown:
+        raise ValueError(f"Unknown scores: {sorted(unknown)}")
+
+    priority = numpy.zeros(len(scores))
+    for name, weight in weights.items():
+        priority += weight * scores[name]
+
+    return priority
+
+
+def get_frame_scores(
+    records: numpy.ndarray,
+    anomaly_frame_ids,
+    anomaly_severities,
+    confidence_threshold: float,
+    margin: float = UNCERTAINTY_MARGIN,
+    weights: Optional[dict] = None,
+) -> numpy.ndarray:
+    """Scores the frames with near-threshold detections or anomalies.
+
+    Args:
+        records (numpy.ndarray): Detections of the run as `RECORD_DTYPE`
+            records (see `get_annotation_records`).
+        anomaly_frame_ids (Iterable[int]): Frame ID of each anomaly.
+        anomaly_severities (Iterable[float]): Severity of each anomaly.
+        confidence_threshold (float): Confidence threshold of the run.
+        margin (float): Maximum distance of the confidence of a detection to
+            the threshold to be counted as uncertain.
+        weights (dict, optional): Weights of the priority, see `get_priority`.
+
+    Returns:
+        numpy.ndarray: Scores of `FRAME_SCORES_DTYPE`, sorted by frame ID.
+    """
+
+    anomaly_frame_ids = numpy.asarray(
+        list(anomaly_frame_ids), dtype=numpy.int64
+    )
+    anomaly_severities = numpy.asarray(
+        list(anomaly_severities), dtype=numpy.float64
+    )
+
+    # the confidence of the tracker-only predictions is NaN
+    confidences = records["confidence"].astype(numpy.float64)
+    distances = numpy.abs(confidences - confidence_threshold)
+    is_uncertain = distances <= margin
+    confidences, distances = confidences[is_uncertain], distances[is_uncertain]
+    uncertain_frame_ids = records["frame_id"][is_uncertain]
+
+    frame_ids, inverse = numpy.unique(
+        numpy.concatenate([uncertain_frame_ids, anomaly_frame_ids]),
+        return_inverse=True,
+    )
+    detection_idx = inverse[: len(uncertain_frame_ids)]
+    anomaly_idx = inverse[len(uncertain_frame_ids) :]
+    num_frames = len(frame_ids)
+
+    scores = numpy.zeros(num_frames, dtype=FRAME_SCORES_DTYPE)
+    scores["frame_id"] = frame_ids
+    scores["num_uncertain"] = numpy.bincount(
+        detection_idx, minlength=num_frames
+    )
+    scores["entropy"] = numpy.bincount(
+        detection_idx, weights=binary_entropy(confidences), minlength=num_frames
+    )
+    margins = numpy.zeros(num_frames)
+    numpy.maximum.at(margins, detection_idx, 1 - distances / max(margin, EPS))
+    scores["margin"] = margins
+    scores["anomaly"] = numpy.bincount(
+        anomaly_idx, weights=anomaly_severities, minlength=num_frames
+    )
+    scores["priority"] = get_priority(scores, weights)
+
+    return scores
+
+
+def export_frame_scores(filepath: str, scores: numpy.ndarray) -> None:
+    """Exports the scores of the frames as a CSV table, one row per frame."""
+
+    with open(filepath, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FRAME_SCORES_DTYPE.names)
+        writer.writerows(scores.tolist())
+
+
+def load_frame_scores(filepath: str) -> numpy.ndarray:
+    """Loads the scores exported by `export_frame_scores`."""
+
+    with open(filepath, newline="") as f:
+        rows = [tuple(row) for row in csv.reader(f)][1:]
+
+    return numpy.array(rows, dtype=FRAME_SCORES_DTYPE)
+
+
+def rank_frames(
+    frame_scores: dict, budget: int = 0, weights: Optional[dict] = None
+) -> list[tuple[str, int, float]]:
+    """Ranks the frames of many runs in a single priority queue.
+
+    Args:
+        frame_scores (dict): Run names (i.e., videos) as keys and their scores
+            (`FRAME_SCORES_DTYPE`) as values.
+        budget (int): Number of frames to select, 0 means no limit.
+        weights (dict, optional): Weights of the priority, the priorities of
+            the runs are recomputed with them if given.
+
+    Returns:
+        list[tuple[str, int, float]]: (run name, frame ID, priority) of the
+            selected frames, the highest priority first.
+    """
+
+    names = list(frame_scores)
+    run_scores = [frame_scores[name] for name in names]
+    run_idx = numpy.repeat(
+        numpy.arange(len(names)), [len(scores) for scores in run_scores]
+    )
+    scores = (
+        numpy.concatenate(run_scores)
+        if run_scores
+        else numpy.zeros(0, dtype=FRAME_SCORES_DTYPE)
+    )
+    priority = (
+        scores["priority"] if weights is None else get_priority(scores, weights)
+    )
+
+    selected = numpy.arange(len(scores))
+    if 0 < budget < len(scores):
+        # only the top of the queue is sorted
+        selected = numpy.argpartition(-priority, budget - 1)[:budget]
+    order = numpy.lexsort(
+        (scores["frame_id"][selected], run_idx[selected], -priority[selected])
+    )
+    selected = selected[order]
+
+    return [
+        (names[i], frame_id, float(p))
+        for i, frame_id, p in zip(
+            run_idx[selected].tolist(),
+            scores["frame_id"][selected].tolist(),
+            priority[selected].tolist(),
+        )
+    ]
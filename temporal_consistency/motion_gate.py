@@ -0,0 +1,82 @@
+"""This module contains `MotionGate` class which decides whether a frame needs
+a full object detection pass. On static-camera footage most consecutive frames
+are almost identical, so the detection is skipped when the scene change
+with respect to the last detected frame is below a threshold. A full detection
+is forced every `max_skipped_frames` frames.
+
+The scene change is measured as the mean absolute difference between
+downsampled grayscale versions of the frames, which is cheap to compute.
+"""
+
+import cv2
+import numpy
+
+
+THUMBNAIL_SIZE = (64, 36)
+
+
+class MotionGate:
+    """Gates the object detection based on the scene change between frames."""
+
+    def __init__(
+        self,
+        threshold: float,
+        max_skipped_frames: int = 10,
+        thumbnail_size: tuple = THUMBNAIL_SIZE,
+    ):
+        """Initializes the MotionGate.
+
+        Args:
+            threshold (float): Minimum mean absolute difference (in the range
+                of 0-255) to the last detected frame to run a detection.
+            max_skipped_frames (int): Maximum number of consecutive frames
+                the detection can be skipped for.
+            thumbnail_size (tuple): (width, height) of the downsampled frames.
+        """
+
+        self.threshold = threshold
+        self.max_skipped_frames = max_skipped_frames
+        self.thumbnail_size = thumbnail_size
+
+        self.reference = None
+        self.num_skipped = 0
+
+    def get_thumbnail(self, frame: numpy.ndarray) -> numpy.ndarray:
+        """Returns the downsampled grayscale version of the frame."""
+
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        thumbnail = cv2.resize(
+            frame, self.thumbnail_size, interpolation=cv2.INTER_AREA
+        )
+        return thumbnail.astype(numpy.float32)
+
+    def get_scene_change(self, thumbnail: numpy.ndarray) -> float:
+        """Mean absolute difference between the thumbnail and the reference."""
+
+        return float(numpy.abs(thumbnail - self.reference).mean())
+
+    def should_detect(self, frame: numpy.ndarray) -> bool:
+        """Checks if the frame needs a full detection pass. The frame becomes
+        the new reference if it does.
+
+        Returns:
+            bool: True if the detection should run, False if it can be skipped.
+        """
+
+        thumbnail = self.get_thumbnail(frame)
+
+        detect = (
+            self.reference is None
+            or self.num_skipped >= self.max_skipped_frames
+            or self.get_scene_change(thumbnail) >= self.threshold
+        )
+
+        if detect:
+            self.reference = thumbnail
+            self.num_skipped = 0
+        else:
+            self.num_skipped += 1
+
+        return detect
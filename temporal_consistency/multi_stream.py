@@ -0,0 +1,396 @@
+"""This module contains the multi-stream runner, which processes many video
+sources (i.e., low-FPS cameras) in a single process with a single shared
+detector, instead of one process and one model per source.
+
+- `VideoStream` is a single source with its own Deep SORT tracker,
+  `TrackedFrameCollection`, frame preprocessor, motion gate and anomaly state.
+- `FairScheduler` selects the streams of the next batch, the ones furthest
+  behind in video time first, so that no stream starves the others.
+- `MultiStreamRunner` decodes the frames of the selected streams in parallel,
+  runs the detection on all of them with a single batched call of the model
+  (see `batch_object_detection`), and updates the tracker of each stream.
+  With a shared appearance embedder, the detections of all the streams in
+  the batch are also embedded with a single call, and the trackers of the
+  streams are created without their own embedder (`embedder=None`).
+
+The ended streams are finished (their objects exported, and the callback run,
+i.e. the anomaly detection) in the worker pool, so they don't block the other
+streams. The runs are headless, the annotated output video is not rendered.
+"""
+
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Optional
+
+import cv2
+import numpy
+from loguru import logger
+
+from temporal_consistency.augmentations import FrameAugmenter
+from temporal_consistency.frame_preprocessing import FramePreprocessor
+from temporal_consistency.motion_gate import MotionGate
+from temporal_consistency.object_detection_tracking import (
+    batch_object_detection,
+    get_detection_crops,
+    object_tracking,
+)
+from temporal_consistency.tracked_frame import (
+    TrackedFrame,
+    TrackedFrameCollection,
+)
+
+
+if TYPE_CHECKING:
+    from deep_sort_realtime.deepsort_tracker import DeepSort
+
+
+DEFAULT_FPS = 25.0
+
+
+class VideoStream:
+    """A single video source with its own tracking and anomaly state."""
+
+    def __init__(
+        self,
+        stream_id: int,
+        video_filepath: str,
+        deep_sort_tracker: "DeepSort",
+        class_names: dict,
+        out_folder: str,
+        preprocessor: Optional[FramePreprocessor] = None,
+        motion_gate: Optional[MotionGate] = None,
+        frame_range: tuple[int, Optional[int]] = (0, None),
+        augmenter: Optional[FrameAugmenter] = None,
+    ):
+        """Initializes the VideoStream.
+
+        Args:
+            stream_id (int): Unique identifier of the stream.
+            video_filepath (str): Path (or URL) of the video source.
+            deep_sort_tracker (DeepSort): Tracker of the stream.
+            class_names (dict): Class names of the shared model.
+            out_folder (str): Output folder of the stream.
+            preprocessor (FramePreprocessor, optional): Prepares the frames
+                for the detector (ROI, resizing and tiling).
+            motion_gate (MotionGate, optional): Skips the detection on frames
+                without a scene change.
+            frame_range (tuple[int, Optional[int]]): Start (inclusive) and end
+                (exclusive) frames to process, the end of the video if None.
+            augmenter (FrameAugmenter, optional): Applies seeded augmentations
+                to the frames of the stream.
+        """
+
+        self.stream_id = stream_id
+        self.video_filepath = video_filepath
+        self.deep_sort_tracker = deep_sort_tracker
+        self.class_names = class_names
+        self.preprocessor = preprocessor
+        self.motion_gate = motion_gate
+        self.augmenter = augmenter
+
+        self.video_cap = cv2.VideoCapture(video_filepath)
+        fps = self.video_cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps > 0 else DEFAULT_FPS
+
+        self.frame_id, self.end_frame = frame_range
+        if self.frame_id > 0:
+            self.video_cap.set(cv2.CAP_PROP_POS_FRAMES, self.frame_id)
+
+        self.tframe_collection = TrackedFrameCollection(
+            video_cap=self.video_cap,
+            class_names=class_names,
+            out_folder=out_folder,
+            augmenter=augmenter,
+        )
+        self.num_processed_frames = 0
+        self.is_done = False
+        self.anomaly_detector = None
+
+    @property
+    def video_time(self) -> float:
+        """Seconds of the video processed so far."""
+
+        return self.num_processed_frames / self.fps
+
+    def read(self) -> Optional[numpy.ndarray]:
+        """Decodes the next frame, None if the stream has ended."""
+
+        if self.end_frame is not None and self.frame_id >= self.end_frame:
+            return None
+
+        ret, frame = self.video_cap.read()
+        return frame if ret else None
+
+    def needs_detection(self, frame: numpy.ndarray) -> bool:
+        return self.motion_gate is None or self.motion_gate.should_detect(frame)
+
+    def add_frame(
+        self,
+        frame: numpy.ndarray,
+        detection_output: Optional[tuple],
+        latency_ms: float,
+        embeds: Optional[list] = None,
+    ) -> TrackedFrame:
+        """Updates the tracker with the detections of the frame and adds it
+        to the collection.
+
+        Args:
+            frame (numpy.ndarray): The decoded frame.
+            detection_output (tuple, optional): Output of `object_detection`
+                for the frame, None if the detection was skipped.
+            latency_ms (float): Time spent on the frame before tracking.
+            embeds (list, optional): Appearance embeddings of the detections,
+                computed by the shared embedder.
+
+        Returns:
+            TrackedFrame: The tracked frame.
+        """
+
+        tracking_start = time.perf_counter()
+        if detection_output is None:
+            # the skipped frames are augmented too, like the detected ones
+            frame_aug = (
+                frame
+                if self.augmenter is None
+                else self.augmenter.augment(frame, self.frame_id)
+            )
+            low_confidence_results = numpy.zeros((0, 6))
+            self.deep_sort_tracker.tracker.predict()
+        else:
+            results, low_confidence_results, frame_aug = detection_output
+            object_tracking(
+                frame_aug, results, self.deep_sort_tracker, embeds=embeds
+            )
+
+        tframe = TrackedFrame(
+            self.frame_id,
+            frame_aug,
+            self.deep_sort_tracker.tracker,
+            low_confidence_results,
+            class_names=self.class_names,
+            is_detection_skipped=detection_output is None,
+        )
+        self.tframe_collection.add_tracked_frame(tframe)
+
+        tracking_ms = (time.perf_counter() - tracking_start) * 1000
+        tframe.latency_ms = latency_ms + tracking_ms
+        self.tframe_collection.add_stage_latencies({"tracking": tracking_ms})
+
+        self.frame_id += 1
+        self.num_processed_frames += 1
+        return tframe
+
+    def close(self, out_video_fps: int, export_objects: bool = True):
+        """Marks the stream as done, and exports the tracked objects unless
+        they are extracted after the run (see `extract_track_clips`).
+        """
+
+        self.is_done = True
+        if export_objects:
+            self.tframe_collection.export_all_objects(
+                out_video_fps=out_video_fps
+            )
+        self.video_cap.release()
+
+
+class FairScheduler:
+    """Selects the streams of the next batch. The streams furthest behind in
+    video time are selected first (ties are broken by the stream ID), so that
+    each stream gets a share of the detector proportional to its FPS.
+    """
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+
+    def select(self, streams: list[VideoStream]) -> list[VideoStream]:
+        active_streams = [stream for stream in streams if not stream.is_done]
+        active_streams.sort(
+            key=lambda stream: (stream.video_time, stream.stream_id)
+        )
+        return active_streams[: self.batch_size]
+
+
+class MultiStreamRunner:
+    """Runs the detection and tracking on many streams with a shared model."""
+
+    def __init__(
+        self,
+        model,
+        streams: list[VideoStream],
+        batch_size: int = 8,
+        num_aug: int = 0,
+        confidence_threshold: float = 0.1,
+        out_video_fps: int = 25,
+        num_decode_threads: int = 4,
+        on_stream_done: Optional[Callable[[VideoStream], None]] = None,
+        embedder=None,
+        export_objects: bool = True,
+    ):
+        """Initializes the MultiStreamRunner.
+
+        Args:
+            model (YOLO): Model shared by all streams.
+            streams (list[VideoStream]): Streams to process.
+            batch_size (int): Maximum number of frames (one per stream) in
+                a single call of the model.
+            num_aug (int): Number of augmentations to apply to the frames.
+            confidence_threshold (float): Threshold for object detection.
+            out_video_fps (int): Frames per second of the object videos.
+            num_decode_threads (int): Threads decoding and tracking the
+                streams of a batch in parallel, and finishing the ended ones.
+            on_stream_done (Callable, optional): Called with each stream when
+                it has ended, i.e. to run its anomaly detection. It is called
+                in the worker pool.
+            embedder (optional): Appearance embedder shared by the streams
+                (i.e., `MobileNetv2_Embedder`), with a `predict(crops)`
+                method. The trackers of the streams must be created without
+                an embedder. None if each tracker has its own embedder.
+            export_objects (bool): Whether to export the tracked objects of
+                the ended streams. They can be extracted by parallel workers
+                in `on_stream_done` instead (see `extract_track_clips`).
+        """
+
+        self.model = model
+        self.streams = streams
+        self.scheduler = FairScheduler(batch_size)
+        self.num_aug = num_aug
+        self.confidence_threshold = confidence_threshold
+        self.out_video_fps = out_video_fps
+        self.num_decode_threads = num_decode_threads
+        self.on_stream_done = on_stream_done
+        self.embedder = embedder
+        self.export_objects = export_objects
+        self.num_batches = 0
+        self.finish_futures: list[Future] = []
+
+    def finish_stream(self, stream: VideoStream):
+        """Exports the objects of an ended stream and runs the callback."""
+
+        stream.close(self.out_video_fps, self.export_objects)
+        logger.info(
+            f"Stream {stream.stream_id} ended after "
+            f"{stream.num_processed_frames} frames: {stream.video_filepath}"
+        )
+        if self.on_stream_done is not None:
+            self.on_stream_done(stream)
+
+    def process_batch(self, pool: ThreadPoolExecutor, batch: list[VideoStream]):
+        """Processes the next frame of each stream in the batch."""
+
+        decode_start = time.perf_counter()
+        frames = list(pool.map(VideoStream.read, batch))
+        decode_ms = (time.perf_counter() - decode_start) * 1000 / len(batch)
+
+        ready = []
+        for stream, frame in zip(batch, frames):
+            if frame is None:
+                # not scheduled anymore, while it is finished in the pool
+                stream.is_done = True
+                self.finish_futures.append(
+                    pool.submit(self.finish_stream, stream)
+                )
+            else:
+                ready.append((stream, frame))
+        if not ready:
+            return
+
+        detected = [
+            (stream, frame)
+            for stream, frame in ready
+            if stream.needs_detection(frame)
+        ]
+        detection_start = time.perf_counter()
+        detection_outputs = {}
+        if detected:
+            outputs = batch_object_detection(
+                self.model,
+                [frame for _, frame in detected],
+                self.num_aug,
+                self.confidence_threshold,
+                [stream.preprocessor for stream, _ in detected],
+                [stream.augmenter for stream, _ in detected],
+                [stream.frame_id for stream, _ in detected],
+            )
+            detection_outputs = {
+                stream.stream_id: output
+                for (stream, _), output in zip(detected, outputs)
+            }
+        detection_ms = (time.perf_counter() - detection_start) * 1000
+        detection_ms /= max(len(detected), 1)
+        embeds = self.get_embeds(detection_outputs)
+
+        def add_frame(stream_frame):
+            stream, frame = stream_frame
+            output = detection_outputs.get(stream.stream_id)
+            stream.tframe_collection.add_stage_latencies(
+                {
+                    "decode": decode_ms,
+                    "detection": detection_ms if output is not None else 0.0,
+                }
+            )
+            stream.add_frame(
+                frame,
+                output,
+                decode_ms + detection_ms,
+                embeds=embeds.get(stream.stream_id),
+            )
+
+        # the trackers are independent, so the streams are tracked in parallel
+        list(pool.map(add_frame, ready))
+        self.num_batches += 1
+
+    def get_embeds(self, detection_outputs: dict) -> dict:
+        """Embeds the detections of all the streams of a batch with a single
+        call of the shared embedder.
+
+        Args:
+            detection_outputs (dict): Stream IDs as keys and the output of
+                `object_detection` as values.
+
+        Returns:
+            dict: Stream IDs as keys and the embeddings of their detections
+                as values, empty without a shared embedder.
+        """
+
+        if self.embedder is None:
+            return {}
+
+        stream_ids, crops = [], []
+        for stream_id, (results, _, frame_aug) in detection_outputs.items():
+            stream_crops = get_detection_crops(frame_aug, results)
+            stream_ids.extend([stream_id] * len(stream_crops))
+            crops.extend(stream_crops)
+
+        embeds: dict = {stream_id: [] for stream_id in detection_outputs}
+        if crops:
+            crop_embeds = self.embedder.predict(crops)
+            for stream_id, embed in zip(stream_ids, crop_embeds):
+                embeds[stream_id].append(embed)
+
+        return embeds
+
+    def run(self) -> list[VideoStream]:
+        """Processes all the streams until they have ended, and waits until
+        the ended streams are finished.
+
+        Returns:
+            list[VideoStream]: The streams, with their collections.
+        """
+
+        with ThreadPoolExecutor(max_workers=self.num_decode_threads) as pool:
+            while True:
+                batch = self.scheduler.select(self.streams)
+                if not batch:
+                    break
+                self.process_batch(pool, batch)
+
+            # the errors of finishing the streams are raised here
+            for future in self.finish_futures:
+                future.result()
+
+        num_frames = sum(stream.num_processed_frames for stream in self.streams)
+        logger.info(
+            f"Processed {num_frames} frames of {len(self.streams)} streams "
+            f"in {self.num_batches} batches"
+        )
+        return self.streams
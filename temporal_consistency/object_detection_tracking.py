@@ -6,28 +6,51 @@ It performs
 
 The frames can be optionally augmented before processing which is
 for helping with robustness of the object detection model (i.e., finding failures).
+The augmentations are seeded per frame, so the runs are reproducible, and the
+augmented frames can be cached on disk for repeated runs (`--aug_cache`).
+Live runs can be kept within a target FPS by an `AdaptiveController`, which
+adapts the detection cadence, resolution and augmentations to the latency.
+On static-camera footage, the detection can be skipped on frames without
+a scene change, using the tracker predictions only. A part of the video can
+be processed by giving a frame range or a time window (`--start`, `--end`,
+`--max_frames`); the frame IDs in the outputs are always absolute.
 
 The output includes visualization of object tracking (one video with bboxes and
-one video per object with the object's track).
+one video per object with the object's track). The video with bboxes is only
+rendered when it is enabled, headless runs skip drawing completely.
 """
 
 import datetime
+import os
+import time
+from typing import TYPE_CHECKING, Callable, Optional
 
 import cv2
 import numpy
-import torch
-from deep_sort_realtime.deepsort_tracker import DeepSort
+from loguru import logger
 
-from temporal_consistency.augmentations import get_random_augmentation
+from temporal_consistency.adaptive_control import (
+    ADJUSTMENTS_FILENAME,
+    AdaptiveController,
+)
+from temporal_consistency.augmentations import (
+    FrameAugmenter,
+    get_random_augmentation,
+    get_video_id,
+)
+from temporal_consistency.frame_preprocessing import FramePreprocessor
+from temporal_consistency.motion_gate import MotionGate
+from temporal_consistency.telemetry import TelemetrySampler
 from temporal_consistency.tracked_frame import (
     TrackedFrame,
     TrackedFrameCollection,
 )
-from temporal_consistency.utils import create_video_writer
-from temporal_consistency.vis_utils import (
-    draw_bbox_around_object,
-    draw_fps_on_frame,
-)
+from temporal_consistency.utils import create_video_writer, get_frame_range
+from temporal_consistency.vis_utils import FrameRenderer
+
+
+if TYPE_CHECKING:
+    from deep_sort_realtime.deepsort_tracker import DeepSort
 
 
 def transform_detection_predictions(data: list) -> list:
@@ -51,8 +74,131 @@ def transform_detection_predictions(data: list) -> list:
     return res
 
 
+def split_detections(boxes: numpy.ndarray, confidence_threshold: float):
+    """Splits the detections of a frame by the confidence threshold.
+
+    Args:
+        boxes (numpy.ndarray): Detections as [x1, y1, x2, y2, confidence,
+            class_id] rows, in the original frame coordinates.
+        confidence_threshold (float): Threshold for object detection.
+
+    Returns:
+        tuple: The confident detections in the tracker format (see
+            `transform_detection_predictions`), and the low-confidence
+            detections as [x1, y1, x2, y2, confidence, class_id] rows.
+    """
+
+    boxes[:, :4] = numpy.trunc(boxes[:, :4])
+
+    is_confident = boxes[:, 4] >= confidence_threshold
+    results = [
+        transform_detection_predictions(data)
+        for data in boxes[is_confident].tolist()
+    ]
+    low_confidence_results = boxes[~is_confident]
+
+    return results, low_confidence_results
+
+
+def augment_frame(
+    frame: numpy.ndarray,
+    num_aug: int,
+    augmenter: Optional[FrameAugmenter] = None,
+    frame_id: int = 0,
+) -> numpy.ndarray:
+    """Applies the seeded augmentations of the augmenter to the frame, or
+    `num_aug` unseeded ones without an augmenter.
+    """
+
+    if augmenter is None:
+        return get_random_augmentation(frame, num_aug=num_aug)
+    return augmenter.augment(frame, frame_id)
+
+
+def batch_object_detection(
+    model,
+    frames: list[numpy.ndarray],
+    num_aug=0,
+    confidence_threshold=0.1,
+    preprocessors: Optional[list[Optional[FramePreprocessor]]] = None,
+    augmenters: Optional[list[Optional[FrameAugmenter]]] = None,
+    frame_ids: Optional[list[int]] = None,
+) -> list[tuple]:
+    """Performs object detection on a batch of frames (i.e., from different
+    streams) with a single call of the model.
+
+    Args:
+        model (YOLO): Model used for object detection.
+        frames (list[numpy.ndarray]): Frames on which objects are detected.
+        num_aug (int, optional): Number of augmentations to apply to the frames.
+        confidence_threshold (float, optional): Threshold for object detection.
+        preprocessors (list[FramePreprocessor], optional): Preprocessor of each
+            frame (see `object_detection`), None for the full frames.
+        augmenters (list[FrameAugmenter], optional): Seeded augmenter of each
+            frame, None for unseeded augmentations with `num_aug`.
+        frame_ids (list[int], optional): Frame IDs, needed by the augmenters.
+
+    Returns:
+        list[tuple]: The output of `object_detection` for each frame.
+    """
+
+    # torch is only needed for the detection, importing it here keeps
+    # the startup fast for the code paths without a detector
+    import torch
+
+    preprocessors = preprocessors or [None] * len(frames)
+    augmenters = augmenters or [None] * len(frames)
+    frame_ids = frame_ids or [0] * len(frames)
+
+    frames_aug, frame_views = [], []
+    for frame, preprocessor, augmenter, frame_id in zip(
+        frames, preprocessors, augmenters, frame_ids
+    ):
+        frame_aug = augment_frame(frame, num_aug, augmenter, frame_id)
+        preprocessor = preprocessor or FramePreprocessor()
+        frames_aug.append(frame_aug)
+        frame_views.append((preprocessor, preprocessor.get_views(frame_aug)))
+
+    # the resized frames are detected at their resolution, not letterboxed
+    # to the default input size of the detector
+    input_sizes = [
+        preprocessor.get_input_size(views)
+        for preprocessor, views in frame_views
+    ]
+    input_sizes = [size for size in input_sizes if size is not None]
+    kwargs = {"imgsz": max(input_sizes)} if input_sizes else {}
+
+    with torch.no_grad():
+        detections = model(
+            [view.image for _, views in frame_views for view in views],
+            **kwargs,
+        )
+
+    outputs = []
+    start = 0
+    for frame_aug, (preprocessor, views) in zip(frames_aug, frame_views):
+        frame_detections = detections[start : start + len(views)]
+        start += len(views)
+
+        boxes = preprocessor.merge_detections(
+            views, [det.boxes.data.cpu().numpy() for det in frame_detections]
+        )
+        results, low_confidence_results = split_detections(
+            boxes, confidence_threshold
+        )
+        outputs.append((results, low_confidence_results, frame_aug))
+
+    return outputs
+
+
 def object_detection(
-    model, frame: numpy.ndarray, num_aug=0, confidence_threshold=0.1
+    model,
+    frame: numpy.ndarray,
+    num_aug=0,
+    confidence_threshold=0.1,
+    preprocessor: Optional[FramePreprocessor] = None,
+    augmenter: Optional[FrameAugmenter] = None,
+    frame_id: int = 0,
 ):
     """Performs object detection on the given frame and returns the results.
 
@@ -61,63 +207,79 @@ def object_detection(
         frame (numpy.ndarray): Frame on which objects are detected.
         num_aug (int, optional): Number of augmentations to apply to the frame.
         confidence_threshold (float, optional): Threshold for object detection.
+        preprocessor (FramePreprocessor, optional): Crops, masks, resizes and
+            tiles the frame before detection. The detections are mapped back
+            to the original frame coordinates.
+        augmenter (FrameAugmenter, optional): Applies seeded augmentations
+            instead of `num_aug` unseeded ones.
+        frame_id (int): ID of the frame, the augmentations are seeded by it.
+
+    Returns:
+        tuple: The confident detections in the tracker format (see
+            `transform_detection_predictions`), the low-confidence detections
+            as an array of [x1, y1, x2, y2, confidence, class_id] rows, and
+            the (augmented) frame.
     """
 
-    frame_aug = get_random_augmentation(frame, num_aug=num_aug)
+    return batch_object_detection(
+        model,
+        [frame],
+        num_aug,
+        confidence_threshold,
+        [preprocessor],
+        [augmenter],
+        [frame_id],
+    )[0]
 
-    with torch.no_grad():
-        detections = model(frame_aug)[0]
 
-    all_results = [
-        transform_detection_predictions(data)
-        for data in detections.boxes.data.tolist()
-    ]
-    results = []
-    low_confidence_results = []
+def get_detection_crops(frame: numpy.ndarray, results: list) -> list:
+    """Crops the detections (in the tracker format, see
+    `transform_detection_predictions`) from the frame, clipped to the frame,
+    as the input of an appearance embedder.
+    """
 
-    for res in all_results:
-        if res[1] >= confidence_threshold:
-            results.append(res)
-        else:
-            low_confidence_results.append(res)
+    height, width = frame.shape[:2]
+    crops = []
+    for ltwh, _, _ in results:
+        left, top, box_width, box_height = map(int, ltwh)
+        crops.append(
+            frame[
+                max(top, 0) : min(top + box_height, height),
+                max(left, 0) : min(left + box_width, width),
+            ]
+        )
 
-    return results, low_confidence_results, frame_aug
+    return crops
 
 
 def object_tracking(
     frame: numpy.ndarray,
     results: list,
-    deep_sort_tracker: DeepSort,
-    classes: dict,
-) -> numpy.ndarray:
-    """Processes the given frame with object tracking using Deep SORT
-        and visualizes the tracking results.
+    deep_sort_tracker: "DeepSort",
+    embeds: Optional[list] = None,
+) -> list:
+    """Processes the given frame with object tracking using Deep SORT.
 
-    The function takes an input frame, object detection results, a DeepSort
-    tracker instance, and a dictionary mapping class IDs to class names.
-    It updates the tracker with the new detection results and draws bounding boxes
-    around the confirmed tracks on a copy of the input frame.
+    The function takes an input frame, object detection results and a DeepSort
+    tracker instance, and updates the tracker with the new detection results.
+    Drawing the tracks is left to a separate rendering stage
+    (see `FrameRenderer`), which only runs when an annotated output is needed.
 
     Args:
         frame (numpy.ndarray): The frame on which objects are detected and tracked.
         results (list): List of object detection results for the given frame.
         deep_sort_tracker (DeepSort): Instance of the DST to update and track objects.
-        classes (dict): Dictionary mapping class IDs to class names for visualization.
+        embeds (list, optional): Appearance embeddings of the detections, for
+            trackers without their own embedder (i.e., a shared one).
 
     Returns:
-        numpy.ndarray: Frame with drawn bboxes around the confirmed tracked objects.
+        list: The tracks returned by the tracker for the given frame.
     """
 
-    tracks = deep_sort_tracker.update_tracks(results, frame=frame)
-
-    frame_after = frame.copy()
-    for track in tracks:
-        if not track.is_confirmed():
-            continue
-
-        voc_bbox = track.to_ltrb()
-        draw_bbox_around_object(frame_after, track, voc_bbox, classes)
-    return frame_after
+    tracks = deep_sort_tracker.update_tracks(
+        results, embeds=embeds, frame=frame
+    )
+    return tracks
 
 
 def process_single_frame(
@@ -125,13 +287,23 @@ def process_single_frame(
     video_cap: cv2.VideoCapture,
     frame_id: int,
     tframe_collection: TrackedFrameCollection,
-    deep_sort_tracker: DeepSort,
+    deep_sort_tracker: "DeepSort",
     num_aug: int,
     confidence_threshold: float,
+    preprocessor: Optional[FramePreprocessor] = None,
+    motion_gate: Optional[MotionGate] = None,
+    augmenter: Optional[FrameAugmenter] = None,
+    controller: Optional[AdaptiveController] = None,
 ):
     """Processes a single frame from the video. This function does object
         detection and tracking. It also updates the TrackedFrameCollection.
-        The last step is to draw the FPS on the frame.
+        The time spent on the frame is stored in `TrackedFrame.latency_ms`,
+        and the time spent in each stage (decode, detection, tracking) in
+        `TrackedFrame.stage_latency_ms`.
+
+        If the motion gate finds no scene change, or the adaptive controller
+        skips the frame, the detection is skipped and only the tracker
+        predictions are used for the frame.
 
     Args:
         model (YOLO): Model used for object detection.
@@ -141,65 +313,129 @@ def process_single_frame(
         deep_sort_tracker (DeepSort): Deep SORT tracker.
         num_aug (int): Number of augmentations to apply to the frame.
         confidence_threshold (float): Confidence threshold for object detection.
+        preprocessor (FramePreprocessor, optional): Prepares the frame for
+            the detector (ROI, resizing and tiling).
+        motion_gate (MotionGate, optional): Decides if the frame needs
+            a detection. None runs the detection on every frame.
+        augmenter (FrameAugmenter, optional): Applies seeded augmentations
+            instead of `num_aug` unseeded ones.
+        controller (AdaptiveController, optional): Decides if the detection
+            runs on the frame, given the current detection interval.
 
     Returns:
-        numpy.ndarray: Frame with drawn bboxes around the confirmed tracked objects.
+        TrackedFrame: The tracked frame, or None if there are no frames left.
     """
 
     start = datetime.datetime.now()
+    decode_start = time.perf_counter()
 
     ret, frame = video_cap.read()
     if not ret:
         return None
 
-    results, low_confidence_results, frame_aug = object_detection(
-        model, frame, num_aug, confidence_threshold
-    )
-    frame_after = object_tracking(
-        frame_aug, results, deep_sort_tracker, classes=model.names
-    )
+    detection_start = time.perf_counter()
+    is_detection_skipped = (
+        controller is not None and not controller.should_detect()
+    ) or (motion_gate is not None and not motion_gate.should_detect(frame))
+    if is_detection_skipped:
+        # the skipped frames are augmented too, so that the rendered frames
+        # do not depend on the gating
+        frame_aug = augment_frame(frame, num_aug, augmenter, frame_id)
+        low_confidence_results = numpy.zeros((0, 6))
+        tracking_start = time.perf_counter()
+        deep_sort_tracker.tracker.predict()
+    else:
+        results, low_confidence_results, frame_aug = object_detection(
+            model,
+            frame,
+            num_aug,
+            confidence_threshold,
+            preprocessor,
+            augmenter,
+            frame_id,
+        )
+        tracking_start = time.perf_counter()
+        object_tracking(frame_aug, results, deep_sort_tracker)
+    tracking_end = time.perf_counter()
+
     tframe = TrackedFrame(
         frame_id,
         frame_aug,
         deep_sort_tracker.tracker,
         low_confidence_results,
         class_names=model.names,
+        is_detection_skipped=is_detection_skipped,
     )
     tframe_collection.add_tracked_frame(tframe)
     end = datetime.datetime.now()
 
-    total_time = (end - start).total_seconds() * 1000
-    draw_fps_on_frame(frame_after, total_time)
+    tframe.latency_ms = (end - start).total_seconds() * 1000
+    tframe.stage_latency_ms = {
+        "decode": (detection_start - decode_start) * 1000,
+        "detection": (tracking_start - detection_start) * 1000,
+        "tracking": (tracking_end - tracking_start) * 1000,
+    }
+    tframe_collection.add_stage_latencies(tframe.stage_latency_ms)
 
-    return frame_after
+    return tframe
 
 
 def apply_detection_and_tracking(
     model,
-    deep_sort_tracker: DeepSort,
+    deep_sort_tracker: "DeepSort",
     num_aug: int,
     video_cap: cv2.VideoCapture,
-    writer: cv2.VideoWriter,
+    writer: Optional[cv2.VideoWriter],
     out_folder: str,
     out_video_fps: int,
     confidence_threshold: float,
+    preprocessor: Optional[FramePreprocessor] = None,
+    motion_gate: Optional[MotionGate] = None,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    telemetry: Optional[TelemetrySampler] = None,
+    frame_range: tuple[int, Optional[int]] = (0, None),
+    export_objects: bool = True,
+    augmenter: Optional[FrameAugmenter] = None,
+    controller: Optional[AdaptiveController] = None,
 ) -> TrackedFrameCollection:
     """Applies object detection and tracking on video frames using
     the provided model and tracker.
 
     This function processes a video by detecting objects in its frames and
-    then tracking those objects using Deep SORT. The results, including bboxes,
-    are written to a video. The tracked objects are also saved as separate videos.
+    then tracking those objects using Deep SORT. If a writer is given, the
+    results, including bboxes, are rendered and written to a video; otherwise
+    no drawing happens at all. The tracked objects are also saved as
+    separate videos.
 
     Args:
         model (YOLO): Model used for object detection.
         deep_sort_tracker (DeepSort): Deep SORT tracker instance for object tracking.
         num_aug (int): Number of augmentations to apply to the frame.
         video_cap (cv2.VideoCapture): Video capture object to read frames from.
-        writer (cv2.VideoWriter): Video writer object to output the processed video.
+        writer (cv2.VideoWriter, optional): Video writer object to output the
+            processed video. None skips rendering (i.e., headless runs).
         out_folder (str): Output folder path where tracked objects will be saved.
         out_video_fps (int): Frames per second for the output video.
         confidence_threshold (float): Confidence threshold for object detection.
+        preprocessor (FramePreprocessor, optional): Prepares the frames for
+            the detector (ROI, resizing and tiling).
+        motion_gate (MotionGate, optional): Skips the detection on frames
+            without a scene change.
+        progress_callback (Callable, optional): Called after each frame with
+            the number of processed frames and the number of frames to process.
+        telemetry (TelemetrySampler, optional): Samples the memory and
+            throughput telemetry during the run.
+        frame_range (tuple[int, Optional[int]]): Start (inclusive) and end
+            (exclusive) frames to process, the end of the video if None.
+            The video is seeked to the start, the frame IDs stay absolute.
+        export_objects (bool): Whether to export the tracked objects after
+            the run, one object at a time. They can be extracted by parallel
+            workers instead (see `extract_track_clips`).
+        augmenter (FrameAugmenter, optional): Applies seeded augmentations
+            instead of `num_aug` unseeded ones.
+        controller (AdaptiveController, optional): Adapts the detection
+            cadence, resolution and augmentations to the measured latency.
+            Its adjustments are exported to the output folder.
 
     Returns:
         TrackedFrameCollection: A collection of frames with tracking information.
@@ -209,11 +445,30 @@ def apply_detection_and_tracking(
         video_cap=video_cap,
         class_names=model.names,
         out_folder=out_folder,
+        augmenter=augmenter,
+        controller=controller,
     )
 
-    frame_id = 0
-    while True:
-        frame_after = process_single_frame(
+    renderer = (
+        FrameRenderer(classes=model.names) if writer is not None else None
+    )
+
+    start_frame, end_frame = frame_range
+    if start_frame > 0:
+        video_cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    num_frames = end_frame - start_frame if end_frame is not None else 0
+
+    if controller is not None:
+        preprocessor = preprocessor or FramePreprocessor()
+
+    frame_id = start_frame
+    last_tframe = None
+    while end_frame is None or frame_id < end_frame:
+        if controller is not None:
+            controller.configure(preprocessor, augmenter)
+            num_aug = controller.num_aug
+
+        tframe = process_single_frame(
             model,
             video_cap,
             frame_id,
@@ -221,45 +476,184 @@ def apply_detection_and_tracking(
             deep_sort_tracker,
             num_aug,
             confidence_threshold,
+            preprocessor,
+            motion_gate,
+            augmenter,
+            controller,
         )
-        if frame_after is None:
-            break
-
-        if frame_id >= 100:
+        if tframe is None:
             break
 
-        writer.write(frame_after)
+        if controller is not None:
+            controller.update(frame_id, tframe.latency_ms)
+
+        if renderer is not None:
+            render_start = time.perf_counter()
+            frame_after = renderer.render(
+                tframe.frame, tframe.tracks, tframe.latency_ms
+            )
+            writer.write(frame_after)
+            tframe_collection.add_stage_latencies(
+                {"render": (time.perf_counter() - render_start) * 1000}
+            )
         frame_id += 1
 
-    tframe_collection.export_all_objects(out_video_fps=out_video_fps)
+        if progress_callback is not None:
+            progress_callback(frame_id - start_frame, num_frames)
+
+        if telemetry is not None:
+            telemetry.record_frame(tframe_collection, tframe)
+        last_tframe = tframe
+
+    if telemetry is not None:
+        telemetry.close(tframe_collection, last_tframe)
+
+    if controller is not None:
+        controller.export_adjustments(
+            os.path.join(out_folder, ADJUSTMENTS_FILENAME)
+        )
+        logger.info(
+            f"{len(controller.adjustments)} operating point adjustments, "
+            f"final: {controller.get_operating_point()}"
+        )
+
+    if export_objects:
+        tframe_collection.export_all_objects(out_video_fps=out_video_fps)
 
     return tframe_collection
 
 
+def get_frame_preprocessor(args) -> FramePreprocessor:
+    """Creates the frame preprocessor from the command line arguments."""
+
+    return FramePreprocessor(
+        roi=args.roi,
+        roi_mask_filepath=args.roi_mask,
+        scale=args.detection_scale,
+        tile_size=args.tile_size,
+        tile_overlap=args.tile_overlap,
+    )
+
+
+def get_frame_augmenter(
+    args, video_filepath: Optional[str] = None
+) -> Optional[FrameAugmenter]:
+    """Creates the seeded frame augmenter from the command line arguments,
+    None if the frames are not augmented.
+
+    Args:
+        args (argparse.Namespace): Command line arguments.
+        video_filepath (str, optional): Path of the video, its content
+            fingerprint is a part of the seeds (see `get_video_id`).
+            `args.video_filepath` if not given.
+    """
+
+    if args.num_aug <= 0:
+        return None
+
+    video_filepath = video_filepath or args.video_filepath
+    return FrameAugmenter(
+        args.num_aug,
+        video_id=get_video_id(video_filepath),
+        run_seed=args.aug_seed,
+        cache_folder=args.aug_cache,
+    )
+
+
+def get_adaptive_controller(args) -> Optional[AdaptiveController]:
+    """Creates the adaptive controller from the command line arguments, None
+    if there is no target FPS.
+    """
+
+    if args.target_fps <= 0:
+        return None
+
+    return AdaptiveController(
+        args.target_fps,
+        num_aug=args.num_aug,
+        scale=args.detection_scale,
+        min_scale=min(args.min_detection_scale, args.detection_scale),
+        max_detection_interval=args.max_detection_interval,
+    )
+
+
+def get_motion_gate(args) -> Optional[MotionGate]:
+    """Creates the motion gate from the command line arguments, None if
+    the gate is disabled.
+    """
+
+    if args.motion_threshold <= 0:
+        return None
+
+    return MotionGate(
+        threshold=args.motion_threshold,
+        max_skipped_frames=args.max_skipped_frames,
+    )
+
+
 def run_detection_and_tracking_pipeline(
-    model, deep_sort_tracker: DeepSort, args
+    model,
+    deep_sort_tracker: "DeepSort",
+    args,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    telemetry_gauges: Optional[dict] = None,
+    export_objects: Optional[bool] = None,
 ):
     """Performs object detection and tracking on the given video.
-    It also outputs the tracked objects into separate videos.
+    It also outputs the tracked objects into separate videos, unless they are
+    extracted after the run (`args.clip_workers`).
 
     Args:
         model (YOLO): Model used for object detection.
         deep_sort_tracker (DeepSort): Deep SORT tracker.
         args (argparse.Namespace): Command line arguments obtained from config file.
+        progress_callback (Callable, optional): Called after each frame with
+            the number of processed frames and the number of frames in the video.
+        telemetry_gauges (dict, optional): Extra values sampled by the
+            telemetry (i.e., queue depths), as name -> callable.
+        export_objects (bool, optional): Whether to export the tracked
+            objects, by default when they are not extracted after the run.
 
     Returns:
         TrackedFrameCollection: Collection of tracked frames.
     """
 
+    if export_objects is None:
+        export_objects = args.clip_workers == 0
+
     video_filepath = args.video_filepath
     num_aug = args.num_aug
     confidence_threshold = args.confidence
     out_folder = args.out_folder
     out_video_fps = args.out_video_fps
+    preprocessor = get_frame_preprocessor(args)
+    motion_gate = get_motion_gate(args)
+    augmenter = get_frame_augmenter(args)
+    controller = get_adaptive_controller(args)
+    telemetry = None
+    if args.telemetry_filepath:
+        telemetry = TelemetrySampler(
+            args.telemetry_filepath,
+            interval=args.telemetry_interval,
+            gauges=telemetry_gauges,
+        )
 
     video_cap = cv2.VideoCapture(video_filepath)
-    output_filepath = video_filepath.replace(".mp4", "_output.mp4")
-    writer = create_video_writer(video_cap, output_filepath, fps=out_video_fps)
+    frame_range = get_frame_range(
+        int(video_cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        video_cap.get(cv2.CAP_PROP_FPS),
+        start=args.start,
+        end=args.end,
+        max_frames=args.max_frames,
+    )
+    logger.info(f"Processing frames in [{frame_range[0]}, {frame_range[1]})")
+
+    writer = None
+    if not args.headless:
+        output_filepath = video_filepath.replace(".mp4", "_output.mp4")
+        writer = create_video_writer(
+            video_cap, output_filepath, fps=out_video_fps
+        )
 
     tframe_collection = apply_detection_and_tracking(
         model,
@@ -270,10 +664,23 @@ def run_detection_and_tracking_pipeline(
         out_folder,
         out_video_fps,
         confidence_threshold,
+        preprocessor,
+        motion_gate,
+        progress_callback,
+        telemetry,
+        frame_range,
+        export_objects=export_objects,
+        augmenter=augmenter,
+        controller=controller,
     )
+    if augmenter is not None and augmenter.cache is not None:
+        logger.info(
+            f"{augmenter.num_cache_hits} augmented frames read from the cache"
+        )
 
     video_cap.release()
-    writer.release()
+    if writer is not None:
+        writer.release()
     cv2.destroyAllWindows()
 
     return tframe_collection
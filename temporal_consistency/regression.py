@@ -0,0 +1,461 @@
+"""This module contains the building blocks of the performance regression
+harness (see `benchmark.py`), which runs a fixed corpus of clips under two
+configurations (or code revisions) and compares the runs.
+
+For each clip, a run is summarized by its metrics (`get_run_metrics`):
+
+- FPS of the detection and tracking pipeline,
+- mean latency of each stage per frame (decode, detection, tracking, render)
+  and the time spent in the anomaly detection,
+- peak resident memory of the process,
+- the detections (predictions file) and the anomalies found.
+
+Two runs are compared with `compare_runs`, which diffs the detections
+(matched by class and IoU) and the anomalies (by frame and type), and lists
+the regressions exceeding the configured thresholds.
+
+The detector finds nothing on the synthetic clips (moving rectangles), which
+would make the agreements trivially perfect. So the synthetic clips are run
+with `SyntheticClipDetector` instead, which returns fixed, deterministic
+detections of the rectangles, and the tracking and the anomaly detection are
+compared on them. The per-object videos are not exported in the timed runs.
+"""
+
+import os
+from typing import Optional
+
+import numpy
+
+from temporal_consistency.telemetry import get_peak_rss_bytes
+from temporal_consistency.utils import compute_iou_batch
+
+
+MATCH_IOU_THRESH = 0.5
+SYNTHETIC_CLIP_PREFIX = "synthetic"
+SYNTHETIC_BACKGROUND = 100
+SYNTHETIC_MIN_DIFF = 25
+SYNTHETIC_MIN_AREA = 100
+SYNTHETIC_CONFIDENCE = 0.9
+
+DEFAULT_THRESHOLDS = {
+    "max_fps_drop": 0.1,
+    "max_latency_increase": 0.2,
+    "max_memory_increase": 0.1,
+    "min_detection_agreement": 0.95,
+    "min_anomaly_agreement": 0.9,
+}
+
+
+def generate_synthetic_clip(
+    filepath: str,
+    num_frames: int = 150,
+    frame_size: tuple[int, int] = (640, 360),
+    fps: int = 25,
+    num_objects: int = 3,
+    seed: int = 0,
+):
+    """Writes a deterministic clip of rectangles moving over a noisy
+    background, so that the corpus is reproducible without any data.
+
+    Args:
+        filepath (str): Path to the output .mp4 file.
+        num_frames (int): Number of frames of the clip.
+        frame_size (tuple[int, int]): (width, height) of the frames.
+        fps (int): Frames per second of the clip.
+        num_objects (int): Number of moving rectangles.
+        seed (int): Seed of the random positions, velocities and colors.
+    """
+
+    import cv2
+
+    rng = numpy.random.default_rng(seed)
+    width, height = frame_size
+    sizes = rng.integers(30, 90, size=(num_objects, 2))
+    positions = rng.uniform(0, 1, size=(num_objects, 2)) * (frame_size - sizes)
+    velocities = rng.uniform(-4, 4, size=(num_objects, 2))
+    colors = rng.integers(0, 256, size=(num_objects, 3)).tolist()
+    background = rng.integers(
+        SYNTHETIC_BACKGROUND - 10,
+        SYNTHETIC_BACKGROUND + 10,
+        size=(height, width, 3),
+        dtype=numpy.uint8,
+    )
+
+    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+    writer = cv2.VideoWriter(filepath, fourcc, fps, frame_size)
+    for _ in range(num_frames):
+        frame = background.copy()
+        for (x, y), (w, h), color in zip(
+            positions.astype(int).tolist(), sizes.tolist(), colors
+        ):
+            cv2.rectangle(frame, (x, y), (x + w, y + h), color, -1)
+        writer.write(frame)
+
+        # bounce off the frame edges
+        positions += velocities
+        is_out = (positions < 0) | (positions > frame_size - sizes)
+        velocities[is_out] *= -1
+        positions = numpy.clip(positions, 0, frame_size - sizes)
+
+    writer.release()
+
+
+def is_synthetic_clip(video_filepath: str) -> bool:
+    """Checks if the video is a synthetic clip generated for the corpus."""
+
+    return os.path.basename(video_filepath).startswith(SYNTHETIC_CLIP_PREFIX)
+
+
+class FixedDetections:
+    """Detections of an image, with the interface of the ultralytics results
+    used by the pipeline (`result.boxes.data.cpu().numpy()`).
+    """
+
+    def __init__(self, boxes: numpy.ndarray):
+        self.boxes = self
+        self.data = self
+        self.array = boxes
+
+    def cpu(self):
+        return self
+
+    def numpy(self) -> numpy.ndarray:
+        return self.array
+
+
+class SyntheticClipDetector:
+    """Stand-in for the detector on the synthetic clips. The rectangles are
+    found by their difference to the background level, so the detections are
+    fixed for a clip and the same in every run.
+    """
+
+    names = {0: "rectangle"}
+
+    def __call__(
+        self, images: list, imgsz: Optional[int] = None
+    ) -> list[FixedDetections]:
+        # the images are always detected at their own size
+        return [FixedDetections(self.detect(image)) for image in images]
+
+    @staticmethod
+    def detect(image: numpy.ndarray) -> numpy.ndarray:
+        """Returns the rectangles of an image as [x1, y1, x2, y2, confidence,
+        class_id] rows.
+        """
+
+        import cv2
+
+        diffs = numpy.abs(image.astype(numpy.int16) - SYNTHETIC_BACKGROUND)
+        mask = (diffs.max(axis=2) > SYNTHETIC_MIN_DIFF).astype(numpy.uint8)
+        _, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+
+        # the first component is the background
+        stats = stats[1:]
+        stats = stats[stats[:, cv2.CC_STAT_AREA] >= SYNTHETIC_MIN_AREA]
+        boxes = numpy.zeros((len(stats), 6), dtype=numpy.float32)
+        boxes[:, :2] = stats[:, :2]
+        boxes[:, 2:4] = stats[:, :2] + stats[:, 2:4]
+        boxes[:, 4] = SYNTHETIC_CONFIDENCE
+
+        return boxes
+
+
+def get_corpus(
+    paths: list[str],
+    out_folder: str,
+    num_synthetic_clips: int = 0,
+    num_frames: int = 150,
+) -> list[str]:
+    """Returns the video files of the corpus, in a fixed order. Folders are
+    expanded to the .mp4 files in them, and the synthetic clips are generated
+    in `out_folder` if they don't exist yet.
+    """
+
+    corpus = []
+    for path in paths:
+        if os.path.isdir(path):
+            corpus.extend(
+                os.path.join(path, filename)
+                for filename in sorted(os.listdir(path))
+                if filename.endswith(".mp4")
+            )
+        else:
+            corpus.append(path)
+
+    os.makedirs(out_folder, exist_ok=True)
+    for seed in range(num_synthetic_clips):
+        filepath = os.path.join(
+            out_folder, f"{SYNTHETIC_CLIP_PREFIX}{seed}_{num_frames}.mp4"
+        )
+        if not os.path.exists(filepath):
+            generate_synthetic_clip(filepath, num_frames=num_frames, seed=seed)
+        corpus.append(filepath)
+
+    return corpus
+
+
+def get_run_metrics(
+    tframe_collection,
+    anomaly_detector,
+    pipeline_s: float,
+    anomaly_detection_s: float,
+    predictions_filepath: str,
+) -> dict:
+    """Summarizes a run of a single clip.
+
+    Args:
+        tframe_collection (TrackedFrameCollection): Output of the pipeline.
+        anomaly_detector (TemporalAnomalyDetector): Output of the anomaly
+            detection.
+        pipeline_s (float): Seconds spent in the detection and tracking.
+        anomaly_detection_s (float): Seconds spent in the anomaly detection.
+        predictions_filepath (str): Path to the exported predictions.
+
+    Returns:
+        dict: The metrics of the run.
+    """
+
+    num_frames = tframe_collection.num_tracked_frames
+    peak_rss_bytes = get_peak_rss_bytes()
+    anomalies = sorted(
+        {(record[1], record[2]) for record in anomaly_detector.anomaly_records}
+    )
+
+    return {
+        "num_frames": num_frames,
+        "runtime_s": round(pipeline_s, 3),
+        "fps": round(num_frames / pipeline_s, 3) if pipeline_s > 0 else 0.0,
+        "stage_latency_ms": {
+            stage: round(total_ms / max(num_frames, 1), 3)
+            for stage, total_ms in tframe_collection.stage_latency_ms.items()
+        },
+        "anomaly_detection_ms": round(anomaly_detection_s * 1000, 3),
+        "peak_rss_mb": (
+            round(peak_rss_bytes / 2**20, 1)
+            if peak_rss_bytes is not None
+            else None
+        ),
+        "num_detections": tframe_collection.num_frame_predictions,
+        "anomalies": [list(anomaly) for anomaly in anomalies],
+        "predictions_filepath": predictions_filepath,
+    }
+
+
+def load_frame_detections(filepath: str) -> dict:
+    """Loads the tracked detections of a predictions file, grouped by frame.
+
+    Returns:
+        dict: Frame IDs as keys, and (ltrb, class_ids) arrays as values.
+    """
+
+    with numpy.load(filepath) as data:
+        frame_ids, ltrb, class_ids = (
+            data["frame_ids"],
+            data["ltrb"],
+            data["class_ids"],
+        )
+
+    order = numpy.argsort(frame_ids, kind="stable")
+    frame_ids, ltrb, class_ids = frame_ids[order], ltrb[order], class_ids[order]
+    unique_ids, starts = numpy.unique(frame_ids, return_index=True)
+
+    return {
+        frame_id: (frame_ltrb, frame_class_ids)
+        for frame_id, frame_ltrb, frame_class_ids in zip(
+            unique_ids.tolist(),
+            numpy.split(ltrb, starts[1:]),
+            numpy.split(class_ids, starts[1:]),
+        )
+    }
+
+
+def count_matches(
+    ltrb1: numpy.ndarray,
+    class_ids1: numpy.ndarray,
+    ltrb2: numpy.ndarray,
+    class_ids2: numpy.ndarray,
+    iou_thresh: float = MATCH_IOU_THRESH,
+) -> int:
+    """Counts the one-to-one matches between two sets of detections of
+    a frame, greedily by IoU. Only detections of the same class match.
+    """
+
+    num1, num2 = len(ltrb1), len(ltrb2)
+    if num1 == 0 or num2 == 0:
+        return 0
+
+    ious = compute_iou_batch(
+        numpy.repeat(ltrb1, num2, axis=0), numpy.tile(ltrb2, (num1, 1))
+    ).reshape(num1, num2)
+    ious[class_ids1[:, None] != class_ids2[None, :]] = 0
+
+    num_matches = 0
+    is_used1, is_used2 = numpy.zeros(num1, bool), numpy.zeros(num2, bool)
+    for idx in numpy.argsort(-ious, axis=None):
+        i, j = divmod(int(idx), num2)
+        if ious[i, j] < iou_thresh:
+            break
+        if not is_used1[i] and not is_used2[j]:
+            is_used1[i] = is_used2[j] = True
+            num_matches += 1
+
+    return num_matches
+
+
+def compare_detections(
+    base_filepath: str,
+    candidate_filepath: str,
+    iou_thresh: float = MATCH_IOU_THRESH,
+) -> dict:
+    """Diffs the detections of two runs of the same clip. The agreement is
+    the ratio of the matched detections to the larger of the two runs.
+    """
+
+    base = load_frame_detections(base_filepath)
+    candidate = load_frame_detections(candidate_filepath)
+
+    empty = (numpy.zeros((0, 4)), numpy.zeros(0, dtype=numpy.int64))
+    num_matches = sum(
+        count_matches(*base[frame_id], *candidate.get(frame_id, empty))
+        for frame_id in base
+    )
+    num_base = sum(len(ltrb) for ltrb, _ in base.values())
+    num_candidate = sum(len(ltrb) for ltrb, _ in candidate.values())
+    num_max = max(num_base, num_candidate)
+
+    return {
+        "num_base": num_base,
+        "num_candidate": num_candidate,
+        "num_matched": num_matches,
+        "agreement": round(num_matches / num_max, 4) if num_max > 0 else 1.0,
+    }
+
+
+def compare_anomalies(base_anomalies: list, candidate_anomalies: list) -> dict:
+    """Diffs the anomalies of two runs of the same clip, by frame and type.
+    The object IDs are not compared, since they differ between runs. The
+    agreement is the Jaccard index of the two sets.
+    """
+
+    base = {tuple(anomaly) for anomaly in base_anomalies}
+    candidate = {tuple(anomaly) for anomaly in candidate_anomalies}
+    num_union = len(base | candidate)
+
+    return {
+        "num_base": len(base),
+        "num_candidate": len(candidate),
+        "num_common": len(base & candidate),
+        "only_base": sorted(base - candidate),
+        "only_candidate": sorted(candidate - base),
+        "agreement": (
+            round(len(base & candidate) / num_union, 4) if num_union else 1.0
+        ),
+    }
+
+
+def get_relative_change(
+    base: Optional[float], candidate: Optional[float]
+) -> Optional[float]:
+    """Returns the relative change from base to candidate, None if base is 0
+    or either value is unknown (i.e., the peak RSS on Windows).
+    """
+
+    if base is None or candidate is None or base == 0:
+        return None
+    return (candidate - base) / base
+
+
+def compare_runs(
+    base: dict, candidate: dict, thresholds: Optional[dict] = None
+) -> tuple[dict, list[str]]:
+    """Compares two runs of the same clip, and checks for regressions.
+
+    Args:
+        base (dict): Metrics of the base run (see `get_run_metrics`).
+        candidate (dict): Metrics of the candidate run.
+        thresholds (dict, optional): Regression thresholds, see
+            `DEFAULT_THRESHOLDS`. A threshold of None disables the check.
+
+    Returns:
+        tuple[dict, list[str]]: The comparison, and the descriptions of
+            the regressions (empty if there is none).
+    """
+
+    thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+    regressions = []
+
+    fps_change = get_relative_change(base["fps"], candidate["fps"])
+    if (
+        thresholds["max_fps_drop"] is not None
+        and fps_change is not None
+        and -fps_change > thresholds["max_fps_drop"]
+    ):
+        regressions.append(
+            f"FPS dropped by {-fps_change:.1%}: "
+            f"{base['fps']} -> {candidate['fps']}"
+        )
+
+    latency_changes = {}
+    stages = sorted(
+        set(base["stage_latency_ms"]) | set(candidate["stage_latency_ms"])
+    )
+    for stage in stages:
+        base_ms = base["stage_latency_ms"].get(stage, 0.0)
+        candidate_ms = candidate["stage_latency_ms"].get(stage, 0.0)
+        change = get_relative_change(base_ms, candidate_ms)
+        latency_changes[stage] = change
+        if (
+            thresholds["max_latency_increase"] is not None
+            and change is not None
+            and change > thresholds["max_latency_increase"]
+        ):
+            regressions.append(
+                f"{stage} latency increased by {change:.1%}: "
+                f"{base_ms} ms -> {candidate_ms} ms"
+            )
+
+    memory_change = get_relative_change(
+        base["peak_rss_mb"], candidate["peak_rss_mb"]
+    )
+    if (
+        thresholds["max_memory_increase"] is not None
+        and memory_change is not None
+        and memory_change > thresholds["max_memory_increase"]
+    ):
+        regressions.append(
+            f"Peak memory increased by {memory_change:.1%}: "
+            f"{base['peak_rss_mb']} MB -> {candidate['peak_rss_mb']} MB"
+        )
+
+    detections = compare_detections(
+        base["predictions_filepath"], candidate["predictions_filepath"]
+    )
+    if (
+        thresholds["min_detection_agreement"] is not None
+        and detections["agreement"] < thresholds["min_detection_agreement"]
+    ):
+        regressions.append(
+            f"Detection agreement is {detections['agreement']:.1%}, "
+            f"{detections['num_matched']} of {detections['num_base']} -> "
+            f"{detections['num_candidate']} detections matched"
+        )
+
+    anomalies = compare_anomalies(base["anomalies"], candidate["anomalies"])
+    if (
+        thresholds["min_anomaly_agreement"] is not None
+        and anomalies["agreement"] < thresholds["min_anomaly_agreement"]
+    ):
+        regressions.append(
+            f"Anomaly agreement is {anomalies['agreement']:.1%}, "
+            f"{len(anomalies['only_base'])} anomalies not found and "
+            f"{len(anomalies['only_candidate'])} new anomalies"
+        )
+
+    comparison = {
+        "fps_change": fps_change,
+        "stage_latency_change": latency_changes,
+        "memory_change": memory_change,
+        "detections": detections,
+        "anomalies": anomalies,
+    }
+    return comparison, regressions
@@ -0,0 +1,402 @@
+"""This module contains `VideoJobService`, a long-lived worker which keeps the
+model and the configuration warm and processes video jobs. This avoids paying
+the startup cost (imports and loading the weights) for every video.
+
+Jobs are accepted through
+
+- a small local HTTP API (over TCP or a Unix socket):
+    - `POST /jobs` with a JSON body of config overrides, which has to
+      contain at least `video_filepath`. Returns the job.
+    - `GET /jobs` returns all the jobs.
+    - `GET /jobs/<job_id>` returns the status and the progress of a job.
+- a watched folder, where each new video file becomes a job.
+
+Jobs are run in worker threads with a bounded concurrency. The overrides of
+a job are validated with the options of the pipeline (types and choices), so
+that invalid jobs are rejected when they are submitted.
+"""
+
+import argparse
+import asyncio
+import copy
+import glob
+import itertools
+import json
+import os
+import threading
+from typing import Callable, Optional
+
+from loguru import logger
+
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+HTTP_STATUS = {
+    200: "OK",
+    202: "Accepted",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+}
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+
+
+def convert_value(action: argparse.Action, value):
+    """Converts a single override value with the type of the option, and
+    checks its choices.
+    """
+
+    if action.type is None:
+        if not isinstance(value, str):
+            raise ValueError(f"{action.dest} must be a string, got {value!r}")
+    else:
+        if isinstance(value, bool) or (
+            action.type is int
+            and isinstance(value, float)
+            and not value.is_integer()
+        ):
+            raise ValueError(f"Invalid value for {action.dest}: {value!r}")
+        try:
+            value = action.type(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value for {action.dest}: {value!r}")
+
+    if action.choices is not None and value not in action.choices:
+        raise ValueError(
+            f"Invalid value for {action.dest}: {value!r}, "
+            f"expected one of {list(action.choices)}"
+        )
+
+    return value
+
+
+def convert_override(action: argparse.Action, value):
+    """Converts the override of an option as argparse would convert it from
+    the command line.
+
+    Raises:
+        ValueError: If the value does not match the option.
+    """
+
+    if action.nargs == 0:
+        # flags, i.e. store_true
+        if not isinstance(value, bool):
+            raise ValueError(f"{action.dest} must be a boolean, got {value!r}")
+        return value
+
+    if value is None:
+        if action.default is not None:
+            raise ValueError(f"{action.dest} can not be null")
+        return None
+
+    if action.nargs in ("*", "+") or isinstance(action.nargs, int):
+        if not isinstance(value, list):
+            raise ValueError(f"{action.dest} must be a list, got {value!r}")
+        if action.nargs == "+" and not value:
+            raise ValueError(f"{action.dest} can not be empty")
+        if isinstance(action.nargs, int) and len(value) != action.nargs:
+            raise ValueError(
+                f"{action.dest} must have {action.nargs} values, got {value!r}"
+            )
+        return [convert_value(action, item) for item in value]
+
+    return convert_value(action, value)
+
+
+def validate_overrides(
+    parser: argparse.ArgumentParser, overrides: dict
+) -> dict:
+    """Validates and converts the config overrides of a job with the options
+    of the parser.
+
+    Args:
+        parser (argparse.ArgumentParser): Parser of the job options.
+        overrides (dict): Option names (dest) as keys and values.
+
+    Returns:
+        dict: The converted overrides.
+
+    Raises:
+        ValueError: If an override is unknown or invalid.
+    """
+
+    actions = {
+        action.dest: action
+        for action in parser._actions
+        if action.dest not in (argparse.SUPPRESS, "config", "help")
+    }
+    unknown = set(overrides).difference(actions)
+    if unknown:
+        raise ValueError(f"Unknown config options: {sorted(unknown)}")
+
+    return {
+        name: convert_override(actions[name], value)
+        for name, value in overrides.items()
+    }
+
+
+class LockedModel:
+    """Serializes the calls to a model shared between concurrent jobs. The
+    rest of the job (decoding, tracking, exporting) still runs concurrently.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.names = model.names
+        self.lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self.lock:
+            return self.model(*args, **kwargs)
+
+
+class VideoJob:
+    """A single video to process, with its configuration and progress."""
+
+    def __init__(self, job_id: str, args, gauges: Optional[dict] = None):
+        self.job_id = job_id
+        self.args = args
+        self.gauges = gauges or {}
+        self.status = JOB_QUEUED
+        self.num_processed_frames = 0
+        self.num_frames = 0
+        self.error: Optional[str] = None
+
+    def update_progress(self, num_processed_frames: int, num_frames: int):
+        """Progress callback of the detection and tracking pipeline."""
+
+        self.num_processed_frames = num_processed_frames
+        self.num_frames = num_frames
+
+    def to_dict(self) -> dict:
+        progress = (
+            self.num_processed_frames / self.num_frames
+            if self.num_frames > 0
+            else 0.0
+        )
+        return {
+            "job_id": self.job_id,
+            "video_filepath": self.args.video_filepath,
+            "status": self.status,
+            "num_processed_frames": self.num_processed_frames,
+            "num_frames": self.num_frames,
+            "progress": round(progress, 4),
+            "error": self.error,
+        }
+
+
+class VideoJobService:
+    """Accepts video jobs and runs them with a bounded concurrency."""
+
+    def __init__(
+        self,
+        run_job: Callable[[VideoJob], None],
+        base_args,
+        max_concurrent_jobs: int = 1,
+        parser: Optional[argparse.ArgumentParser] = None,
+    ):
+        """Initializes the VideoJobService.
+
+        Args:
+            run_job (Callable): Processes a single job, it is called in
+                a worker thread.
+            base_args (argparse.Namespace): Default configuration of the jobs,
+                each job can override any of its values.
+            max_concurrent_jobs (int): Maximum number of jobs run at once.
+            parser (argparse.ArgumentParser, optional): Parser of the job
+                options, the overrides are validated and converted with it.
+                Without it, only the option names are checked.
+        """
+
+        self.run_job = run_job
+        self.base_args = base_args
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.parser = parser
+
+        self.jobs: dict = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self.job_counter = itertools.count(1)
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        """Queue of the jobs. It is created on first use, in the running
+        event loop: before Python 3.10, a queue is bound to the event loop
+        that is current when it is created, not the one of `asyncio.run`.
+        """
+
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        return self._queue
+
+    def submit(self, overrides: dict) -> VideoJob:
+        """Creates a job with the given config overrides and queues it.
+
+        Raises:
+            ValueError: If an override is not a known config option or has an
+                invalid value, or if there is no video to process.
+        """
+
+        if self.parser is not None:
+            overrides = validate_overrides(self.parser, overrides)
+        else:
+            unknown = set(overrides).difference(vars(self.base_args))
+            if unknown:
+                raise ValueError(f"Unknown config options: {sorted(unknown)}")
+
+        args = copy.deepcopy(self.base_args)
+        vars(args).update(overrides)
+        if not args.video_filepath:
+            raise ValueError("video_filepath is required")
+
+        job = VideoJob(
+            str(next(self.job_counter)),
+            args,
+            gauges={"job_queue_depth": self.queue.qsize},
+        )
+        self.jobs[job.job_id] = job
+        self.queue.put_nowait(job)
+        logger.info(f"Queued job {job.job_id}: {args.video_filepath}")
+
+        return job
+
+    async def worker(self):
+        """Runs the queued jobs one by one in a thread."""
+
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            job.status = JOB_RUNNING
+            try:
+                await loop.run_in_executor(None, self.run_job, job)
+                job.status = JOB_DONE
+                logger.info(f"Finished job {job.job_id}")
+            except Exception as e:
+                job.status = JOB_FAILED
+                job.error = repr(e)
+                logger.exception(f"Job {job.job_id} failed")
+            finally:
+                self.queue.task_done()
+
+    def route(self, method: str, path: str, body: bytes) -> tuple[int, dict]:
+        """Handles a single API request.
+
+        Returns:
+            tuple[int, dict]: HTTP status code and the JSON payload.
+        """
+
+        parts = [part for part in path.split("?")[0].split("/") if part]
+        if not parts or parts[0] != "jobs" or len(parts) > 2:
+            return 404, {"error": f"Unknown path: {path}"}
+
+        if len(parts) == 2:
+            if method != "GET":
+                return 405, {"error": f"{method} is not allowed"}
+            job = self.jobs.get(parts[1])
+            if job is None:
+                return 404, {"error": f"Unknown job: {parts[1]}"}
+            return 200, job.to_dict()
+
+        if method == "GET":
+            return 200, {"jobs": [job.to_dict() for job in self.jobs.values()]}
+
+        if method == "POST":
+            try:
+                overrides = json.loads(body or b"{}")
+                if not isinstance(overrides, dict):
+                    raise ValueError("Request body must be a JSON object")
+                job = self.submit(overrides)
+            except ValueError as e:
+                return 400, {"error": str(e)}
+            return 202, job.to_dict()
+
+        return 405, {"error": f"{method} is not allowed"}
+
+    async def handle_request(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        """Reads a single HTTP request, and writes back the JSON response."""
+
+        try:
+            request_line = (await reader.readline()).decode("latin-1")
+            method, path, _ = request_line.split(" ", 2)
+
+            content_length = 0
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                key, _, value = line.partition(":")
+                if key.strip().lower() == "content-length":
+                    content_length = int(value)
+
+            body = await reader.readexactly(content_length)
+            status, payload = self.route(method.upper(), path, body)
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            status, payload = 400, {"error": f"Malformed request: {e}"}
+
+        data = json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {HTTP_STATUS[status]}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: close\r\n\r\n".encode() + data
+        )
+        await writer.drain()
+        writer.close()
+
+    async def watch_folder(self, folder: str, poll_interval: float = 2.0):
+        """Queues a job for each new video file appearing in the folder."""
+
+        seen: set = set()
+        while True:
+            for filepath in sorted(glob.glob(os.path.join(folder, "*"))):
+                if filepath in seen or not filepath.endswith(VIDEO_EXTENSIONS):
+                    continue
+                seen.add(filepath)
+                self.submit({"video_filepath": filepath})
+
+            await asyncio.sleep(poll_interval)
+
+    async def serve(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        socket_path: Optional[str] = None,
+        watch_folder: Optional[str] = None,
+        poll_interval: float = 2.0,
+    ):
+        """Starts the workers, the API and the folder watcher, and serves
+        until cancelled.
+        """
+
+        tasks = [
+            asyncio.create_task(self.worker())
+            for _ in range(self.max_concurrent_jobs)
+        ]
+        if watch_folder:
+            tasks.append(
+                asyncio.create_task(
+                    self.watch_folder(watch_folder, poll_interval)
+                )
+            )
+
+        if socket_path:
+            server = await asyncio.start_unix_server(
+                self.handle_request, path=socket_path
+            )
+            logger.info(f"Serving on {socket_path}")
+        else:
+            server = await asyncio.start_server(
+                self.handle_request, host=host, port=port
+            )
+            logger.info(f"Serving on http://{host}:{port}")
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
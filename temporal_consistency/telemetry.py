@@ -0,0 +1,184 @@
+"""This module contains `TelemetrySampler` class for the opt-in memory and
+throughput telemetry of a run. It is called after every frame, but only takes
+a sample every `interval` seconds, so the overhead is negligible. Each sample
+contains
+
+- the current and the peak resident set size (RSS) of the process (empty
+  where the platform does not provide them, i.e. the peak RSS on Windows),
+- the number of live tracks,
+- the sizes of the collections in `TrackedFrameCollection`,
+- the rolling FPS over the last frames,
+- any extra gauges, such as queue depths.
+
+The samples are appended to a CSV file, or if the output ends with `.prom`,
+the latest sample is written as a Prometheus textfile (for node_exporter).
+"""
+
+import csv
+import os
+import sys
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from loguru import logger
+
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None  # type: ignore[assignment]
+
+FPS_WINDOW = 30
+METRIC_PREFIX = "temporal_consistency_"
+
+
+def get_peak_rss_bytes() -> Optional[int]:
+    """Returns the peak resident set size of the process in bytes, None if
+    it is not available on the platform.
+    """
+
+    if resource is None:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+def get_rss_bytes() -> Optional[int]:
+    """Returns the current resident set size of the process in bytes. Falls
+    back to the peak RSS when /proc is not available, None if neither is.
+    """
+
+    try:
+        with open("/proc/self/statm") as f:
+            num_pages = int(f.read().split()[1])
+        return num_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return get_peak_rss_bytes()
+
+
+def get_job_filepath(filepath: str, job_id: int) -> str:
+    """Adds the job ID to the telemetry file name (keeping its folder and
+    extension), so that the concurrent jobs of a service do not overwrite
+    each other's telemetry.
+    """
+
+    root, ext = os.path.splitext(filepath)
+    return f"{root}_job{job_id}{ext}"
+
+
+class TelemetrySampler:
+    """Periodically samples the memory and throughput telemetry of a run."""
+
+    def __init__(
+        self,
+        filepath: str,
+        interval: float = 5.0,
+        fps_window: int = FPS_WINDOW,
+        gauges: Optional[dict[str, Callable[[], float]]] = None,
+    ):
+        """Initializes the TelemetrySampler.
+
+        Args:
+            filepath (str): Output file, a CSV file or a Prometheus textfile
+                if it ends with `.prom`.
+            interval (float): Seconds between two samples.
+            fps_window (int): Number of frames the rolling FPS is computed over.
+            gauges (dict, optional): Extra values to sample (i.e., queue
+                depths), given as name -> callable returning the value.
+        """
+
+        self.filepath = filepath
+        self.interval = interval
+        self.gauges = gauges or {}
+        self.is_prometheus = filepath.endswith(".prom")
+
+        self.frame_times: deque = deque(maxlen=fps_window)
+        self.last_sample_time = -float("inf")
+        self.num_samples = 0
+        self.last_row: dict = {}
+
+    def record_frame(self, tframe_collection, tframe):
+        """Records a processed frame, and takes a sample if it is due."""
+
+        now = time.perf_counter()
+        self.frame_times.append(now)
+
+        if now - self.last_sample_time >= self.interval:
+            self.sample(tframe_collection, tframe)
+            self.last_sample_time = now
+
+    def get_rolling_fps(self) -> float:
+        if len(self.frame_times) < 2:
+            return 0.0
+
+        duration = self.frame_times[-1] - self.frame_times[0]
+        return (len(self.frame_times) - 1) / duration if duration > 0 else 0.0
+
+    def sample(self, tframe_collection, tframe) -> dict:
+        """Takes a single sample and writes it to the output."""
+
+        row = {
+            "timestamp": round(time.time(), 3),
+            "frame_id": tframe.frame_id,
+            "rss_bytes": get_rss_bytes(),
+            "peak_rss_bytes": get_peak_rss_bytes(),
+            "num_live_tracks": tframe.num_object,
+            "num_tracked_frames": tframe_collection.num_tracked_frames,
+            "num_objects": len(tframe_collection.all_objects),
+            "num_frame_predictions": tframe_collection.num_frame_predictions,
+            "rolling_fps": round(self.get_rolling_fps(), 3),
+        }
+        for name, gauge in self.gauges.items():
+            row[name] = gauge()
+
+        if self.is_prometheus:
+            self.write_prometheus(row)
+        else:
+            self.write_csv(row)
+
+        self.num_samples += 1
+        self.last_row = row
+        return row
+
+    def write_csv(self, row: dict):
+        is_new_file = self.num_samples == 0
+        with open(self.filepath, "w" if is_new_file else "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(row.keys()))
+            if is_new_file:
+                writer.writeheader()
+            writer.writerow(row)
+
+    def write_prometheus(self, row: dict):
+        """Writes the sample as a Prometheus textfile. The file is replaced
+        atomically, so a scraper never reads a partial file.
+        """
+
+        lines = [
+            f"{METRIC_PREFIX}{name} {value}"
+            for name, value in row.items()
+            if name != "timestamp" and value is not None
+        ]
+        tmp_filepath = f"{self.filepath}.tmp"
+        with open(tmp_filepath, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_filepath, self.filepath)
+
+    def close(self, tframe_collection, tframe):
+        """Takes a final sample and logs the summary of the run."""
+
+        if tframe is not None:
+            self.sample(tframe_collection, tframe)
+
+        peak_rss_bytes = get_peak_rss_bytes()
+        peak_rss = (
+            "unavailable"
+            if peak_rss_bytes is None
+            else f"{peak_rss_bytes / 2**20:.1f} MB"
+        )
+        logger.info(
+            f"Telemetry: {self.num_samples} samples written to "
+            f"{self.filepath}, peak RSS {peak_rss}"
+        )
@@ -0,0 +1,194 @@
+"""This module contains `TrackSummary` class, a columnar view and aggregate
+statistics of a single tracked object, computed in one pass over its
+predictions. The anomaly checks run on it, and the summaries of all tracks
+are exported as a small table (`export_track_summaries`), so that fleet-wide
+analytics and threshold tuning don't need to re-scan the raw predictions.
+
+The statistics of a track are
+
+- span (first and last frame) and the number of observations,
+- gaps where the object is missing,
+- class histogram,
+- mean and min IoU between consecutive observations,
+- mean confidence,
+- mean and max velocity of the bbox center (pixels per frame).
+
+Frames where the detection was skipped (see `MotionGate`) only have
+the tracker predictions, so the statistics relying on the detections
+(classes, IoU, confidence, velocity) only use the detected observations.
+"""
+
+import csv
+
+import numpy
+
+from temporal_consistency.utils import compute_iou_batch
+
+
+TRACK_SUMMARY_COLUMNS = [
+    "object_id",
+    "first_frame",
+    "last_frame",
+    "span",
+    "num_observations",
+    "num_detected",
+    "num_gaps",
+    "num_missing_frames",
+    "num_classes",
+    "class_histogram",
+    "mean_iou",
+    "min_iou",
+    "mean_confidence",
+    "mean_velocity",
+    "max_velocity",
+]
+
+
+def get_gap_intervals(frame_ids) -> list[tuple[int, int]]:
+    """Computes the gaps in a sequence of frame IDs as run-length intervals.
+
+    Args:
+        frame_ids (Iterable[int]): Frame IDs where an object is observed.
+
+    Returns:
+        list[tuple[int, int]]: (start, length) of each gap, in frame order.
+    """
+
+    frame_ids = numpy.sort(numpy.fromiter(frame_ids, dtype=numpy.int64))
+    diffs = numpy.diff(frame_ids)
+    gap_idx = numpy.flatnonzero(diffs > 1)
+
+    return [(int(frame_ids[i]) + 1, int(diffs[i]) - 1) for i in gap_idx]
+
+
+def nan_stat(func, values: numpy.ndarray) -> float:
+    """Applies a nan-aware numpy reduction, NaN for no valid values."""
+
+    if values.size == 0 or numpy.isnan(values).all():
+        return float("nan")
+    return float(func(values))
+
+
+class TrackSummary:
+    """Columnar view and aggregate statistics of a single tracked object."""
+
+    def __init__(self, object_id: str, track_info: dict, skipped_frame_ids=()):
+        """Builds the columnar view of the track and computes its statistics.
+
+        Args:
+            object_id (str): Unique identifier of the tracked object.
+            track_info (dict): Frame IDs as keys and predictions as values.
+            skipped_frame_ids (Iterable[int]): Frames where the detection
+                was skipped.
+        """
+
+        self.object_id = object_id
+
+        predictions = sorted(track_info.values(), key=lambda p: p.frame_id)
+        self.frame_ids = numpy.array(
+            [pred.frame_id for pred in predictions], dtype=numpy.int64
+        )
+        self.ltrb = numpy.array(
+            [pred.ltrb for pred in predictions], dtype=numpy.float64
+        ).reshape(-1, 4)
+        self.class_names = numpy.array(
+            [str(pred.class_name) for pred in predictions], dtype=str
+        )
+        self.confidences = numpy.array(
+            [
+                numpy.nan if pred.confidence is None else pred.confidence
+                for pred in predictions
+            ],
+            dtype=numpy.float64,
+        )
+        self.is_detected = ~numpy.isin(
+            self.frame_ids, numpy.fromiter(skipped_frame_ids, dtype=numpy.int64)
+        )
+
+        self.compute_statistics()
+
+    def compute_statistics(self):
+        """Computes the aggregate statistics of the track."""
+
+        self.first_frame = int(self.frame_ids[0])
+        self.last_frame = int(self.frame_ids[-1])
+        self.span = self.last_frame - self.first_frame + 1
+        self.num_observations = len(self.frame_ids)
+        self.num_detected = int(self.is_detected.sum())
+
+        self.gaps = get_gap_intervals(self.frame_ids)
+        self.num_missing_frames = sum(length for _, length in self.gaps)
+
+        detected_ids = self.frame_ids[self.is_detected]
+        detected_ltrb = self.ltrb[self.is_detected]
+        detected_classes = self.class_names[self.is_detected]
+
+        classes, counts = numpy.unique(detected_classes, return_counts=True)
+        self.class_histogram = dict(zip(classes.tolist(), counts.tolist()))
+
+        # consecutive detected observations, as (frame_i, frame_j) pairs
+        self.pair_frame_ids = numpy.stack([detected_ids[:-1], detected_ids[1:]])
+        self.ious = compute_iou_batch(detected_ltrb[:-1], detected_ltrb[1:])
+
+        centers = (detected_ltrb[:, :2] + detected_ltrb[:, 2:]) / 2
+        displacements = numpy.linalg.norm(numpy.diff(centers, axis=0), axis=1)
+        self.velocities = displacements / numpy.diff(detected_ids)
+
+        self.mean_iou = nan_stat(numpy.mean, self.ious)
+        self.min_iou = nan_stat(numpy.min, self.ious)
+        self.mean_confidence = nan_stat(
+            numpy.nanmean, self.confidences[self.is_detected]
+        )
+        self.mean_velocity = nan_stat(numpy.mean, self.velocities)
+        self.max_velocity = nan_stat(numpy.max, self.velocities)
+
+    @property
+    def num_classes(self) -> int:
+        return len(self.class_histogram)
+
+    @property
+    def num_gaps(self) -> int:
+        return len(self.gaps)
+
+    def get_first_class_change(self):
+        """Returns the first frame ID where the detected class differs from
+        the previous observation, None if the class never changes.
+        """
+
+        classes = self.class_names[self.is_detected]
+        changes = numpy.flatnonzero(classes[1:] != classes[:-1])
+        if changes.size == 0:
+            return None
+
+        return int(self.frame_ids[self.is_detected][changes[0] + 1])
+
+    def to_row(self) -> dict:
+        """Returns the statistics as a row of the track summary table."""
+
+        row = {
+            column: getattr(self, column) for column in TRACK_SUMMARY_COLUMNS
+        }
+        row["class_histogram"] = ";".join(
+            f"{name}:{count}" for name, count in self.class_histogram.items()
+        )
+        for column in ["mean_iou", "min_iou", "mean_confidence"]:
+            row[column] = round(row[column], 4)
+        for column in ["mean_velocity", "max_velocity"]:
+            row[column] = round(row[column], 2)
+
+        return row
+
+
+def export_track_summaries(filepath: str, track_summaries) -> None:
+    """Exports the summaries of the tracks as a CSV table, one row per track.
+
+    Args:
+        filepath (str): Path to the CSV file.
+        track_summaries (Iterable[TrackSummary]): Summaries of the tracks.
+    """
+
+    with open(filepath, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=TRACK_SUMMARY_COLUMNS)
+        writer.writeheader()
+        for summary in track_summaries:
+            writer.writerow(summary.to_row())
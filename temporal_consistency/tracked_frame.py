@@ -6,22 +6,32 @@ including its bounding box, confidence score, and class.
 - `TrackedFrame` class holds information for a single video frame, capturing all
 its tracked objects along with some low-confidence detections.
 - `TrackedFrameCollection` serves as a collection of TrackedFrames. It facilitates
-operations such as adding new tracked frames to the collection, and exporting
-the objects to individual videos.
+operations such as adding new tracked frames to the collection, exporting
+the objects to individual videos, and saving/loading the predictions so that
+the anomaly detection can be re-run without the detector.
+
+The collection keeps the predictions only, not the frames or the tracker
+state, so its memory grows with the number of objects rather than the
+number of frames. The frames are read from the video again for the exports,
+and the seeded augmentations of the run are applied to them again, so the
+exports show the same frames the detector saw (with the number of
+augmentations of their operating point, if it was adapted during the run).
 
 Together, they provide a comprehensive structure for managing and exporting
 object tracking data.
 """
 
-import copy
 import os
 from collections import defaultdict
+from typing import Optional
 
 import cv2
 import numpy
 
-from temporal_consistency.utils import create_video_writer, ltwh_to_ltrb
-from temporal_consistency.vis_utils import put_text_on_upper_corner
+from temporal_consistency.adaptive_control import AdaptiveController
+from temporal_consistency.augmentations import FrameAugmenter
+from temporal_consistency.utils import create_video_writer, read_frame
+from temporal_consistency.vis_utils import render_object_frame
 
 
 class Prediction:
@@ -57,78 +67,218 @@ class Prediction:
         return f"{self.class_name}, {bbox}, {confidence}"
 
 
+def predictions_to_arrays(predictions: list) -> dict:
+    """Converts a list of predictions to a dict of arrays. Missing confidences
+    are stored as NaN and missing class IDs as -1.
+    """
+
+    return {
+        "frame_ids": numpy.array(
+            [pred.frame_id for pred in predictions], dtype=numpy.int64
+        ),
+        "ltrb": numpy.array(
+            [pred.ltrb for pred in predictions], dtype=numpy.float64
+        ).reshape(-1, 4),
+        "confidences": numpy.array(
+            [
+                numpy.nan if pred.confidence is None else pred.confidence
+                for pred in predictions
+            ],
+            dtype=numpy.float64,
+        ),
+        "class_ids": numpy.array(
+            [
+                -1 if pred.class_id is None else pred.class_id
+                for pred in predictions
+            ],
+            dtype=numpy.int64,
+        ),
+    }
+
+
+def arrays_to_predictions(
+    frame_ids, ltrb, confidences, class_ids, class_names: dict
+) -> list:
+    """Converts the arrays created by `predictions_to_arrays` back to a list
+    of predictions.
+    """
+
+    predictions = []
+    for frame_id, bbox, confidence, class_id in zip(
+        frame_ids.tolist(),
+        ltrb.tolist(),
+        confidences.tolist(),
+        class_ids.tolist(),
+    ):
+        cur_pred = Prediction(
+            frame_id=frame_id,
+            ltrb=list(map(int, bbox)),
+            confidence=None if numpy.isnan(confidence) else confidence,
+            class_id=None if class_id < 0 else class_id,
+            class_names=class_names,
+        )
+        predictions.append(cur_pred)
+
+    return predictions
+
+
+def boxes_to_predictions(
+    frame_id: int, boxes: numpy.ndarray, class_names: dict
+) -> list:
+    """Converts an array of [x1, y1, x2, y2, confidence, class_id] rows of
+    a frame to a list of predictions.
+    """
+
+    predictions = []
+    for row in boxes.tolist():
+        cur_pred = Prediction(
+            frame_id=frame_id,
+            ltrb=list(map(int, row[:4])),
+            confidence=row[4],
+            class_id=int(row[5]),
+            class_names=class_names,
+        )
+        predictions.append(cur_pred)
+
+    return predictions
+
+
+class TrackSnapshot:
+    """State of a track in a single frame, with the attributes and methods of
+    the Deep SORT tracks used for rendering and collecting the predictions.
+    """
+
+    __slots__ = ("track_id", "ltrb", "det_conf", "det_class", "confirmed")
+
+    def __init__(self, track):
+        self.track_id = track.track_id
+        self.ltrb = track.to_ltrb()
+        self.det_conf = track.det_conf
+        self.det_class = track.det_class
+        self.confirmed = track.is_confirmed()
+
+    def to_ltrb(self):
+        return self.ltrb
+
+    def is_confirmed(self) -> bool:
+        return self.confirmed
+
+
 class TrackedFrame:
-    """A single frame together with its tracked objects."""
+    """A single frame together with its tracked objects. If the detection was
+    skipped for the frame (see `MotionGate`), the objects are the tracker
+    predictions only. The low-confidence detections are kept as an array of
+    [x1, y1, x2, y2, confidence, class_id] rows.
+
+    The tracks are snapshots of the tracker state at this frame. The frame is
+    only used while the frame is processed (i.e., for rendering), it is not
+    kept by `TrackedFrameCollection`.
+    """
 
     def __init__(
         self,
         frame_id: int,
         frame: numpy.ndarray,
         tracker,
-        low_confidence_results: list[list],
+        low_confidence_results: numpy.ndarray,
         class_names: dict,
+        is_detection_skipped: bool = False,
     ):
         self.frame_id = frame_id
-        self.tracker = copy.deepcopy(tracker)
+        self.is_detection_skipped = is_detection_skipped
+        self.tracks = [TrackSnapshot(track) for track in tracker.tracks]
         self.frame = frame
-        self.num_object = len(tracker.tracks)
+        self.latency_ms = 0.0
+        self.stage_latency_ms: dict = {}
+        self.num_object = len(self.tracks)
         self.object_ids = self.get_object_ids()
-        self.low_confidence_objects = self.get_low_confidence_objects(
-            low_confidence_results, class_names
-        )
-
-    def get_low_confidence_objects(
-        self, low_confidence_results: list[list], class_names: dict
-    ):
-        """Returns a list of low confidence objects."""
-
-        low_confidence_objects = []
+        self.class_names = class_names
+        self.low_confidence_boxes = low_confidence_results
 
-        for res in low_confidence_results:
-            cur_pred = Prediction(
-                frame_id=self.frame_id,
-                ltrb=ltwh_to_ltrb(res[0]),
-                confidence=res[1],
-                class_id=res[2],
-                class_names=class_names,
-            )
-            low_confidence_objects.append(cur_pred)
+    def get_low_confidence_objects(self):
+        """Returns a list of low confidence objects. The predictions are only
+        built on demand (i.e., when the frame is exported).
+        """
 
-        return low_confidence_objects
+        return boxes_to_predictions(
+            self.frame_id, self.low_confidence_boxes, self.class_names
+        )
 
     def get_object_ids(self):
-        return set(t.track_id for t in self.tracker.tracks)
+        return set(t.track_id for t in self.tracks)
 
 
 class TrackedFrameCollection:
-    """A collection of TrackedFrames containing frames and the tracked objects."""
+    """A collection of the tracked objects and the predictions of the
+    TrackedFrames.
+    """
 
     def __init__(
         self,
         video_cap: cv2.VideoCapture,
         class_names: dict,
         out_folder: str,
+        augmenter: Optional[FrameAugmenter] = None,
+        controller: Optional[AdaptiveController] = None,
     ):
+        """Initializes the TrackedFrameCollection.
+
+        Args:
+            video_cap (cv2.VideoCapture): Video capture of the video, the
+                frames are read from it for the exports.
+            class_names (dict): Class names of the model.
+            out_folder (str): Output folder of the collection.
+            augmenter (FrameAugmenter, optional): Seeded augmenter of the run,
+                applied again to the frames read for the exports.
+            controller (AdaptiveController, optional): Adaptive controller
+                of the run, each frame read for the exports is augmented
+                with the number of augmentations it was processed with.
+        """
+
         self.video_cap = video_cap
         self.out_folder = out_folder
+        self.augmenter = augmenter
+        self.controller = controller
 
         self.class_names = class_names
-        self.tracked_frames: list = []
+        # frame IDs are absolute, the processed range may not start at 0
+        self.num_tracked_frames = 0
+        self.frame_size = None
         self.all_objects: defaultdict = defaultdict(dict)
         self.all_frames: defaultdict = defaultdict(list)
+        # running count of the predictions in all_frames
+        self.num_frame_predictions = 0
+        self.low_confidence_boxes: dict = {}
+        self.skipped_frame_ids: set = set()
+        # total time spent in each pipeline stage, in milliseconds
+        self.stage_latency_ms: defaultdict = defaultdict(float)
 
     def add_tracked_frame(self, tracked_frame: TrackedFrame):
-        """Adds a tracked frame to the collection."""
-
-        self.tracked_frames.append(tracked_frame)
+        """Adds the predictions of a tracked frame to the collection."""
+
+        self.num_tracked_frames += 1
+        if self.frame_size is None and tracked_frame.frame is not None:
+            height, width = tracked_frame.frame.shape[:2]
+            self.frame_size = (width, height)
+        self.low_confidence_boxes[tracked_frame.frame_id] = (
+            tracked_frame.low_confidence_boxes
+        )
+        if tracked_frame.is_detection_skipped:
+            self.skipped_frame_ids.add(tracked_frame.frame_id)
         self.update_all_objects_dict(tracked_frame)
 
+    def add_stage_latencies(self, stage_latency_ms: dict):
+        """Adds the time spent in each stage on a frame to the totals."""
+
+        for stage, latency_ms in stage_latency_ms.items():
+            self.stage_latency_ms[stage] += latency_ms
+
     def update_all_objects_dict(self, tracked_frame: TrackedFrame):
         """Updates the dictionary of objects. Each key is an object ID
         and the value is a dictionary of frame IDs and predictions.
         """
 
-        for track in tracked_frame.tracker.tracks:
+        for track in tracked_frame.tracks:
             frame_id = tracked_frame.frame_id
             cur_pred = Prediction(
                 frame_id=tracked_frame.frame_id,
@@ -140,9 +290,12 @@ class TrackedFrameCollection:
             cur_dict = {tracked_frame.frame_id: cur_pred}
             self.all_objects[track.track_id].update(cur_dict)
             self.all_frames[frame_id].append(cur_pred)
+            self.num_frame_predictions += 1
 
     def export_all_objects(self, out_video_fps: int):
-        """Exports all objects to individual videos."""
+        """Exports all objects to individual videos. The frames are read from
+        the video again.
+        """
 
         os.makedirs(self.out_folder, exist_ok=True)
 
@@ -160,35 +313,171 @@ class TrackedFrameCollection:
 
         start_idx, end_idx = min(a_dict.keys()), max(a_dict.keys())
 
-        for frame_id in range(start_idx, end_idx + 1):
+        for frame_id, frame in self.iter_frames(start_idx, end_idx + 1):
             if frame_id not in a_dict:
                 continue
-            frame = self.tracked_frames[frame_id].frame
 
-            black_frame = numpy.zeros_like(frame)
             cur_prediction = a_dict[frame_id]
-            x1, y1, x2, y2 = cur_prediction.ltrb
-            black_frame[y1 : y2 + 1, x1 : x2 + 1] = frame[
-                y1 : y2 + 1, x1 : x2 + 1
-            ]
             class_name = cur_prediction.class_name
-
             text = f"{frame_id=}, {object_id=}, {class_name=}"
-            put_text_on_upper_corner(black_frame, text)
-            writer.write(black_frame)
+            writer.write(render_object_frame(frame, cur_prediction.ltrb, text))
 
         writer.release()
 
     def get_frame(self, frame_id: int):
-        """Returns a frame with the given frame ID."""
+        """Returns a frame with the given frame ID, read from the video."""
+
+        return self.augment(read_frame(self.video_cap, frame_id), frame_id)
+
+    def augment(self, frame: numpy.ndarray, frame_id: int) -> numpy.ndarray:
+        """Applies the augmentations of the run to a frame read again."""
+
+        if self.augmenter is None:
+            return frame
+        num_aug = None
+        if self.controller is not None:
+            operating_point = self.controller.get_operating_point_at(frame_id)
+            num_aug = operating_point["num_aug"]
+        return self.augmenter.augment(frame, frame_id, num_aug)
+
+    def iter_frames(self, start_frame: int, end_frame: int):
+        """Reads the frames in [start_frame, end_frame) from the video, with
+        a single seek to the first one.
+
+        Yields:
+            tuple[int, numpy.ndarray]: Frame ID and the frame.
+        """
+
+        self.video_cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        for frame_id in range(start_frame, end_frame):
+            ret, frame = self.video_cap.read()
+            if not ret:
+                return
+            yield frame_id, self.augment(frame, frame_id)
 
-        return self.tracked_frames[frame_id].frame
+    def get_frame_size(self):
+        """Returns the (width, height) of the frames, None if unknown."""
+
+        if self.frame_size is not None:
+            return self.frame_size
+
+        if self.video_cap is not None and self.video_cap.isOpened():
+            width = int(self.video_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(self.video_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            return width, height
+
+        return None
+
+    def get_last_frame_id(self):
+        """Returns the ID of the last processed frame, None if empty."""
+
+        frame_ids = self.low_confidence_boxes.keys() | self.all_frames.keys()
+        return max(frame_ids, default=None)
 
     def get_frame_predictions(self, frame_id: int):
         """Returns the predictions for a single frame."""
 
         high_confidence_objects = self.all_frames[frame_id]
-        low_confidence_objects = self.tracked_frames[
-            frame_id
-        ].low_confidence_objects
+        low_confidence_objects = boxes_to_predictions(
+            frame_id,
+            self.low_confidence_boxes.get(frame_id, numpy.zeros((0, 6))),
+            self.class_names,
+        )
         return high_confidence_objects, low_confidence_objects
+
+    def get_low_confidence_arrays(self):
+        """Returns the low-confidence detections of all frames as an array of
+        frame IDs and an array of [x1, y1, x2, y2, confidence, class_id] rows,
+        both sorted by frame ID.
+        """
+
+        frame_ids = sorted(self.low_confidence_boxes)
+        boxes = [self.low_confidence_boxes[frame_id] for frame_id in frame_ids]
+        repeated_frame_ids = numpy.repeat(
+            numpy.array(frame_ids, dtype=numpy.int64),
+            [len(frame_boxes) for frame_boxes in boxes],
+        )
+        boxes = (
+            numpy.concatenate(boxes).reshape(-1, 6)
+            if boxes
+            else numpy.zeros((0, 6))
+        )
+
+        return repeated_frame_ids, boxes
+
+    def export_predictions(self, filepath: str):
+        """Exports the tracked objects and the low-confidence detections of
+        all frames to a compressed .npz file, which can be loaded with
+        `from_predictions_file`.
+        """
+
+        object_ids, predictions = [], []
+        for object_id, track_info in self.all_objects.items():
+            object_ids.extend([str(object_id)] * len(track_info))
+            predictions.extend(track_info.values())
+
+        low_conf_frame_ids, low_conf_boxes = self.get_low_confidence_arrays()
+
+        numpy.savez_compressed(
+            filepath,
+            object_ids=numpy.array(object_ids, dtype=str),
+            **predictions_to_arrays(predictions),
+            low_conf_frame_ids=low_conf_frame_ids,
+            low_conf_boxes=low_conf_boxes,
+            skipped_frame_ids=numpy.array(
+                sorted(self.skipped_frame_ids), dtype=numpy.int64
+            ),
+            class_name_ids=numpy.array(
+                list(self.class_names.keys()), dtype=numpy.int64
+            ),
+            class_names=numpy.array(list(self.class_names.values()), dtype=str),
+        )
+
+    @classmethod
+    def from_predictions_file(
+        cls, filepath: str, video_cap: cv2.VideoCapture, out_folder: str
+    ):
+        """Loads a collection exported by `export_predictions`. The frames
+        are not kept, they are read from the video when needed.
+
+        Args:
+            filepath (str): Path to the .npz predictions file.
+            video_cap (cv2.VideoCapture): Video capture of the same video.
+            out_folder (str): Output folder of the collection.
+
+        Returns:
+            TrackedFrameCollection: The loaded collection.
+        """
+
+        with numpy.load(filepath) as data:
+            data = dict(data)
+
+        class_names = dict(
+            zip(data["class_name_ids"].tolist(), data["class_names"].tolist())
+        )
+        collection = cls(video_cap, class_names, out_folder)
+
+        predictions = arrays_to_predictions(
+            data["frame_ids"],
+            data["ltrb"],
+            data["confidences"],
+            data["class_ids"],
+            class_names,
+        )
+        for object_id, pred in zip(data["object_ids"].tolist(), predictions):
+            collection.all_objects[object_id][pred.frame_id] = pred
+            collection.all_frames[pred.frame_id].append(pred)
+        collection.num_frame_predictions = len(predictions)
+
+        # the low-confidence detections are kept as per-frame array slices
+        frame_ids, starts = numpy.unique(
+            data["low_conf_frame_ids"], return_index=True
+        )
+        for frame_id, boxes in zip(
+            frame_ids.tolist(), numpy.split(data["low_conf_boxes"], starts[1:])
+        ):
+            collection.low_confidence_boxes[frame_id] = boxes
+
+        collection.skipped_frame_ids = set(data["skipped_frame_ids"].tolist())
+
+        return collection
@@ -1,16 +1,15 @@
 import copy
 import sys
 from datetime import datetime
+from typing import Optional
 
-import cv2
+import numpy
 
 
 EPS = sys.float_info.epsilon
 
 
-def create_video_writer(
-    video_cap: cv2.VideoCapture, output_filename: str, fps: float = -1
-):
+def create_video_writer(video_cap, output_filename: str, fps: float = -1):
     """Create a video writer object to write the output video
 
     Args:
@@ -22,6 +21,8 @@ def create_video_writer(
         cv2.VideoWriter: Video writer object
     """
 
+    import cv2
+
     # grab the width, height, and fps of the frames in the video stream.
     frame_width = int(video_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     frame_height = int(video_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
@@ -36,6 +37,113 @@ def create_video_writer(
     return writer
 
 
+def read_frame(video_cap, frame_id: int):
+    """Reads a single frame from the video by seeking to it.
+
+    Args:
+        video_cap (cv2.VideoCapture): Video capture object
+        frame_id (int): ID of the frame to read
+
+    Returns:
+        numpy.ndarray: The frame
+    """
+
+    import cv2
+
+    video_cap.set(cv2.CAP_PROP_POS_FRAMES, frame_id)
+    ret, frame = video_cap.read()
+    if not ret:
+        raise ValueError(f"Could not read frame {frame_id} from the video")
+
+    return frame
+
+
+def parse_frame_position(value: str, fps: float) -> int:
+    """Parses a frame position, given either as a frame number (i.e., "1500")
+    or as a timestamp in seconds ("90s", "1.5s") or in [HH:]MM:SS[.ms] format
+    ("01:30", "02:00:00").
+
+    Args:
+        value (str): Frame number or timestamp.
+        fps (float): Frames per second of the video, to convert timestamps.
+
+    Returns:
+        int: The frame number.
+
+    Raises:
+        ValueError: If the value is malformed or negative, or if it is
+            a timestamp and the fps is unknown.
+    """
+
+    value = str(value).strip()
+    if ":" in value:
+        seconds = 0.0
+        for part in value.split(":"):
+            seconds = seconds * 60 + float(part)
+    elif value.endswith("s"):
+        seconds = float(value[:-1])
+    else:
+        frame_id = int(value)
+        if frame_id < 0:
+            raise ValueError(f"Frame position must be non-negative: {value}")
+        return frame_id
+
+    if seconds < 0:
+        raise ValueError(f"Frame position must be non-negative: {value}")
+    if fps <= 0:
+        raise ValueError(f"Unknown fps, {value} can't be converted to frames")
+
+    return int(round(seconds * fps))
+
+
+def get_frame_range(
+    num_frames: int,
+    fps: float,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    max_frames: Optional[str] = None,
+) -> tuple[int, Optional[int]]:
+    """Computes the range of frames to process. Each bound is either a frame
+    number or a timestamp (see `parse_frame_position`).
+
+    Args:
+        num_frames (int): Number of frames in the video, <= 0 if unknown
+            (i.e., streams).
+        fps (float): Frames per second of the video.
+        start (str, optional): First frame to process, 0 if None.
+        end (str, optional): Frame to stop at (exclusive), the end of the
+            video if None.
+        max_frames (str, optional): Maximum number of frames (or duration)
+            to process from the start.
+
+    Returns:
+        tuple[int, Optional[int]]: The start (inclusive) and the end
+            (exclusive) frames, the end is None if unknown.
+
+    Raises:
+        ValueError: If a bound is malformed or the range is empty.
+    """
+
+    start_frame = parse_frame_position(start, fps) if start else 0
+    end_frame = num_frames if num_frames > 0 else None
+    if end:
+        end_frame = parse_frame_position(end, fps)
+        if num_frames > 0:
+            end_frame = min(end_frame, num_frames)
+    if max_frames:
+        max_end_frame = start_frame + parse_frame_position(max_frames, fps)
+        if end_frame is None or max_end_frame < end_frame:
+            end_frame = max_end_frame
+
+    if end_frame is not None and start_frame >= end_frame:
+        raise ValueError(
+            f"Empty frame range: [{start_frame}, {end_frame}) "
+            f"from {start=}, {end=}, {max_frames=}"
+        )
+
+    return start_frame, end_frame
+
+
 def compute_iou(bbox1: list[int], bbox2: list[int]):
     """Compute the intersection over union (IoU) of two bounding boxes.
 
@@ -65,6 +173,37 @@ def compute_iou(bbox1: list[int], bbox2: list[int]):
     return iou
 
 
+def compute_iou_batch(bboxes1: numpy.ndarray, bboxes2: numpy.ndarray):
+    """Compute the IoU of two arrays of bounding boxes, pairwise by row.
+
+    Args:
+        bboxes1 (numpy.ndarray): Bounding boxes of shape (N, 4) in the format
+            of [x1, y1, x2, y2]
+        bboxes2 (numpy.ndarray): Bounding boxes of shape (N, 4)
+
+    Returns:
+        numpy.ndarray: IoU of each pair of bounding boxes, of shape (N,)
+    """
+
+    bboxes1 = numpy.asarray(bboxes1, dtype=numpy.float64).reshape(-1, 4)
+    bboxes2 = numpy.asarray(bboxes2, dtype=numpy.float64).reshape(-1, 4)
+
+    x1 = numpy.maximum(bboxes1[:, 0], bboxes2[:, 0])
+    y1 = numpy.maximum(bboxes1[:, 1], bboxes2[:, 1])
+    x2 = numpy.minimum(bboxes1[:, 2], bboxes2[:, 2])
+    y2 = numpy.minimum(bboxes1[:, 3], bboxes2[:, 3])
+
+    inter_area = numpy.clip(x2 - x1, 0, None) * numpy.clip(y2 - y1, 0, None)
+    box1_area = (bboxes1[:, 2] - bboxes1[:, 0]) * (
+        bboxes1[:, 3] - bboxes1[:, 1]
+    )
+    box2_area = (bboxes2[:, 2] - bboxes2[:, 0]) * (
+        bboxes2[:, 3] - bboxes2[:, 1]
+    )
+
+    return inter_area / (box1_area + box2_area - inter_area + EPS)
+
+
 def get_runtime_str():
     """Getting datetime as a string
 
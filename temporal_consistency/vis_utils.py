@@ -1,4 +1,5 @@
 import cv2
+import numpy
 
 
 GREEN = (0, 255, 0)
@@ -22,6 +23,34 @@ def put_text_on_upper_corner(frame, text):
     return None
 
 
+def render_object_frame(frame, ltrb_bbox, text, out=None):
+    """Renders a frame of a per-object video: the bbox of the object on
+    a black frame, with the text in the upper left corner.
+
+    Args:
+        frame (numpy.ndarray): Source frame, it is not modified.
+        ltrb_bbox (list): Bbox of the object as [x1, y1, x2, y2].
+        text (str): Text to draw.
+        out (numpy.ndarray, optional): Buffer of the frame shape to render
+            into, a new frame is allocated if not given.
+
+    Returns:
+        numpy.ndarray: The rendered frame.
+    """
+
+    if out is None:
+        out = numpy.zeros_like(frame)
+    else:
+        out.fill(0)
+
+    x1, y1, x2, y2 = map(int, ltrb_bbox)
+    x1, y1 = max(x1, 0), max(y1, 0)
+    out[y1 : y2 + 1, x1 : x2 + 1] = frame[y1 : y2 + 1, x1 : x2 + 1]
+    put_text_on_upper_corner(out, text)
+
+    return out
+
+
 def draw_class_name(frame, ltrb_bbox, track_id, class_name, bbox_color=GREEN):
     """Draws the class name and track id on the frame. The class name and track
     id are drawn on top of the bounding box.
@@ -75,3 +104,44 @@ def draw_fps_on_frame(frame, total_time):
     )
 
     return None
+
+
+class FrameRenderer:
+    """Renders the tracking results of a frame for the annotated output video.
+
+    The frame is copied into an output buffer that is allocated once and
+    reused for every frame, so rendering does not allocate a new frame each
+    time. The writer consumes the buffer before the next frame is rendered.
+    """
+
+    def __init__(self, classes: dict):
+        self.classes = classes
+        self.buffer = None
+
+    def render(self, frame, tracks, total_time):
+        """Draws the confirmed tracks and the FPS on a copy of the frame.
+
+        Args:
+            frame (numpy.ndarray): Frame to render, it is not modified.
+            tracks (list): Tracks of the frame, only confirmed ones are drawn.
+            total_time (float): Time spent on the frame in milliseconds.
+
+        Returns:
+            numpy.ndarray: The output buffer with the rendered frame.
+        """
+
+        if self.buffer is None or self.buffer.shape != frame.shape:
+            self.buffer = numpy.empty_like(frame)
+        numpy.copyto(self.buffer, frame)
+
+        for track in tracks:
+            if not track.is_confirmed():
+                continue
+
+            draw_bbox_around_object(
+                self.buffer, track, track.to_ltrb(), self.classes
+            )
+
+        draw_fps_on_frame(self.buffer, total_time)
+
+        return self.buffer
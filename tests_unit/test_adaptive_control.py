@@ -0,0 +1,107 @@
+import json
+
+import pytest
+
+from temporal_consistency.adaptive_control import AdaptiveController
+from temporal_consistency.frame_preprocessing import FramePreprocessor
+
+
+def run_frames(controller, latency_ms, num_frames, start=0):
+    for frame_id in range(start, start + num_frames):
+        controller.update(frame_id, latency_ms)
+    return start + num_frames
+
+
+def test_degrades_in_order_within_bounds():
+    controller = AdaptiveController(
+        10,
+        num_aug=2,
+        min_scale=0.7,
+        max_detection_interval=2,
+        adjust_every=1,
+    )
+    run_frames(controller, latency_ms=500, num_frames=20)
+
+    knobs = [adjustment["knob"] for adjustment in controller.adjustments]
+    assert knobs == [
+        "num_aug",
+        "num_aug",
+        "scale",
+        "scale",
+        "detection_interval",
+    ]
+    assert controller.get_operating_point() == {
+        "num_aug": 0,
+        "scale": 0.7,
+        "detection_interval": 2,
+    }
+
+
+def test_restores_with_headroom():
+    controller = AdaptiveController(
+        10, num_aug=1, min_scale=0.8, adjust_every=5, smoothing=1.0
+    )
+    frame_id = run_frames(controller, latency_ms=200, num_frames=15)
+    assert controller.get_operating_point() == {
+        "num_aug": 0,
+        "scale": 0.8,
+        "detection_interval": 2,
+    }
+
+    # latency within the tolerance keeps the operating point
+    frame_id = run_frames(controller, 100, 50, start=frame_id)
+    assert len(controller.adjustments) == 3
+
+    run_frames(controller, 10, 50, start=frame_id)
+    initial_operating_point = controller.initial_operating_point
+    assert controller.get_operating_point() == initial_operating_point
+    knobs = [adjustment["knob"] for adjustment in controller.adjustments[3:]]
+    assert knobs == ["detection_interval", "scale", "num_aug"]
+
+
+def test_should_detect_follows_interval():
+    controller = AdaptiveController(10)
+    assert controller.should_detect()
+    controller.detection_interval = 3
+
+    assert [controller.should_detect() for _ in range(6)] == [
+        False,
+        False,
+        True,
+        False,
+        False,
+        True,
+    ]
+
+
+def test_configure_and_export(tmp_path):
+    controller = AdaptiveController(
+        10, num_aug=1, scale=1.0, min_scale=0.5, adjust_every=1
+    )
+    run_frames(controller, latency_ms=500, num_frames=2)
+    preprocessor = FramePreprocessor()
+    controller.configure(preprocessor)
+
+    assert preprocessor.scale == 0.8
+    assert controller.get_operating_point_at(0)["num_aug"] == 1
+    assert controller.get_operating_point_at(1)["num_aug"] == 0
+    assert controller.get_operating_point_at(2)["scale"] == 0.8
+
+    filepath = tmp_path / "operating_points.json"
+    controller.export_adjustments(str(filepath))
+    exported = json.loads(filepath.read_text())
+    assert exported["budget_ms"] == 100
+    assert exported["adjustments"] == controller.adjustments
+
+    loaded = AdaptiveController.from_adjustments_file(str(filepath))
+    for frame_id in range(3):
+        assert loaded.get_operating_point_at(
+            frame_id
+        ) == controller.get_operating_point_at(frame_id)
+
+
+def test_invalid_bounds():
+    with pytest.raises(ValueError):
+        AdaptiveController(0)
+    with pytest.raises(ValueError):
+        AdaptiveController(10, scale=0.5, min_scale=0.8)
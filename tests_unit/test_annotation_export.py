@@ -0,0 +1,109 @@
+import json
+import tarfile
+
+import numpy
+
+from temporal_consistency.annotation_export import (
+    FrameAnnotations,
+    export_coco_shards,
+    export_frame_annotations,
+    export_yolo_shards,
+)
+from temporal_consistency.tracked_frame import (
+    Prediction,
+    TrackedFrameCollection,
+)
+
+
+CLASS_NAMES = {0: "car", 1: "truck"}
+
+
+def get_collection(out_folder):
+    collection = TrackedFrameCollection(None, CLASS_NAMES, str(out_folder))
+    for object_id, frame_id, ltrb, class_id in [
+        ("1", 5, [0, 0, 10, 20], 0),
+        ("1", 6, [2, 0, 12, 20], 0),
+        ("2", 5, [50, 40, 70, 60], 1),
+        ("2", 9, [52, 40, 72, 60], 1),
+    ]:
+        pred = Prediction(frame_id, ltrb, 0.9, class_id, CLASS_NAMES)
+        collection.all_objects[object_id][frame_id] = pred
+    collection.low_confidence_boxes = {
+        6: numpy.array([[20, 20, 30, 30, 0.2, 1]], dtype=float),
+        7: numpy.zeros((0, 6)),
+    }
+    return collection
+
+
+def test_frame_annotations(tmp_path):
+    filepath = str(tmp_path / "annotations.bin")
+    export_frame_annotations(get_collection(tmp_path), filepath)
+
+    annotations = FrameAnnotations(filepath)
+    assert len(annotations) == 5
+    assert list(annotations.frame_ids) == [5, 6, 7, 8, 9]
+    assert annotations.class_names == CLASS_NAMES
+
+    frame5 = annotations.get_frame(5)
+    assert sorted(frame5["object_id"].tolist()) == [1, 2]
+
+    frame6 = annotations.get_frame(6)
+    assert frame6["is_low_confidence"].tolist() == [False, True]
+    assert frame6["ltrb"][1].tolist() == [20, 20, 30, 30]
+    assert frame6["object_id"][1] == -1
+
+    assert len(annotations.get_frame(7)) == 0
+    assert len(annotations.get_frame(100)) == 0
+
+
+def test_empty_frame_annotations(tmp_path):
+    filepath = str(tmp_path / "annotations.bin")
+    collection = TrackedFrameCollection(None, CLASS_NAMES, str(tmp_path))
+    export_frame_annotations(collection, filepath)
+
+    annotations = FrameAnnotations(filepath)
+    assert len(annotations) == 0
+    assert len(annotations.get_frame(0)) == 0
+
+
+def test_annotation_shards(tmp_path):
+    filepath = str(tmp_path / "annotations.bin")
+    export_frame_annotations(get_collection(tmp_path), filepath)
+    annotations = FrameAnnotations(filepath)
+
+    coco_filepaths = export_coco_shards(
+        annotations, str(tmp_path), (100, 100), shard_size=2
+    )
+    assert len(coco_filepaths) == 2
+    with open(coco_filepaths[0]) as f:
+        coco = json.load(f)
+    assert [image["id"] for image in coco["images"]] == [5, 6]
+    assert len(coco["annotations"]) == 3
+    assert coco["annotations"][0]["bbox"] == [0, 0, 10, 20]
+
+    yolo_filepaths = export_yolo_shards(
+        annotations, str(tmp_path), (100, 100), shard_size=10
+    )
+    with tarfile.open(yolo_filepaths[0]) as tar:
+        assert tar.extractfile("classes.txt").read() == b"car\ntruck"
+        labels = tar.extractfile("frame5.txt").read().decode().splitlines()
+    assert labels[0] == "0 0.050000 0.100000 0.100000 0.200000"
+
+
+def test_yolo_shards_are_clipped(tmp_path):
+    filepath = str(tmp_path / "annotations.bin")
+    collection = get_collection(tmp_path)
+    pred = Prediction(5, [-40, 70, -5, 80], 0.9, 0, CLASS_NAMES)
+    collection.all_objects["3"][5] = pred
+    export_frame_annotations(collection, filepath)
+
+    yolo_filepaths = export_yolo_shards(
+        FrameAnnotations(filepath), str(tmp_path), (60, 50)
+    )
+    with tarfile.open(yolo_filepaths[0]) as tar:
+        labels = tar.extractfile("frame5.txt").read().decode().splitlines()
+
+    # [50, 40, 70, 60] is clipped to [50, 40, 60, 50], and the bbox outside
+    # the frame is dropped
+    assert len(labels) == 2
+    assert "1 0.916667 0.900000 0.166667 0.200000" in labels
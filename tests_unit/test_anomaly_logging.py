@@ -0,0 +1,48 @@
+import json
+
+from loguru import logger
+
+from temporal_consistency.anomaly_logging import (
+    AnomalyEventLogger,
+    is_not_anomaly_event,
+)
+
+
+def test_anomaly_event_logger(tmp_path):
+    filepath = tmp_path / "anomalies.jsonl"
+    event_logger = AnomalyEventLogger(str(filepath), max_events_per_type=2)
+    other_logger = AnomalyEventLogger(max_events_per_type=2)
+
+    for frame_id in range(5):
+        event_logger.log("1", frame_id, "low_iou", 0.5, {"iou": 0.2})
+    event_logger.log("2", 7, "single_frame", 0.5)
+    other_logger.log("3", 9, "single_frame", 0.5)
+    event_logger.close()
+
+    assert event_logger.get_counters() == {
+        "events": {"low_iou": 5, "single_frame": 1},
+        "rate_limited": {"low_iou": 3},
+    }
+
+    lines = filepath.read_text().splitlines()
+    events = [json.loads(line)["record"]["extra"] for line in lines]
+    assert [event["frame_id"] for event in events] == [0, 1, 7]
+    assert events[0]["details"] == {"iou": 0.2}
+    assert events[2]["anomaly_type"] == "single_frame"
+
+
+def test_anomaly_events_filtered_from_other_sinks(tmp_path):
+    filepath = tmp_path / "output.log"
+    sink_id = logger.add(filepath, filter=is_not_anomaly_event)
+    event_logger = AnomalyEventLogger(str(tmp_path / "anomalies.jsonl"))
+
+    try:
+        event_logger.log("1", 3, "low_iou", 0.5)
+        logger.info("other message")
+    finally:
+        event_logger.close()
+        logger.remove(sink_id)
+
+    assert "other message" in filepath.read_text()
+    assert "low_iou" not in filepath.read_text()
+    assert "low_iou" in (tmp_path / "anomalies.jsonl").read_text()
@@ -0,0 +1,157 @@
+import pytest
+
+from temporal_consistency.anomaly_rules import (
+    RULE_REGISTRY,
+    build_rules,
+    is_edge_truncation,
+    sample_gap_frames,
+)
+from temporal_consistency.track_summary import TrackSummary
+from temporal_consistency.tracked_frame import Prediction
+
+
+CLASS_NAMES = {0: "car", 1: "truck"}
+CONTEXT = {"frame_size": (100, 100), "last_frame_id": 20}
+
+
+def get_track(rows):
+    track_info = {
+        frame_id: Prediction(frame_id, ltrb, conf, class_id, CLASS_NAMES)
+        for frame_id, ltrb, conf, class_id in rows
+    }
+    return TrackSummary("1", track_info)
+
+
+def evaluate(name, rows, context=CONTEXT, **params):
+    rule = RULE_REGISTRY[name](**params)
+    return [anomaly[0] for anomaly in rule.evaluate(get_track(rows), context)]
+
+
+@pytest.mark.parametrize(
+    "start, length, num_samples, expected",
+    [
+        (10, 1, 1, [10]),
+        (10, 5, 1, [12]),
+        (10, 6, 2, [11, 14]),
+        (10, 2, 5, [10, 11]),
+    ],
+)
+def test_sample_gap_frames(start, length, num_samples, expected):
+    assert sample_gap_frames(start, length, num_samples) == expected
+
+
+def test_build_rules():
+    rules = build_rules(params={"low_iou": {"min_iou": 0.3}})
+    assert [rule.name for rule in rules] == [
+        "class_inconsistency",
+        "missing_object",
+        "single_frame",
+        "low_iou",
+    ]
+    assert rules[3].params["min_iou"] == 0.3
+
+    rules = build_rules(["low_iou", "edge_exit"])
+    assert [rule.name for rule in rules] == ["low_iou", "edge_exit"]
+
+    with pytest.raises(ValueError):
+        build_rules(["unknown_rule"])
+    with pytest.raises(ValueError):
+        build_rules(params={"low_iou": {"threshold": 0.3}})
+
+
+def test_existing_rules():
+    rows = [
+        (0, [40, 40, 50, 50], 0.9, 0),
+        (1, [42, 40, 52, 50], 0.9, 0),
+        (5, [47, 40, 57, 50], 0.9, 1),
+    ]
+
+    assert evaluate("class_inconsistency", rows) == [5]
+    assert evaluate("missing_object", rows, frames_per_gap=3) == [2, 3, 4]
+    assert evaluate("single_frame", rows) == []
+    assert evaluate("single_frame", rows[:1]) == [0]
+    assert evaluate("low_iou", rows) == [1]
+    assert evaluate("low_iou", rows, min_iou=0.2) == []
+
+
+def test_bbox_size_jump():
+    rows = [
+        (0, [40, 40, 50, 50], 0.9, 0),
+        (1, [40, 40, 51, 51], 0.9, 0),
+        (2, [40, 40, 60, 60], 0.9, 0),
+    ]
+
+    assert evaluate("bbox_size_jump", rows) == [2]
+    assert evaluate("bbox_size_jump", rows, max_area_ratio=4.0) == []
+
+
+def test_confidence_oscillation():
+    confidences = [0.9, 0.4, 0.9, 0.4, 0.5]
+    rows = [
+        (i, [40, 40, 50, 50], conf, 0) for i, conf in enumerate(confidences)
+    ]
+
+    assert evaluate("confidence_oscillation", rows) == [1]
+    assert evaluate("confidence_oscillation", rows, min_oscillations=3) == []
+
+
+def test_class_flicker():
+    rows = [
+        (i, [40, 40, 50, 50], 0.9, class_id)
+        for i, class_id in enumerate([0, 1, 0, 0, 0, 0])
+    ]
+
+    # the first change is reported by class_inconsistency only
+    assert evaluate("class_inconsistency", rows) == [1]
+    assert evaluate("class_flicker", rows) == [2]
+    assert evaluate("class_flicker", rows, max_flicker_rate=0.5) == []
+
+    # a single class change is not a flicker
+    assert evaluate("class_flicker", rows[:2]) == []
+
+
+def test_edge_exit():
+    center_rows = [(0, [40, 40, 50, 50], 0.9, 0), (1, [42, 40, 52, 50], 0.9, 0)]
+    edge_rows = [(0, [80, 40, 90, 50], 0.9, 0), (1, [85, 40, 99, 50], 0.9, 0)]
+
+    assert evaluate("edge_exit", center_rows) == [1]
+    assert evaluate("edge_exit", edge_rows) == []
+    assert (
+        evaluate("edge_exit", center_rows, context={"last_frame_id": 1}) == []
+    )
+    assert evaluate("edge_exit", center_rows, context={}) == []
+
+    # the tracker keeps predicting the bbox towards the edge after the
+    # detection is lost, the anomaly is at the last detection
+    coasting_rows = center_rows + [(2, [80, 40, 90, 50], None, 0)]
+    assert evaluate("edge_exit", coasting_rows) == [1]
+
+
+def test_is_edge_truncation():
+    bboxes1 = [[90, 40, 100, 50], [90, 40, 100, 50], [40, 40, 50, 50]]
+    bboxes2 = [[95, 41, 100, 50], [60, 40, 80, 50], [48, 40, 55, 50]]
+
+    is_truncation = is_edge_truncation(bboxes1, bboxes2, (100, 100))
+    assert is_truncation.tolist() == [True, False, False]
+
+    # the bboxes extend beyond the frame edges
+    bboxes1 = [[-40, 40, 10, 50], [80, 40, 150, 50]]
+    bboxes2 = [[-40, 40, 5, 50], [85, 40, 150, 50]]
+
+    is_truncation = is_edge_truncation(bboxes1, bboxes2, (100, 100))
+    assert is_truncation.tolist() == [True, True]
+
+
+def test_low_iou_suppressed_at_frame_edges():
+    rows = [
+        (0, [92, 40, 100, 50], 0.9, 0),
+        (1, [97, 40, 100, 50], 0.9, 0),
+        (2, [40, 40, 50, 50], 0.9, 0),
+    ]
+    rule = RULE_REGISTRY["low_iou"]()
+
+    anomalies = rule.evaluate(get_track(rows), CONTEXT)
+    assert [anomaly[0] for anomaly in anomalies] == [1]
+    assert rule.num_suppressed == 1
+
+    assert evaluate("low_iou", rows, context={}) == [0, 1]
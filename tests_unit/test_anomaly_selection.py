@@ -0,0 +1,92 @@
+import numpy
+
+from temporal_consistency.anomaly_selection import (
+    get_explained_ranges,
+    select_anomaly_frames,
+    select_first_per_object,
+)
+
+
+def select_dense(frame_ids, severities, budget, window):
+    """Reference greedy selection over the dense explains matrix."""
+
+    frame_ids = numpy.asarray(frame_ids)
+    candidates = numpy.unique(frame_ids)
+    explains = numpy.abs(candidates[:, None] - frame_ids[None, :]) <= window
+    uncovered = numpy.asarray(severities, dtype=numpy.float64)
+
+    selected = []
+    while budget <= 0 or len(selected) < budget:
+        scores = explains @ uncovered
+        best = int(numpy.argmax(scores))
+        if scores[best] <= 0:
+            break
+        selected.append(int(candidates[best]))
+        uncovered[explains[best]] = 0
+
+    return sorted(selected)
+
+
+def test_get_explained_ranges():
+    starts, ends = get_explained_ranges(numpy.array([1, 2, 10, 11, 30]), 2)
+    assert starts.tolist() == [0, 0, 2, 2, 4]
+    assert ends.tolist() == [2, 2, 4, 4, 5]
+
+
+def test_select_anomaly_frames_deduplicates_neighbors():
+    frame_ids = [10, 11, 12, 13, 50]
+    severities = [1, 1, 1, 1, 1]
+    assert select_anomaly_frames(frame_ids, severities, window=2) == [11, 50]
+    assert select_anomaly_frames(frame_ids, severities, window=0) == [
+        10,
+        11,
+        12,
+        13,
+        50,
+    ]
+
+
+def test_select_anomaly_frames_respects_budget_and_severity():
+    frame_ids = [10, 11, 50, 90]
+    severities = [0.2, 0.2, 1.0, 0.3]
+    assert select_anomaly_frames(frame_ids, severities, budget=1) == [50]
+    assert select_anomaly_frames(frame_ids, severities, budget=2) == [10, 50]
+    assert select_anomaly_frames(frame_ids, severities, budget=3) == [
+        10,
+        50,
+        90,
+    ]
+
+
+def test_select_anomaly_frames_empty():
+    assert select_anomaly_frames([], []) == []
+
+
+def test_select_anomaly_frames_matches_dense_greedy():
+    rng = numpy.random.default_rng(0)
+    for _ in range(20):
+        frame_ids = rng.integers(0, 60, size=40)
+        # distinct severities, so that the greedy order has no ties
+        severities = rng.permutation(40) + 1.0
+        for budget in [0, 3]:
+            assert select_anomaly_frames(
+                frame_ids, severities, budget=budget, window=2
+            ) == select_dense(frame_ids, severities, budget, window=2)
+
+
+def test_select_anomaly_frames_long_chain():
+    # a single cluster chained over the whole video
+    frame_ids = numpy.repeat(numpy.arange(10_000), 2)
+    selected = select_anomaly_frames(frame_ids, numpy.ones(20_000), window=2)
+
+    assert len(selected) == 2000
+    assert numpy.diff(selected).min() == 5
+
+
+def test_select_first_per_object():
+    records = [
+        ("1", 5, "low_iou", 1.0),
+        ("2", 3, "single_frame", 0.5),
+        ("1", 2, "missing_object", 0.5),
+    ]
+    assert select_first_per_object(records) == records[:2]
@@ -0,0 +1,133 @@
+import random
+import shutil
+
+import numpy
+import pytest
+
+from temporal_consistency import augmentations
+from temporal_consistency.augmentations import (
+    AugmentationCache,
+    FrameAugmenter,
+    apply_seeded,
+    get_frame_seed,
+    get_random_augmentation,
+    get_video_id,
+)
+
+
+def get_frame(seed=0):
+    rng = numpy.random.default_rng(seed)
+    return rng.integers(0, 256, size=(48, 64, 3), dtype=numpy.uint8)
+
+
+def test_get_frame_seed():
+    seed = get_frame_seed("video1.mp4", 10, run_seed=3)
+
+    assert seed == get_frame_seed("video1.mp4", 10, run_seed=3)
+    assert 0 <= seed < 2**64
+    assert seed != get_frame_seed("video1.mp4", 11, run_seed=3)
+    assert seed != get_frame_seed("video2.mp4", 10, run_seed=3)
+    assert seed != get_frame_seed("video1.mp4", 10, run_seed=4)
+
+
+def test_get_video_id(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    video1 = tmp_path / "a" / "video.mp4"
+    video2 = tmp_path / "b" / "video.mp4"
+    video1.write_bytes(b"first video")
+    video2.write_bytes(b"other video")
+    shutil.copy(video1, tmp_path / "copy.mp4")
+
+    # the same file name, but a different content
+    assert get_video_id(str(video1)) != get_video_id(str(video2))
+    assert get_video_id(str(video1)) == get_video_id(str(tmp_path / "copy.mp4"))
+    assert get_video_id("rtsp://camera/1") == "rtsp://camera/1"
+
+
+def stub_pipeline(image):
+    # draws from both global random states, like albumentations
+    noise = numpy.random.randint(0, 50, size=image.shape, dtype=numpy.uint8)
+    return {"image": image // 2 + noise + random.randint(0, 50)}
+
+
+def test_apply_seeded_is_deterministic():
+    frame = get_frame()
+    random.seed(123)
+    state = random.getstate()
+
+    frame_aug1 = apply_seeded(stub_pipeline, frame, seed=42)
+    frame_aug2 = apply_seeded(stub_pipeline, frame, seed=42)
+
+    assert numpy.array_equal(frame_aug1, frame_aug2)
+    assert not numpy.array_equal(
+        frame_aug1, apply_seeded(stub_pipeline, frame, seed=43)
+    )
+    assert random.getstate() == state
+
+
+def test_frame_augmenter_is_seeded_by_video(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        augmentations,
+        "get_random_augmentation",
+        lambda image, num_aug, seed: apply_seeded(stub_pipeline, image, seed),
+    )
+    frame = get_frame()
+    video_ids = []
+    for folder, content in [("a", b"video"), ("b", b"video"), ("c", b"other")]:
+        (tmp_path / folder).mkdir()
+        filepath = tmp_path / folder / "video.mp4"
+        filepath.write_bytes(content)
+        video_ids.append(get_video_id(str(filepath)))
+
+    # the same content gives the same augmentations, whatever the path
+    frames_aug = [
+        FrameAugmenter(1, video_id, run_seed=1).augment(frame, 5)
+        for video_id in video_ids
+    ]
+    assert numpy.array_equal(frames_aug[0], frames_aug[1])
+    assert not numpy.array_equal(frames_aug[0], frames_aug[2])
+
+
+def test_augmentation_cache(tmp_path):
+    pytest.importorskip("cv2")
+    cache = AugmentationCache(str(tmp_path))
+    frame = get_frame()
+
+    assert cache.get("key") is None
+    cache.put("key", frame)
+    assert numpy.array_equal(cache.get("key"), frame)
+    assert [p.name for p in tmp_path.iterdir()] == ["key.png"]
+
+
+def test_frame_augmenter_reads_cache(tmp_path):
+    pytest.importorskip("cv2")
+    augmenter = FrameAugmenter(
+        2, "video1.mp4", run_seed=1, cache_folder=str(tmp_path)
+    )
+    frame, frame_aug = get_frame(0), get_frame(1)
+    seed = get_frame_seed("video1.mp4", 5, run_seed=1)
+    augmenter.cache.put(f"{seed:016x}_2", frame_aug)
+
+    # the cached frame is returned without augmenting it again
+    assert numpy.array_equal(augmenter.augment(frame, 5), frame_aug)
+    assert augmenter.num_cache_hits == 1
+    assert FrameAugmenter(0, "video1.mp4").augment(frame, 5) is frame
+
+    # the number of augmentations the frame was processed with overrides it
+    augmenter.num_aug = 0
+    assert numpy.array_equal(augmenter.augment(frame, 5, num_aug=2), frame_aug)
+
+
+def test_seeded_augmentation_is_deterministic():
+    pytest.importorskip("albumentations")
+    frame = get_frame()
+    random.seed(123)
+    state = random.getstate()
+
+    frame_aug1 = get_random_augmentation(frame, num_aug=3, seed=42)
+    frame_aug2 = get_random_augmentation(frame, num_aug=3, seed=42)
+
+    assert numpy.array_equal(frame_aug1, frame_aug2)
+    # the global random state is not affected
+    assert random.getstate() == state
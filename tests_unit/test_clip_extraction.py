@@ -0,0 +1,113 @@
+import numpy
+import pytest
+
+from temporal_consistency.adaptive_control import AdaptiveController
+from temporal_consistency.clip_extraction import (
+    TrackTube,
+    extract_track_clips,
+    extract_tube_group,
+    group_tubes,
+)
+from temporal_consistency.regression import generate_synthetic_clip
+
+
+def get_tube(object_id, frame_ids):
+    ltrb = numpy.tile([5, 5, 20, 20], (len(frame_ids), 1))
+    return TrackTube(object_id, numpy.array(frame_ids), ltrb, ["car"] * 3)
+
+
+def test_track_tube_is_sorted():
+    tube = TrackTube(
+        "1",
+        numpy.array([4, 2, 3]),
+        numpy.array([[4, 4, 9, 9], [2, 2, 9, 9], [3, 3, 9, 9]]),
+        ["car", "truck", "bus"],
+    )
+
+    assert tube.frame_ids.tolist() == [2, 3, 4]
+    assert tube.ltrb[:, 0].tolist() == [2, 3, 4]
+    assert tube.class_names == ["truck", "bus", "car"]
+    assert (tube.first_frame, tube.last_frame) == (2, 4)
+
+
+def test_group_tubes():
+    tubes = [
+        get_tube("1", [0, 1, 5]),
+        get_tube("2", [20, 21, 22]),
+        get_tube("3", [5, 6, 8]),
+        get_tube("4", [9, 10, 11]),
+    ]
+    groups = group_tubes(tubes)
+
+    assert [[tube.object_id for tube in group] for group in groups] == [
+        ["1", "3"],
+        ["4"],
+        ["2"],
+    ]
+
+
+def test_extract_track_clips(tmp_path):
+    cv2 = pytest.importorskip("cv2")
+    video_filepath = str(tmp_path / "clip.mp4")
+    generate_synthetic_clip(
+        video_filepath, num_frames=12, frame_size=(160, 120)
+    )
+    tubes = [
+        get_tube("1", [0, 2, 4]),
+        get_tube("2", [2, 3, 4]),
+        get_tube("3", [9, 10, 11]),
+    ]
+
+    # frames 0, 2, 3 and 4 are decoded once for both objects
+    assert extract_tube_group(video_filepath, tubes[:2], str(tmp_path), 5) == 4
+
+    out_folder = str(tmp_path / "clips")
+    filepaths = extract_track_clips(
+        video_filepath, tubes, out_folder, fps=5, num_workers=2
+    )
+    for filepath in filepaths:
+        video_cap = cv2.VideoCapture(filepath)
+        assert int(video_cap.get(cv2.CAP_PROP_FRAME_COUNT)) == 3
+        ret, frame = video_cap.read()
+        assert ret
+        # only the bbox of the object is kept
+        assert frame[80:, 80:].max() < 30
+        video_cap.release()
+
+
+class FakeAugmenter:
+    def __init__(self):
+        self.frame_ids = []
+        self.num_augs = []
+
+    def augment(self, frame, frame_id, num_aug=None):
+        self.frame_ids.append(frame_id)
+        self.num_augs.append(num_aug)
+        return numpy.full_like(frame, 255)
+
+
+def test_extract_track_clips_augmented(tmp_path):
+    cv2 = pytest.importorskip("cv2")
+    video_filepath = str(tmp_path / "clip.mp4")
+    generate_synthetic_clip(video_filepath, num_frames=6, frame_size=(160, 120))
+    augmenter = FakeAugmenter()
+    controller = AdaptiveController(10, num_aug=2, adjust_every=1)
+    controller.update(2, latency_ms=500)
+
+    filepaths = extract_track_clips(
+        video_filepath,
+        [get_tube("1", [1, 3, 4])],
+        str(tmp_path),
+        fps=5,
+        augmenter=augmenter,
+        controller=controller,
+    )
+
+    # the augmentations of the run are applied to the decoded frames, with
+    # the number of augmentations of their operating point
+    assert augmenter.frame_ids == [1, 3, 4]
+    assert augmenter.num_augs == [2, 1, 1]
+    video_cap = cv2.VideoCapture(filepaths[0])
+    _, frame = video_cap.read()
+    video_cap.release()
+    assert frame[10:15, 10:15].min() > 200
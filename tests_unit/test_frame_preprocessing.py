@@ -0,0 +1,70 @@
+import numpy
+import pytest
+
+from temporal_consistency.frame_preprocessing import (
+    DetectionView,
+    FramePreprocessor,
+    get_tile_starts,
+    non_max_suppression,
+)
+
+
+@pytest.mark.parametrize(
+    "length, tile_size, overlap, expected",
+    [
+        (100, 200, 0.2, [0]),
+        (100, 50, 0.0, [0, 50]),
+        (100, 40, 0.5, [0, 20, 40, 60]),
+        (100, 60, 0.2, [0, 40]),
+    ],
+)
+def test_get_tile_starts(length, tile_size, overlap, expected):
+    assert get_tile_starts(length, tile_size, overlap) == expected
+
+
+def test_non_max_suppression_is_class_aware():
+    boxes = numpy.array(
+        [
+            [0, 0, 10, 10, 0.9, 0],
+            [1, 1, 10, 10, 0.8, 0],
+            [1, 1, 10, 10, 0.7, 1],
+        ]
+    )
+    kept = non_max_suppression(boxes)
+    assert kept[:, 4].tolist() == [0.9, 0.7]
+
+
+def test_detection_view_to_original_coords():
+    view = DetectionView(image=None, offset=(100, 50), scale=0.5)
+    boxes = view.to_original_coords([[10, 10, 20, 30, 0.5, 2]])
+    assert boxes.tolist() == [[120, 70, 140, 110, 0.5, 2]]
+
+
+def test_frame_preprocessor_identity():
+    frame = numpy.zeros((40, 60, 3), dtype=numpy.uint8)
+    views = FramePreprocessor().get_views(frame)
+    assert len(views) == 1
+    assert views[0].image is frame
+    assert FramePreprocessor().get_input_size(views) is None
+
+
+def test_frame_preprocessor_roi_scale_and_tiles():
+    frame = numpy.zeros((400, 600, 3), dtype=numpy.uint8)
+    preprocessor = FramePreprocessor(
+        roi=[100, 0, 500, 400], scale=0.5, tile_size=100, tile_overlap=0.0
+    )
+    views = preprocessor.get_views(frame)
+
+    assert len(views) == 4
+    assert all(view.image.shape == (100, 100, 3) for view in views)
+    # rounded up to the stride of the detector
+    assert preprocessor.get_input_size(views) == 128
+
+    detections = [numpy.array([[0, 0, 10, 10, 0.9, 0]])] * len(views)
+    boxes = preprocessor.merge_detections(views, detections)
+    assert sorted(boxes[:, :2].tolist()) == [
+        [100, 0],
+        [100, 200],
+        [300, 0],
+        [300, 200],
+    ]
@@ -0,0 +1,83 @@
+import numpy
+import pytest
+
+from temporal_consistency.annotation_export import RECORD_DTYPE
+from temporal_consistency.frame_ranking import (
+    FRAME_SCORES_DTYPE,
+    binary_entropy,
+    export_frame_scores,
+    get_frame_scores,
+    get_priority,
+    load_frame_scores,
+    rank_frames,
+)
+
+
+def get_records(rows):
+    records = numpy.zeros(len(rows), dtype=RECORD_DTYPE)
+    records["frame_id"], records["confidence"] = zip(*rows)
+    return records
+
+
+def test_binary_entropy():
+    entropy = binary_entropy(numpy.array([0.5, 0.0, 1.0, 0.1, 0.9]))
+
+    assert entropy[0] == pytest.approx(1.0)
+    assert entropy[1:3] == pytest.approx([0.0, 0.0], abs=1e-6)
+    assert entropy[3] == pytest.approx(entropy[4])
+
+
+def test_get_frame_scores():
+    records = get_records(
+        [(0, 0.9), (1, 0.35), (1, 0.45), (2, numpy.nan), (3, 0.4), (3, 0.05)]
+    )
+    scores = get_frame_scores(
+        records,
+        anomaly_frame_ids=[2, 3, 3],
+        anomaly_severities=[1.0, 0.5, 0.5],
+        confidence_threshold=0.4,
+        margin=0.1,
+    )
+
+    assert scores["frame_id"].tolist() == [1, 2, 3]
+    assert scores["num_uncertain"].tolist() == [2, 0, 1]
+    assert scores["margin"] == pytest.approx([0.5, 0.0, 1.0])
+    assert scores["anomaly"] == pytest.approx([0.0, 1.0, 1.0])
+    assert scores["entropy"][0] == pytest.approx(
+        binary_entropy(numpy.array([0.35, 0.45])).sum()
+    )
+    assert scores["priority"] == pytest.approx(get_priority(scores))
+
+
+def test_get_priority_unknown_score():
+    with pytest.raises(ValueError):
+        get_priority(numpy.zeros(1, dtype=FRAME_SCORES_DTYPE), {"iou": 1.0})
+
+
+def test_export_and_load_frame_scores(tmp_path):
+    scores = get_frame_scores(
+        get_records([(0, 0.35), (4, 0.42)]), [4], [0.5], 0.4
+    )
+    filepath = str(tmp_path / "frame_scores.csv")
+    export_frame_scores(filepath, scores)
+
+    assert load_frame_scores(filepath).tolist() == scores.tolist()
+
+
+def test_rank_frames():
+    scores = numpy.zeros(3, dtype=FRAME_SCORES_DTYPE)
+    scores["frame_id"] = [0, 1, 2]
+    scores["anomaly"] = [0.0, 2.0, 1.0]
+    scores["priority"] = [0.5, 2.0, 1.0]
+    other = scores.copy()
+    other["priority"] = [3.0, 0.1, 1.0]
+
+    ranked = rank_frames({"a": scores, "b": other}, budget=3)
+    assert ranked == [("b", 0, 3.0), ("a", 1, 2.0), ("a", 2, 1.0)]
+    assert len(rank_frames({"a": scores, "b": other})) == 6
+
+    # only the anomalies count with these weights
+    weights = {"num_uncertain": 0, "entropy": 0, "margin": 0, "anomaly": 1}
+    ranked = rank_frames({"a": scores, "b": other}, budget=2, weights=weights)
+    assert ranked == [("a", 1, 2.0), ("b", 1, 2.0)]
+    assert rank_frames({}, budget=5) == []
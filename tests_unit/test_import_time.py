@@ -0,0 +1,52 @@
+"""Import-time benchmark, to keep the startup of the CLI fast. The heavy
+dependencies must only be imported in the code paths that need them.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = {"torch", "ultralytics", "deep_sort_realtime", "albumentations"}
+IMPORT_TIME_BUDGET = 2.0  # seconds
+
+
+def import_in_subprocess(module: str) -> dict:
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "duration = time.perf_counter() - start\n"
+        "print(json.dumps({'duration': duration, 'modules': list(sys.modules)}))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout)
+
+
+@pytest.mark.parametrize(
+    "module, forbidden_modules",
+    [
+        ("main", HEAVY_MODULES | {"cv2"}),
+        (
+            "temporal_consistency.frame_anomaly_detection",
+            HEAVY_MODULES | {"cv2"},
+        ),
+        ("temporal_consistency.object_detection_tracking", HEAVY_MODULES),
+    ],
+)
+def test_import_time(module, forbidden_modules):
+    result = import_in_subprocess(module)
+
+    imported = {name.split(".")[0] for name in result["modules"]}
+    assert imported.isdisjoint(forbidden_modules)
+    assert result["duration"] < IMPORT_TIME_BUDGET
@@ -0,0 +1,22 @@
+import numpy
+
+from temporal_consistency.motion_gate import MotionGate
+
+
+def test_motion_gate_skips_static_frames():
+    gate = MotionGate(threshold=5, max_skipped_frames=3)
+    frame = numpy.zeros((72, 128, 3), dtype=numpy.uint8)
+
+    decisions = [gate.should_detect(frame) for _ in range(6)]
+    assert decisions == [True, False, False, False, True, False]
+
+
+def test_motion_gate_detects_scene_change():
+    gate = MotionGate(threshold=5, max_skipped_frames=100)
+    frame = numpy.zeros((72, 128, 3), dtype=numpy.uint8)
+    changed = numpy.full_like(frame, 50)
+
+    assert gate.should_detect(frame)
+    assert not gate.should_detect(frame)
+    assert gate.should_detect(changed)
+    assert not gate.should_detect(changed)
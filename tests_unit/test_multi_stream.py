@@ -0,0 +1,189 @@
+import threading
+from types import SimpleNamespace
+
+import numpy
+import pytest
+
+from temporal_consistency import multi_stream
+from temporal_consistency.multi_stream import (
+    FairScheduler,
+    MultiStreamRunner,
+    VideoStream,
+)
+from temporal_consistency.regression import generate_synthetic_clip
+
+
+CLASS_NAMES = {0: "car"}
+
+
+class FakeTrack:
+    def __init__(self, track_id, ltwh):
+        self.track_id = track_id
+        left, top, width, height = ltwh
+        self.ltrb = [left, top, left + width, top + height]
+        self.det_conf = 0.9
+        self.det_class = 0
+
+    def to_ltrb(self):
+        return self.ltrb
+
+    def is_confirmed(self):
+        return True
+
+
+class FakeTracker:
+    """Deep SORT tracker without an embedder, one track per detection."""
+
+    def __init__(self):
+        self.tracker = SimpleNamespace(tracks=[], predict=lambda: None)
+        self.embeds = []
+
+    def update_tracks(self, results, embeds=None, frame=None):
+        assert embeds is not None and len(embeds) == len(results)
+        self.embeds.append(embeds)
+        self.tracker.tracks = [
+            FakeTrack(str(idx), result[0]) for idx, result in enumerate(results)
+        ]
+        return self.tracker.tracks
+
+
+class FakeEmbedder:
+    def __init__(self):
+        self.batch_sizes = []
+
+    def predict(self, crops):
+        self.batch_sizes.append(len(crops))
+        return [numpy.full(4, crop.shape[1]) for crop in crops]
+
+
+def fake_batch_object_detection(model, frames, *args):
+    # a single 20x20 detection per frame
+    return [
+        ([[[10, 10, 20, 20], 0.9, 0]], numpy.zeros((0, 6)), frame)
+        for frame in frames
+    ]
+
+
+def get_fake_stream(stream_id, num_processed_frames, fps, is_done=False):
+    return SimpleNamespace(
+        stream_id=stream_id,
+        video_time=num_processed_frames / fps,
+        is_done=is_done,
+    )
+
+
+def test_fair_scheduler():
+    streams = [
+        get_fake_stream(0, 10, fps=5),
+        get_fake_stream(1, 10, fps=25),
+        get_fake_stream(2, 0, fps=5, is_done=True),
+        get_fake_stream(3, 20, fps=10),
+        get_fake_stream(4, 5, fps=25),
+    ]
+
+    batch = FairScheduler(batch_size=3).select(streams)
+    assert [stream.stream_id for stream in batch] == [4, 1, 0]
+
+    batch = FairScheduler(batch_size=10).select(streams)
+    assert [stream.stream_id for stream in batch] == [4, 1, 0, 3]
+
+
+def test_multi_stream_runner(tmp_path, monkeypatch):
+    pytest.importorskip("cv2")
+    monkeypatch.setattr(
+        multi_stream, "batch_object_detection", fake_batch_object_detection
+    )
+
+    streams = []
+    for stream_id, num_frames in enumerate([6, 3]):
+        video_filepath = str(tmp_path / f"clip{stream_id}.mp4")
+        generate_synthetic_clip(
+            video_filepath, num_frames=num_frames, frame_size=(160, 120)
+        )
+        streams.append(
+            VideoStream(
+                stream_id,
+                video_filepath,
+                FakeTracker(),
+                CLASS_NAMES,
+                str(tmp_path / f"stream{stream_id}"),
+            )
+        )
+
+    main_thread = threading.current_thread()
+    finished = []
+
+    def on_stream_done(stream):
+        finished.append((stream.stream_id, threading.current_thread()))
+
+    embedder = FakeEmbedder()
+    runner = MultiStreamRunner(
+        SimpleNamespace(names=CLASS_NAMES),
+        streams,
+        batch_size=2,
+        num_decode_threads=2,
+        on_stream_done=on_stream_done,
+        embedder=embedder,
+    )
+    runner.run()
+
+    assert [stream.num_processed_frames for stream in streams] == [6, 3]
+    assert all(stream.is_done for stream in streams)
+    # the ended streams are finished in the pool
+    assert sorted(stream_id for stream_id, _ in finished) == [0, 1]
+    assert all(thread is not main_thread for _, thread in finished)
+    assert (tmp_path / "stream1" / "obj_0.mp4").exists()
+
+    # the detections of both streams are embedded with a single call
+    assert embedder.batch_sizes == [2, 2, 2, 1, 1, 1]
+    assert streams[0].deep_sort_tracker.embeds[0][0].tolist() == [20] * 4
+
+
+def test_get_embeds_without_embedder():
+    runner = MultiStreamRunner(SimpleNamespace(names=CLASS_NAMES), [])
+    frame = numpy.zeros((120, 160, 3), dtype=numpy.uint8)
+    outputs = fake_batch_object_detection(None, [frame])
+
+    assert runner.get_embeds({0: outputs[0]}) == {}
+
+
+class FakeAugmenter:
+    def augment(self, frame, frame_id, num_aug=None):
+        return numpy.full_like(frame, frame_id)
+
+
+def test_skipped_frame_is_augmented(tmp_path):
+    pytest.importorskip("cv2")
+    video_filepath = str(tmp_path / "clip.mp4")
+    generate_synthetic_clip(video_filepath, num_frames=3, frame_size=(160, 120))
+    stream = VideoStream(
+        0,
+        video_filepath,
+        FakeTracker(),
+        CLASS_NAMES,
+        str(tmp_path),
+        frame_range=(2, None),
+        augmenter=FakeAugmenter(),
+    )
+
+    tframe = stream.add_frame(stream.read(), None, latency_ms=1.0)
+    stream.video_cap.release()
+
+    assert tframe.is_detection_skipped
+    assert (tframe.frame == 2).all()
+
+
+def test_close_without_export(tmp_path):
+    pytest.importorskip("cv2")
+    video_filepath = str(tmp_path / "clip.mp4")
+    generate_synthetic_clip(video_filepath, num_frames=2, frame_size=(160, 120))
+    stream = VideoStream(
+        0, video_filepath, FakeTracker(), CLASS_NAMES, str(tmp_path / "out")
+    )
+    outputs = fake_batch_object_detection(None, [stream.read()])
+    stream.add_frame(outputs[0][2], outputs[0], 1.0, embeds=[numpy.zeros(4)])
+
+    # the objects are left to the clip extraction
+    stream.close(out_video_fps=5, export_objects=False)
+    assert stream.is_done
+    assert not (tmp_path / "out" / "obj_0.mp4").exists()
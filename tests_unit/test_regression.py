@@ -0,0 +1,131 @@
+import numpy
+import pytest
+
+from temporal_consistency.regression import (
+    SyntheticClipDetector,
+    compare_anomalies,
+    compare_detections,
+    compare_runs,
+    count_matches,
+    generate_synthetic_clip,
+    is_synthetic_clip,
+)
+
+
+def save_predictions(filepath, rows):
+    frame_ids, ltrb, class_ids = zip(*rows)
+    numpy.savez_compressed(
+        filepath,
+        frame_ids=numpy.array(frame_ids),
+        ltrb=numpy.array(ltrb, dtype=float),
+        class_ids=numpy.array(class_ids),
+    )
+    return str(filepath)
+
+
+def get_metrics(predictions_filepath, fps=10.0, detection_ms=50.0, peak=100.0):
+    return {
+        "fps": fps,
+        "stage_latency_ms": {"decode": 1.0, "detection": detection_ms},
+        "peak_rss_mb": peak,
+        "anomalies": [[3, "low_iou"], [7, "missing_object"]],
+        "predictions_filepath": predictions_filepath,
+    }
+
+
+def test_count_matches():
+    ltrb1 = numpy.array([[0, 0, 10, 10], [20, 20, 30, 30]])
+    ltrb2 = numpy.array([[21, 20, 31, 30], [1, 0, 11, 10], [0, 0, 10, 10]])
+
+    assert count_matches(ltrb1, numpy.array([0, 0]), ltrb2, numpy.zeros(3)) == 2
+    assert count_matches(ltrb1, numpy.array([0, 1]), ltrb2, numpy.zeros(3)) == 1
+
+
+def test_compare_detections(tmp_path):
+    base = save_predictions(
+        tmp_path / "base.npz",
+        [
+            (0, [0, 0, 10, 10], 0),
+            (1, [0, 0, 10, 10], 0),
+            (1, [50, 50, 60, 60], 1),
+        ],
+    )
+    candidate = save_predictions(
+        tmp_path / "candidate.npz",
+        [(0, [1, 0, 11, 10], 0), (1, [50, 50, 60, 60], 1)],
+    )
+
+    diff = compare_detections(base, candidate)
+    assert (diff["num_base"], diff["num_candidate"]) == (3, 2)
+    assert diff["num_matched"] == 2
+    assert diff["agreement"] == pytest.approx(2 / 3, abs=1e-4)
+
+
+def test_compare_anomalies():
+    diff = compare_anomalies(
+        [[3, "low_iou"], [7, "missing_object"]],
+        [[3, "low_iou"], [9, "low_iou"]],
+    )
+
+    assert diff["num_common"] == 1
+    assert diff["only_base"] == [(7, "missing_object")]
+    assert diff["only_candidate"] == [(9, "low_iou")]
+    assert diff["agreement"] == pytest.approx(1 / 3, abs=1e-4)
+
+
+def test_compare_runs(tmp_path):
+    predictions = save_predictions(tmp_path / "p.npz", [(0, [0, 0, 10, 10], 0)])
+    base = get_metrics(predictions)
+
+    _, regressions = compare_runs(base, get_metrics(predictions, fps=9.5))
+    assert regressions == []
+
+    candidate = get_metrics(predictions, fps=8.0, detection_ms=70.0)
+    _, regressions = compare_runs(base, candidate)
+    assert len(regressions) == 2
+
+    _, regressions = compare_runs(
+        base,
+        candidate,
+        {"max_fps_drop": None, "max_latency_increase": 0.5},
+    )
+    assert regressions == []
+
+    # the peak RSS is unknown where the platform does not provide it
+    comparison, regressions = compare_runs(
+        base, get_metrics(predictions, peak=None)
+    )
+    assert comparison["memory_change"] is None
+    assert regressions == []
+
+
+def test_generate_synthetic_clip(tmp_path):
+    cv2 = pytest.importorskip("cv2")
+    filepath = str(tmp_path / "clip.mp4")
+    generate_synthetic_clip(filepath, num_frames=5, frame_size=(64, 48))
+
+    video_cap = cv2.VideoCapture(filepath)
+    assert int(video_cap.get(cv2.CAP_PROP_FRAME_COUNT)) == 5
+    video_cap.release()
+
+
+def test_synthetic_clip_detector(tmp_path):
+    cv2 = pytest.importorskip("cv2")
+    filepath = str(tmp_path / "synthetic0_5.mp4")
+    generate_synthetic_clip(filepath, num_frames=5, num_objects=1)
+    assert is_synthetic_clip(filepath)
+    assert not is_synthetic_clip(str(tmp_path / "video.mp4"))
+
+    video_cap = cv2.VideoCapture(filepath)
+    _, frame = video_cap.read()
+    video_cap.release()
+
+    detections = SyntheticClipDetector()([frame, frame])
+    boxes = detections[0].boxes.data.cpu().numpy()
+    assert boxes.shape == (1, 6)
+    assert numpy.array_equal(boxes, detections[1].boxes.data.cpu().numpy())
+
+    # the rectangle sizes are in [30, 90) pixels
+    sides = boxes[0, 2:4] - boxes[0, :2]
+    assert ((sides >= 28) & (sides <= 92)).all()
+    assert boxes[0, 4] == 0.9
@@ -0,0 +1,125 @@
+import argparse
+import asyncio
+import json
+
+import pytest
+
+from temporal_consistency.service import (
+    JOB_DONE,
+    JOB_FAILED,
+    JOB_QUEUED,
+    VideoJobService,
+    validate_overrides,
+)
+
+
+def get_service(run_job=lambda job: None):
+    base_args = argparse.Namespace(video_filepath=None, num_aug=0)
+    return VideoJobService(run_job, base_args=base_args)
+
+
+def test_route_submit_and_get_job():
+    service = get_service()
+
+    body = json.dumps({"video_filepath": "video.mp4", "num_aug": 2}).encode()
+    status, payload = service.route("POST", "/jobs", body)
+    assert status == 202
+    assert payload["status"] == JOB_QUEUED
+
+    job = service.jobs[payload["job_id"]]
+    assert job.args.num_aug == 2
+    assert service.base_args.num_aug == 0
+
+    status, payload = service.route("GET", f"/jobs/{job.job_id}", b"")
+    assert status == 200
+    assert payload["video_filepath"] == "video.mp4"
+
+    status, payload = service.route("GET", "/jobs", b"")
+    assert status == 200
+    assert len(payload["jobs"]) == 1
+
+
+def test_route_rejects_invalid_requests():
+    service = get_service()
+
+    assert service.route("POST", "/jobs", b"{}")[0] == 400
+    assert service.route("POST", "/jobs", b'{"unknown": 1}')[0] == 400
+    assert service.route("GET", "/jobs/42", b"")[0] == 404
+    assert service.route("GET", "/other", b"")[0] == 404
+    assert service.route("DELETE", "/jobs", b"")[0] == 405
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--video_filepath", default=None)
+    parser.add_argument("--num_aug", type=int, default=0, choices=range(5))
+    parser.add_argument("--confidence", type=float, default=0.5)
+    parser.add_argument("--anomaly_rules", nargs="+", default=["a"])
+    parser.add_argument("--headless", action="store_true")
+    return parser
+
+
+def test_validate_overrides():
+    parser = get_parser()
+
+    overrides = validate_overrides(
+        parser,
+        {"confidence": "0.4", "num_aug": 2.0, "anomaly_rules": ["b", "c"]},
+    )
+    assert overrides == {
+        "confidence": 0.4,
+        "num_aug": 2,
+        "anomaly_rules": ["b", "c"],
+    }
+
+    invalid_overrides = [
+        {"num_aug": 5},
+        {"num_aug": 1.5},
+        {"confidence": "high"},
+        {"anomaly_rules": "b"},
+        {"headless": "yes"},
+        {"video_filepath": 1},
+        {"unknown": 1},
+    ]
+    for invalid in invalid_overrides:
+        with pytest.raises(ValueError):
+            validate_overrides(parser, invalid)
+
+
+def test_route_validates_with_parser():
+    parser = get_parser()
+    base_args = parser.parse_args([])
+    service = VideoJobService(lambda job: None, base_args, parser=parser)
+
+    body = {"video_filepath": "video.mp4", "confidence": "0.25"}
+    status, payload = service.route("POST", "/jobs", json.dumps(body).encode())
+    assert status == 202
+    assert service.jobs[payload["job_id"]].args.confidence == 0.25
+
+    body = {"video_filepath": "video.mp4", "num_aug": 5}
+    status, payload = service.route("POST", "/jobs", json.dumps(body).encode())
+    assert status == 400
+    assert "num_aug" in payload["error"]
+
+
+def test_worker_runs_jobs():
+    def run_job(job):
+        if job.args.video_filepath == "bad.mp4":
+            raise RuntimeError("cannot read video")
+        job.update_progress(10, 10)
+
+    async def run():
+        service = get_service(run_job)
+        good = service.submit({"video_filepath": "good.mp4"})
+        bad = service.submit({"video_filepath": "bad.mp4"})
+
+        worker = asyncio.create_task(service.worker())
+        await service.queue.join()
+        worker.cancel()
+        return good, bad
+
+    good, bad = asyncio.run(run())
+    assert good.status == JOB_DONE
+    assert good.to_dict()["progress"] == 1.0
+    assert bad.status == JOB_FAILED
+    assert "cannot read video" in bad.error
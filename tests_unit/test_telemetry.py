@@ -0,0 +1,81 @@
+import csv
+from types import SimpleNamespace
+
+from temporal_consistency import telemetry
+from temporal_consistency.telemetry import (
+    TelemetrySampler,
+    get_job_filepath,
+    get_rss_bytes,
+)
+
+
+def get_fake_collection(num_frames):
+    return SimpleNamespace(
+        num_tracked_frames=num_frames,
+        all_objects={"1": {}, "2": {}},
+        all_frames={0: [None, None], 1: [None]},
+        num_frame_predictions=3,
+    )
+
+
+def test_get_rss_bytes():
+    assert get_rss_bytes() > 0
+
+
+def test_get_job_filepath():
+    assert get_job_filepath("out/telemetry.csv", 3) == "out/telemetry_job3.csv"
+    filepath = get_job_filepath("/var/lib/node.prom", 1)
+    assert filepath == "/var/lib/node_job1.prom"
+
+
+def test_telemetry_sampler_csv(tmp_path):
+    filepath = str(tmp_path / "telemetry.csv")
+    sampler = TelemetrySampler(
+        filepath, interval=0, gauges={"queue_depth": lambda: 3}
+    )
+
+    for frame_id in range(3):
+        tframe = SimpleNamespace(frame_id=frame_id, num_object=2)
+        sampler.record_frame(get_fake_collection(frame_id + 1), tframe)
+
+    with open(filepath) as f:
+        rows = list(csv.DictReader(f))
+
+    assert len(rows) == 3
+    assert rows[-1]["num_tracked_frames"] == "3"
+    assert rows[-1]["num_frame_predictions"] == "3"
+    assert rows[-1]["queue_depth"] == "3"
+    assert float(rows[-1]["rolling_fps"]) > 0
+
+
+def test_telemetry_sampler_prometheus(tmp_path):
+    filepath = str(tmp_path / "telemetry.prom")
+    sampler = TelemetrySampler(filepath, interval=3600)
+
+    for frame_id in range(3):
+        tframe = SimpleNamespace(frame_id=frame_id, num_object=5)
+        sampler.record_frame(get_fake_collection(frame_id + 1), tframe)
+
+    assert sampler.num_samples == 1
+    sampler.close(get_fake_collection(3), tframe)
+
+    with open(filepath) as f:
+        metrics = dict(line.split() for line in f.read().splitlines())
+
+    assert metrics["temporal_consistency_frame_id"] == "2"
+    assert metrics["temporal_consistency_num_live_tracks"] == "5"
+
+
+def test_telemetry_without_resource(tmp_path, monkeypatch):
+    # i.e. on Windows, where the resource module does not exist
+    monkeypatch.setattr(telemetry, "resource", None)
+    filepath = str(tmp_path / "telemetry.prom")
+    sampler = TelemetrySampler(filepath, interval=0)
+
+    tframe = SimpleNamespace(frame_id=0, num_object=1)
+    row = sampler.sample(get_fake_collection(1), tframe)
+    sampler.close(get_fake_collection(1), tframe)
+
+    assert row["peak_rss_bytes"] is None
+    with open(filepath) as f:
+        assert "peak_rss_bytes" not in f.read()
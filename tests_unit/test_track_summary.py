@@ -0,0 +1,73 @@
+import math
+
+import pytest
+
+from temporal_consistency.track_summary import TrackSummary, get_gap_intervals
+from temporal_consistency.tracked_frame import Prediction
+
+
+CLASS_NAMES = {0: "car", 1: "truck"}
+
+
+def get_track_info(rows):
+    return {
+        frame_id: Prediction(frame_id, ltrb, conf, class_id, CLASS_NAMES)
+        for frame_id, ltrb, conf, class_id in rows
+    }
+
+
+def test_track_summary_statistics():
+    track_info = get_track_info(
+        [
+            (0, [0, 0, 10, 10], 0.9, 0),
+            (1, [2, 0, 12, 10], 0.7, 0),
+            (4, [8, 0, 18, 10], None, 1),
+        ]
+    )
+    summary = TrackSummary("3", track_info)
+
+    assert (summary.first_frame, summary.last_frame, summary.span) == (0, 4, 5)
+    assert summary.num_observations == 3
+    assert summary.gaps == [(2, 2)]
+    assert summary.num_missing_frames == 2
+    assert summary.class_histogram == {"car": 2, "truck": 1}
+    assert summary.get_first_class_change() == 4
+    assert math.isclose(summary.min_iou, 0.25)
+    assert math.isclose(summary.mean_confidence, 0.8)
+    assert summary.velocities.tolist() == [2.0, 2.0]
+
+    row = summary.to_row()
+    assert row["class_histogram"] == "car:2;truck:1"
+    assert row["num_gaps"] == 1
+
+
+def test_track_summary_skips_frames_without_detection():
+    track_info = get_track_info(
+        [
+            (0, [0, 0, 10, 10], 0.9, 0),
+            (1, [50, 50, 60, 60], 0.9, 1),
+            (2, [0, 0, 10, 10], 0.9, 0),
+        ]
+    )
+    summary = TrackSummary("3", track_info, skipped_frame_ids={1})
+
+    assert summary.num_observations == 3
+    assert summary.num_detected == 2
+    assert summary.class_histogram == {"car": 2}
+    assert summary.get_first_class_change() is None
+    assert summary.pair_frame_ids.tolist() == [[0], [2]]
+    assert summary.min_iou == summary.mean_iou
+
+
+@pytest.mark.parametrize(
+    "frame_ids, expected",
+    [
+        ([3], []),
+        ([1, 2, 3, 4], []),
+        ([1, 2, 5, 6], [(3, 2)]),
+        ([0, 4, 5, 9], [(1, 3), (6, 3)]),
+        ([9, 0, 4, 5], [(1, 3), (6, 3)]),
+    ],
+)
+def test_get_gap_intervals(frame_ids, expected):
+    assert get_gap_intervals(frame_ids) == expected
@@ -0,0 +1,131 @@
+from types import SimpleNamespace
+
+import numpy
+import pytest
+
+from temporal_consistency.adaptive_control import AdaptiveController
+from temporal_consistency.regression import generate_synthetic_clip
+from temporal_consistency.tracked_frame import (
+    Prediction,
+    TrackedFrame,
+    TrackedFrameCollection,
+    boxes_to_predictions,
+)
+
+
+CLASS_NAMES = {0: "car", 1: "truck"}
+
+
+class FakeTrack:
+    def __init__(self, track_id, ltrb):
+        self.track_id = track_id
+        self.ltrb = ltrb
+        self.det_conf = 0.9
+        self.det_class = 0
+
+    def to_ltrb(self):
+        return self.ltrb
+
+    def is_confirmed(self):
+        return True
+
+
+def test_export_and_load_predictions(tmp_path):
+    collection = TrackedFrameCollection(
+        video_cap=None, class_names=CLASS_NAMES, out_folder=str(tmp_path)
+    )
+    for frame_id, class_id, conf in [(0, 0, 0.9), (1, 1, None), (3, 0, 0.8)]:
+        pred = Prediction(frame_id, [1, 2, 30, 40], conf, class_id, CLASS_NAMES)
+        collection.all_objects["7"][frame_id] = pred
+        collection.all_frames[frame_id].append(pred)
+    collection.low_confidence_boxes[2] = numpy.array([[5, 5, 9, 9, 0.1, 1]])
+    collection.low_confidence_boxes[4] = numpy.zeros((0, 6))
+    collection.skipped_frame_ids = {1}
+
+    filepath = str(tmp_path / "predictions.npz")
+    collection.export_predictions(filepath)
+    loaded = TrackedFrameCollection.from_predictions_file(
+        filepath, video_cap=None, out_folder=str(tmp_path)
+    )
+
+    assert loaded.class_names == CLASS_NAMES
+    assert list(loaded.all_objects["7"]) == [0, 1, 3]
+    assert [p.to_str() for p in loaded.all_objects["7"].values()] == [
+        p.to_str() for p in collection.all_objects["7"].values()
+    ]
+    assert loaded.all_objects["7"][1].class_name == "truck"
+    assert loaded.skipped_frame_ids == {1}
+    assert loaded.num_frame_predictions == 3
+
+    high_conf, low_conf = loaded.get_frame_predictions(2)
+    assert high_conf == []
+    assert [p.to_str() for p in low_conf] == ["truck, 5 5 9 9, 0.1"]
+    assert loaded.get_frame_predictions(4)[1] == []
+
+
+def test_boxes_to_predictions():
+    boxes = numpy.array([[1, 2, 3, 4, 0.25, 0], [5, 6, 7, 8, 0.3, 1]])
+    predictions = boxes_to_predictions(3, boxes, CLASS_NAMES)
+
+    assert [p.frame_id for p in predictions] == [3, 3]
+    assert [p.to_str() for p in predictions] == [
+        "car, 1 2 3 4, 0.25",
+        "truck, 5 6 7 8, 0.3",
+    ]
+
+
+def test_collection_keeps_predictions_only(tmp_path):
+    cv2 = pytest.importorskip("cv2")
+    video_filepath = str(tmp_path / "clip.mp4")
+    generate_synthetic_clip(video_filepath, num_frames=6, frame_size=(160, 120))
+
+    video_cap = cv2.VideoCapture(video_filepath)
+    collection = TrackedFrameCollection(video_cap, CLASS_NAMES, str(tmp_path))
+    track = FakeTrack("1", [10, 10, 50, 50])
+    tracker = SimpleNamespace(tracks=[track])
+    for frame_id in range(1, 4):
+        frame = numpy.zeros((120, 160, 3), dtype=numpy.uint8)
+        tframe = TrackedFrame(frame_id, frame, tracker, numpy.zeros((0, 6)), {})
+        collection.add_tracked_frame(tframe)
+        track.ltrb = [x + 10 for x in track.ltrb]
+
+    assert collection.num_tracked_frames == 3
+    assert collection.num_frame_predictions == 3
+    assert collection.get_frame_size() == (160, 120)
+    # the snapshots are not affected by the later updates of the tracker
+    assert [pred.ltrb[0] for pred in collection.all_objects["1"].values()] == [
+        10,
+        20,
+        30,
+    ]
+    assert not hasattr(collection, "tracked_frames")
+
+    collection.export_all_objects(out_video_fps=5)
+    clip_cap = cv2.VideoCapture(str(tmp_path / "obj_1.mp4"))
+    assert int(clip_cap.get(cv2.CAP_PROP_FRAME_COUNT)) == 3
+    clip_cap.release()
+    video_cap.release()
+
+
+class RecordingAugmenter:
+    def __init__(self):
+        self.num_augs = []
+
+    def augment(self, frame, frame_id, num_aug=None):
+        self.num_augs.append(num_aug)
+        return frame
+
+
+def test_collection_augments_with_operating_point(tmp_path):
+    controller = AdaptiveController(10, num_aug=2, adjust_every=1)
+    controller.update(1, latency_ms=500)
+    augmenter = RecordingAugmenter()
+    collection = TrackedFrameCollection(
+        None, CLASS_NAMES, str(tmp_path), augmenter, controller
+    )
+    frame = numpy.zeros((12, 16, 3), dtype=numpy.uint8)
+    for frame_id in range(4):
+        collection.augment(frame, frame_id)
+
+    # the adjustment after frame 1 applies from frame 2 on
+    assert augmenter.num_augs == [2, 2, 1, 1]
@@ -2,9 +2,12 @@ import pytest
 
 from temporal_consistency.utils import (
     compute_iou,
+    compute_iou_batch,
+    get_frame_range,
     get_runtime_str,
     ltrb_to_ltwh,
     ltwh_to_ltrb,
+    parse_frame_position,
 )
 
 
@@ -34,6 +37,16 @@ def test_compute_iou(box1, box2, expected_iou):
     assert abs(compute_iou(box1, box2) - expected_iou) < EPS
 
 
+def test_compute_iou_batch():
+    bboxes1 = [[0, 0, 1, 1], [0, 0, 2, 2], [-3, -3, 1, 1]]
+    bboxes2 = [[3, 3, 4, 4], [1, 1, 3, 3], [-4, -4, -2, -2]]
+    expected = [compute_iou(b1, b2) for b1, b2 in zip(bboxes1, bboxes2)]
+
+    ious = compute_iou_batch(bboxes1, bboxes2)
+    assert ious.shape == (3,)
+    assert all(abs(iou - exp) < EPS for iou, exp in zip(ious, expected))
+
+
 def test_get_runtime_str():
     runtime_str = get_runtime_str()
     assert len(runtime_str) == 15
@@ -60,3 +73,41 @@ def test_ltwh_to_ltrb(ltrb, ltwh):
 )
 def test_ltrb_to_ltwh(ltrb, ltwh):
     assert ltrb_to_ltwh(ltrb) == ltwh
+
+
+@pytest.mark.parametrize(
+    "value, fps, expected",
+    [
+        ("1500", 25, 1500),
+        ("90s", 25, 2250),
+        ("1.5s", 10, 15),
+        ("01:30", 25, 2250),
+        ("01:00:00.5", 2, 7201),
+    ],
+)
+def test_parse_frame_position(value, fps, expected):
+    assert parse_frame_position(value, fps) == expected
+
+
+@pytest.mark.parametrize("value, fps", [("-3", 25), ("abc", 25), ("10s", 0)])
+def test_parse_frame_position_invalid(value, fps):
+    with pytest.raises(ValueError):
+        parse_frame_position(value, fps)
+
+
+@pytest.mark.parametrize(
+    "num_frames, start, end, max_frames, expected",
+    [
+        (1000, None, None, None, (0, 1000)),
+        (1000, "100", "20s", None, (100, 500)),
+        (1000, "10s", None, "100", (250, 350)),
+        (1000, "900", "5000", None, (900, 1000)),
+        (0, "100", None, None, (100, None)),
+        (0, None, None, "4s", (0, 100)),
+    ],
+)
+def test_get_frame_range(num_frames, start, end, max_frames, expected):
+    assert get_frame_range(num_frames, 25, start, end, max_frames) == expected
+
+    with pytest.raises(ValueError):
+        get_frame_range(1000, 25, start="900", end="800")
@@ -0,0 +1,42 @@
+import numpy
+
+from temporal_consistency.vis_utils import FrameRenderer
+
+
+class FakeTrack:
+    def __init__(self, track_id, ltrb, confirmed=True):
+        self.track_id = track_id
+        self.det_class = 0
+        self.ltrb = ltrb
+        self.confirmed = confirmed
+
+    def is_confirmed(self):
+        return self.confirmed
+
+    def to_ltrb(self):
+        return self.ltrb
+
+
+def test_frame_renderer_reuses_buffer():
+    frame = numpy.zeros((120, 160, 3), dtype=numpy.uint8)
+    tracks = [FakeTrack("1", [40, 40, 80, 80])]
+    renderer = FrameRenderer(classes={0: "car"})
+
+    out1 = renderer.render(frame, tracks, total_time=10)
+    out2 = renderer.render(frame, tracks, total_time=10)
+
+    assert out1 is out2
+    assert out1.any()
+    assert not frame.any()
+
+
+def test_frame_renderer_skips_unconfirmed_tracks():
+    frame = numpy.zeros((120, 160, 3), dtype=numpy.uint8)
+    renderer = FrameRenderer(classes={0: "car"})
+
+    out = renderer.render(
+        frame, [FakeTrack("1", [40, 40, 80, 80], False)], total_time=10
+    ).copy()
+    out_empty = renderer.render(frame, [], total_time=10)
+
+    assert numpy.array_equal(out, out_empty)